@@ -0,0 +1,191 @@
+"""多页/多图批量识别
+
+各页的预处理和OCR分发到按CPU核数创建的进程池并行执行，
+每页识别完成后立即提交解题，解题并发数单独限制。
+总耗时接近最慢的一页，而不是所有页面之和。
+"""
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from PIL import Image, ImageSequence
+
+from .cache import hash_bytes, ocr_text_cache
+from .metrics import STAGE_ERRORS, record
+from .ocr import process_with_deepseek
+from .ocr_engine import build_engine
+from .preprocess import open_image, preprocess_image
+
+try:
+    import fitz  # PyMuPDF，用于渲染PDF页面
+except ImportError:  # PyMuPDF 是可选依赖
+    fitz = None
+
+
+class BatchError(Exception):
+    """批量上传的文件无法处理"""
+
+
+def get_options():
+    options = {
+        'WORKERS': None,  # None 时使用CPU核数
+        'SOLVE_CONCURRENCY': 4,
+        'MAX_PAGES': 50,
+        'PDF_DPI': 200,
+    }
+    options.update(getattr(settings, 'OCR_BATCH', {}))
+    return options
+
+
+def split_pages(name, data, options=None, limit=None):
+    """把上传的文件展开成页面列表 [(来源, 缓存键, 图片字节或图片)]
+
+    limit 为还能接受的页数，默认 MAX_PAGES；先读取页数检查，超出时不渲染任何页面。
+    """
+    options = options or get_options()
+    limit = options['MAX_PAGES'] if limit is None else limit
+    if data.startswith(b'%PDF'):
+        if fitz is None:
+            raise BatchError('处理PDF需要安装 PyMuPDF')
+        pages = []
+        with fitz.open(stream=data, filetype='pdf') as document:
+            _check_page_count(len(document), limit, options)
+            for index, page in enumerate(document):
+                pixmap = page.get_pixmap(dpi=options['PDF_DPI'])
+                image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+                pages.append((f'{name}#{index + 1}', hash_bytes(data + f'#{index}'.encode()), image))
+        return pages
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception:
+        raise BatchError(f'{name} 不是有效的图片')
+    frames = getattr(image, 'n_frames', 1)
+    _check_page_count(frames, limit, options)
+    if frames > 1:
+        return [
+            (f'{name}#{index + 1}', hash_bytes(data + f'#{index}'.encode()), frame.convert('RGB'))
+            for index, frame in enumerate(ImageSequence.Iterator(image))
+        ]
+    # 单张图片直接传原始字节，子进程里可以使用JPEG草稿解码
+    return [(name, hash_bytes(data), data)]
+
+
+def _check_page_count(count, limit, options):
+    if count > limit:
+        raise BatchError(f'一次最多处理 {options["MAX_PAGES"]} 页')
+
+
+# 子进程内常驻的OCR引擎
+_page_engine = None
+
+
+def _ocr_page(page):
+    """在子进程中执行：预处理 + OCR，返回 (文本, 耗时毫秒)"""
+    global _page_engine
+    started = time.perf_counter()
+    image = open_image(page) if isinstance(page, bytes) else page
+    image = preprocess_image(image)
+    if _page_engine is None:
+        _page_engine = build_engine('tesserocr')
+    try:
+        text = _page_engine.recognize(image)
+    except Exception as e:
+        # 部分第三方异常无法在进程间传递，统一转换
+        raise BatchError(str(e)) from None
+    return text, round((time.perf_counter() - started) * 1000, 1)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_page_executor():
+    """获取页面识别进程池，进程数默认等于CPU核数"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_options()['WORKERS'] or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def _reset_page_executor():
+    """子进程异常退出后进程池不可再用，丢弃后下次重新创建"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def run_batch(files):
+    """批量识别并解题，files 为 [(文件名, 字节)]，按上传顺序返回每页结果"""
+    options = get_options()
+    pages = []
+    for name, data in files:
+        pages.extend(split_pages(name, data, options, limit=options['MAX_PAGES'] - len(pages)))
+
+    results = [
+        {'page': index + 1, 'source': source, 'text': None, 'result': None, 'error': None, 'timings': {}}
+        for index, (source, _, _) in enumerate(pages)
+    ]
+
+    executor = get_page_executor()
+    with ThreadPoolExecutor(max_workers=options['SOLVE_CONCURRENCY']) as solver:
+        solve_futures = {}
+
+        def solve(index, text):
+            results[index]['text'] = text
+            solve_futures[solver.submit(_timed_solve, text)] = index
+
+        ocr_futures = {}
+        for index, (_, key, page) in enumerate(pages):
+            cached = ocr_text_cache.get(key)
+            if cached is not None:
+                results[index]['timings']['ocr'] = 0
+                solve(index, cached)
+            else:
+                ocr_futures[executor.submit(_ocr_page, page)] = (index, key)
+
+        # 哪一页先识别完就先提交解题
+        for future in as_completed(ocr_futures):
+            index, key = ocr_futures[future]
+            try:
+                text, elapsed = future.result()
+            except BrokenProcessPool as e:
+                _reset_page_executor()
+                results[index]['error'] = f'OCR识别失败: {str(e)}'
+                STAGE_ERRORS.inc('batch_ocr')
+                continue
+            except Exception as e:
+                results[index]['error'] = f'OCR识别失败: {str(e)}'
+                STAGE_ERRORS.inc('batch_ocr')
+                continue
+            # 子进程内的计时无法直接汇总，由主进程按返回的耗时记录
+            record('batch_ocr', elapsed / 1000)
+            ocr_text_cache.set(key, text)
+            results[index]['timings']['ocr'] = elapsed
+            solve(index, text)
+
+        for future in as_completed(list(solve_futures)):
+            index = solve_futures[future]
+            result, elapsed = future.result()
+            results[index]['result'] = result
+            results[index]['timings']['solve'] = elapsed
+
+    return results
+
+
+def _timed_solve(text):
+    started = time.perf_counter()
+    result = process_with_deepseek(text)
+    return result, round((time.perf_counter() - started) * 1000, 1)
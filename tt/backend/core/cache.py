@@ -0,0 +1,239 @@
+"""OCR与解题结果缓存"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def hash_bytes(data):
+    """计算内容哈希，作为缓存键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text):
+    """规范化题目文本，去除空白差异"""
+    return ' '.join(text.split())
+
+
+class ResultCache:
+    """两级缓存：进程内LRU + 有大小上限的磁盘持久化
+
+    配置了磁盘目录时，内存条目记下对应磁盘文件的 (inode, 修改时间, 大小)，命中时检查文件是否仍是同一个：
+    其他进程删除（invalidate/clear/淘汰）或重写了该条目后，本进程从磁盘重新读取。
+    inode 在文件删除后可能被重用，只比较 inode 不够。
+    """
+
+    def __init__(self, name, max_entries=1000, directory=None, max_disk_bytes=0, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.directory = os.path.join(directory, name) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and self.directory and self._signature(key) != entry[2]:
+            entry = None
+        with self._lock:
+            if entry is not None and self._memory.get(key) is entry:
+                expires_at, value, _ = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self._memory.pop(key, None)
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        signature = self._write_disk(key, expires_at, value)
+        with self._lock:
+            self._remember(key, (expires_at, value, signature))
+
+    def invalidate(self, key):
+        """删除单个缓存条目"""
+        with self._lock:
+            self._memory.pop(key, None)
+        path = self._path(key)
+        if not path:
+            return
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except FileNotFoundError:
+            # 其他进程已经删除
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def clear(self):
+        """清空全部缓存条目"""
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+        for path, _, _ in self._disk_files():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def stats(self):
+        files = self._disk_files()
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memory),
+            'disk_entries': len(files),
+            'disk_bytes': sum(size for _, size, _ in files),
+        }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    @staticmethod
+    def _stat_signature(stat):
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _signature(self, key):
+        """磁盘文件的 (inode, 修改时间, 大小)，文件不存在时返回 None；写入时用 os.replace 替换，重写后会变化"""
+        try:
+            return self._stat_signature(os.stat(self._path(key)))
+        except OSError:
+            return None
+
+    def _read_disk(self, key, now):
+        path = self._path(key)
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expires_at = data.get('expires_at')
+        if expires_at is not None and expires_at <= now:
+            self.invalidate(key)
+            return None
+        # 更新访问时间，磁盘淘汰时按最近使用排序；修改时间不变，其他进程内存中的条目仍然有效
+        signature = self._signature(key)
+        if signature is not None:
+            try:
+                os.utime(path, ns=(time.time_ns(), signature[1]))
+            except OSError:
+                pass
+        return expires_at, data['value'], signature
+
+    def _write_disk(self, key, expires_at, value):
+        path = self._path(key)
+        if not path:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps({'expires_at': expires_at, 'value': value}, ensure_ascii=False).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            # os.replace 不改变 inode、修改时间和大小，替换后其他进程可能立即重写，在临时文件上读取签名
+            signature = self._stat_signature(os.fstat(f.fileno()))
+        try:
+            old_size = os.stat(path).st_size
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(payload) - old_size
+            over_limit = self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+        return signature
+
+    def _evict_disk(self):
+        """按最近使用时间淘汰磁盘条目，直到低于上限的90%"""
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 其他进程已经删除，同样不再占用空间
+                pass
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def _disk_files(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, stat.st_size, stat.st_atime))
+        return files
+
+
+def _build_cache(name):
+    options = getattr(settings, 'OCR_CACHE', {})
+    return ResultCache(
+        name,
+        max_entries=options.get('MAX_ENTRIES', 1000),
+        directory=options.get('DIR'),
+        max_disk_bytes=options.get('MAX_DISK_BYTES', 0),
+        ttl=options.get('TTL'),
+    )
+
+
+# 第一级：图片内容哈希 -> OCR文本
+ocr_text_cache = _build_cache('ocr_text')
+# 第二级：规范化题目文本哈希 -> 解题结果
+solve_cache = _build_cache('solve')
+
+RESULT_CACHES = {
+    'ocr_text': ocr_text_cache,
+    'solve': solve_cache,
+}
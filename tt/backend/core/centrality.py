@@ -0,0 +1,174 @@
+"""知识节点中心性
+
+在邻接索引（CSR 数组）上用 NumPy 计算，结果写回 KnowledgeNode 的冗余字段：
+- PageRank：幂迭代，稀疏矩阵乘向量用 bincount 完成，无出边节点的权重均分给所有节点；
+- 入度、出度；
+- 介数中心性：随机抽取部分源点执行 Brandes 算法（按无向图），逐层向量化的 BFS，结果按比例放大。
+
+图谱变化后由定时任务执行 compute_graph_metrics，版本未变化时跳过；
+只更新数值有变化的节点，并写入一条变更记录递增图谱版本，客户端下次同步时获取完整快照。
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .graph_index import get_index, structure_version
+from .knowledge_map import record_batch_change, refresh_map_version
+from .models import KnowledgeNode
+
+METRICS_VERSION_KEY = 'knowledge_map:metrics_version'
+METRIC_FIELDS = ('pagerank', 'betweenness', 'in_degree', 'out_degree')
+
+
+def get_options():
+    options = {
+        'DAMPING': 0.85,
+        'TOLERANCE': 1e-9,  # PageRank 两次迭代的 L1 差小于该值时停止
+        'MAX_ITERATIONS': 100,
+        'BETWEENNESS_SAMPLES': 64,  # 介数中心性抽样的源点数，节点数不超过该值时精确计算
+    }
+    options.update(getattr(settings, 'GRAPH_METRICS', {}))
+    return options
+
+
+def _edges(indptr, indices):
+    """CSR -> (行, 列) 数组"""
+    indptr = np.asarray(indptr)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return rows, np.asarray(indices, dtype=np.int64)
+
+
+def pagerank(count, sources, targets, damping=0.85, tolerance=1e-9, max_iterations=100):
+    if count == 0:
+        return np.zeros(0)
+    out_degree = np.bincount(sources, minlength=count).astype(np.float64)
+    dangling = out_degree == 0
+    weights = np.divide(1.0, out_degree, out=np.zeros(count), where=~dangling)
+    ranks = np.full(count, 1.0 / count)
+    for _ in range(max_iterations):
+        spread = np.bincount(targets, weights=(ranks * weights)[sources], minlength=count)
+        updated = damping * spread + (damping * ranks[dangling].sum() + 1 - damping) / count
+        converged = np.abs(updated - ranks).sum() < tolerance
+        ranks = updated
+        if converged:
+            break
+    return ranks
+
+
+def _expand(indptr, indices, frontier):
+    """frontier 中各节点的全部邻居，返回 (来源节点, 邻居)"""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return frontier[:0], frontier[:0]
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(frontier, counts), indices[np.repeat(starts, counts) + offsets]
+
+
+def betweenness(count, indptr, indices, sources):
+    """以 sources 为源点的 Brandes 介数（无向），未归一化"""
+    scores = np.zeros(count)
+    for source in sources:
+        distance = np.full(count, -1, dtype=np.int64)
+        paths = np.zeros(count)
+        distance[source] = 0
+        paths[source] = 1
+        frontier = np.array([source])
+        levels = []  # 每层的 (上一层节点, 下一层节点) 边
+        depth = 0
+        while len(frontier):
+            parents, children = _expand(indptr, indices, frontier)
+            unseen = distance[children] < 0
+            distance[children[unseen]] = depth + 1
+            on_path = distance[children] == depth + 1
+            parents, children = parents[on_path], children[on_path]
+            paths += np.bincount(children, weights=paths[parents], minlength=count)
+            levels.append((parents, children))
+            frontier = np.unique(children)
+            depth += 1
+
+        dependency = np.zeros(count)
+        for parents, children in reversed(levels):
+            dependency += np.bincount(
+                parents, weights=paths[parents] / paths[children] * (1 + dependency[children]), minlength=count
+            )
+        dependency[source] = 0
+        scores += dependency
+    return scores
+
+
+def compute_metrics(index=None, seed=0):
+    """返回 (节点ID数组, {字段: 数组})"""
+    options = get_options()
+    index = index or get_index()
+    count = len(index.node_ids)
+    sources, targets = _edges(index.out_indptr, index.out_indices)
+
+    # 无向邻接：出边和入边合并后按行排序
+    rows = np.concatenate([sources, targets])
+    cols = np.concatenate([targets, sources])
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    indices = cols[order]
+
+    samples = options['BETWEENNESS_SAMPLES']
+    if count <= samples:
+        chosen = np.arange(count)
+    else:
+        chosen = np.random.default_rng(seed).choice(count, samples, replace=False)
+    between = betweenness(count, indptr, indices, chosen)
+    if count > 2:
+        # 抽样结果放大到全部源点，无向图每条路径计算了两次，再按 (n-1)(n-2) 归一化
+        between = between * (count / max(len(chosen), 1)) / ((count - 1) * (count - 2))
+
+    return np.asarray(index.node_ids), {
+        'pagerank': pagerank(count, sources, targets, options['DAMPING'], options['TOLERANCE'],
+                             options['MAX_ITERATIONS']),
+        'betweenness': between,
+        'in_degree': np.diff(np.asarray(index.in_indptr)),
+        'out_degree': np.diff(np.asarray(index.out_indptr)),
+    }
+
+
+def is_stale():
+    return cache.get(METRICS_VERSION_KEY) != structure_version()
+
+
+def save_metrics(node_ids, metrics):
+    """只更新数值有变化的节点，返回更新的节点数"""
+    values = {
+        'pagerank': np.round(metrics['pagerank'], 10).tolist(),
+        'betweenness': np.round(metrics['betweenness'], 10).tolist(),
+        'in_degree': np.asarray(metrics['in_degree']).tolist(),
+        'out_degree': np.asarray(metrics['out_degree']).tolist(),
+    }
+    positions = {node_id: position for position, node_id in enumerate(np.asarray(node_ids).tolist())}
+    changed = []
+    for row in KnowledgeNode.objects.values_list('id', *METRIC_FIELDS).iterator(chunk_size=5000):
+        position = positions.get(row[0])
+        if position is None:
+            continue
+        current = tuple(values[field][position] for field in METRIC_FIELDS)
+        if current != row[1:]:
+            changed.append(KnowledgeNode(id=row[0], **dict(zip(METRIC_FIELDS, current))))
+
+    with transaction.atomic():
+        KnowledgeNode.objects.bulk_update(changed, METRIC_FIELDS, batch_size=2000)
+        if changed:
+            record_batch_change('metrics')
+            transaction.on_commit(refresh_map_version)
+    return len(changed)
+
+
+def update_metrics(force=False):
+    """图谱有变化时重新计算，返回更新的节点数；未变化时返回 None"""
+    version = structure_version()
+    if not force and cache.get(METRICS_VERSION_KEY) == version:
+        return None
+    node_ids, metrics = compute_metrics()
+    updated = save_metrics(node_ids, metrics)
+    cache.set(METRICS_VERSION_KEY, version, None)
+    return updated
@@ -0,0 +1,235 @@
+"""Deepseek API 共享HTTP客户端
+
+连接池复用 TCP/TLS 连接，429/5xx 时按带抖动的指数退避重试，
+连续失败时熔断快速失败，并通过信号量限制同时在途的请求数。
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeepseekUnavailable(Exception):
+    """Deepseek 服务当前不可用"""
+
+
+class CircuitOpenError(DeepseekUnavailable):
+    """熔断器处于打开状态"""
+
+
+class ConcurrencyLimitError(DeepseekUnavailable):
+    """等待并发名额超时"""
+
+
+class DeepseekAPIError(Exception):
+    """Deepseek 返回了非200的状态码"""
+
+    def __init__(self, status_code, text=''):
+        super().__init__(f'API调用失败: {status_code}')
+        self.status_code = status_code
+        self.text = text
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却期后放行一个试探请求"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """试探请求未真正发出时，允许下一个请求继续试探"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class DeepseekClient:
+    def __init__(self, url, api_key, pool_size=10, max_concurrency=4, acquire_timeout=10,
+                 max_retries=3, backoff_base=0.5, backoff_max=8, timeout=30,
+                 failure_threshold=5, reset_timeout=30, verify=True):
+        self.url = url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, payload, **kwargs):
+        """发送请求并在可重试的错误上退避重试，返回最后一次的响应"""
+        if not self.breaker.allow():
+            raise CircuitOpenError('Deepseek 服务暂不可用，已熔断')
+
+        headers = self._headers()
+        try:
+            response, error = self._retry(lambda: self._send(payload, headers, **kwargs))
+        except ConcurrencyLimitError:
+            self.breaker.release_probe()
+            raise
+
+        if error is not None:
+            raise error
+        return response
+
+    def stream_lines(self, payload):
+        """流式请求，逐行返回服务端推送的内容
+
+        只在收到响应之前重试；读取期间一直占用一个并发名额。
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError('Deepseek 服务暂不可用，已熔断')
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            self.breaker.release_probe()
+            raise ConcurrencyLimitError('等待 Deepseek 并发名额超时')
+
+        try:
+            headers = self._headers()
+
+            def send():
+                try:
+                    response = self.session.post(
+                        self.url, headers=headers, json=payload,
+                        timeout=self.timeout, stream=True
+                    )
+                    return response, None
+                except requests.RequestException as e:
+                    return None, e
+
+            response, error = self._retry(send)
+            if error is not None:
+                raise error
+            with response:
+                if response.status_code != 200:
+                    raise DeepseekAPIError(response.status_code, response.text)
+                # SSE 固定使用UTF-8；按字节分行，避免把内容中的特殊换行符当作分隔
+                for line in response.iter_lines():
+                    if line:
+                        yield line.decode('utf-8')
+        finally:
+            self._semaphore.release()
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _retry(self, send):
+        """按退避策略重试 send()，并把最终结果记入熔断器"""
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            response, error = send()
+            if error is None and response.status_code not in RETRY_STATUSES:
+                break
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                if response is not None:
+                    response.close()
+                time.sleep(delay)
+
+        if error is not None or response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response, error
+
+    def _send(self, payload, headers, **kwargs):
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            raise ConcurrencyLimitError('等待 Deepseek 并发名额超时')
+        try:
+            response = self.session.post(
+                self.url, headers=headers, json=payload,
+                timeout=self.timeout, **kwargs
+            )
+            return response, None
+        except requests.RequestException as e:
+            return None, e
+        finally:
+            self._semaphore.release()
+
+    def _backoff(self, attempt, response):
+        """带完全抖动的指数退避，优先遵循 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def get_client(url, api_key):
+    """获取进程内共享的客户端，每个 (url, api_key) 一个"""
+    with _client_lock:
+        client = _clients.get((url, api_key))
+        if client is None:
+            options = getattr(settings, 'DEEPSEEK_CLIENT', {})
+            client = _clients[(url, api_key)] = DeepseekClient(
+                url, api_key,
+                pool_size=options.get('POOL_SIZE', 10),
+                max_concurrency=options.get('MAX_CONCURRENCY', 4),
+                acquire_timeout=options.get('ACQUIRE_TIMEOUT', 10),
+                max_retries=options.get('MAX_RETRIES', 3),
+                backoff_base=options.get('BACKOFF_BASE', 0.5),
+                backoff_max=options.get('BACKOFF_MAX', 8),
+                timeout=options.get('TIMEOUT', 30),
+                failure_threshold=options.get('BREAKER_THRESHOLD', 5),
+                reset_timeout=options.get('BREAKER_RESET', 30),
+                verify=options.get('VERIFY_SSL', True),
+            )
+    return client
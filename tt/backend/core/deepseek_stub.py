@@ -0,0 +1,135 @@
+"""本地 Deepseek API 模拟服务，用于离线测试和压测"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_CONTENT = {
+    "question": {
+        "main": "简便计算",
+        "sub_questions": [
+            {"id": "1", "content": "59×2.5×0.4=□×(□×□)"}
+        ]
+    },
+    "analysis": {"1": "利用乘法结合律，先算2.5×0.4=1"},
+    "answer": {"1": "59×(2.5×0.4)=59"}
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            request = {}
+        server = self.server
+
+        with server.lock:
+            server.request_count += 1
+            number = server.request_count
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+
+            roll = random.random()
+            if number <= server.fail_first or roll < server.error_rate:
+                self._send_json(503, {"error": {"message": "stub unavailable"}})
+            elif roll < server.error_rate + server.rate_limit_rate:
+                self._send_json(429, {"error": {"message": "rate limited"}}, {'Retry-After': '0'})
+            elif request.get('stream'):
+                self._send_stream()
+            else:
+                content = json.dumps(STUB_CONTENT, ensure_ascii=False)
+                self._send_json(200, {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "model": "deepseek-chat",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"```json\n{content}\n```"},
+                        "finish_reason": "stop"
+                    }]
+                })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_json(self, status_code, body, headers=None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self):
+        """按 OpenAI 兼容的 SSE 格式逐段推送内容"""
+        content = '```json\n' + json.dumps(STUB_CONTENT, ensure_ascii=False, indent=2) + '\n```'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_size = 8
+        try:
+            for start in range(0, len(content), chunk_size):
+                event = {
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + chunk_size]}}]
+                }
+                self._write_chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n')
+                if self.server.token_delay:
+                    time.sleep(self.server.token_delay)
+            self._write_chunk('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端读到 [DONE] 后可能直接断开
+            self.close_connection = True
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 token_delay=0.0, fail_first=0, verbose=False):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.fail_first = fail_first  # 前 N 个请求固定返回 503，用于测试重试
+        self.rate_limit_rate = rate_limit_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1/chat/completions'
+
+
+def start_stub_server(host='127.0.0.1', port=0, **options):
+    """在后台线程启动模拟服务，port 为 0 时自动分配端口"""
+    server = StubServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
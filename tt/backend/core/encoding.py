@@ -0,0 +1,97 @@
+"""响应编码与压缩
+
+- 列式图谱编码：节点按字段拆成并列数组，关联用整数下标对表示，分类和关联类型编码为下标。
+- MessagePack：二进制编码，需要安装 msgpack。
+- 压缩：超过阈值的响应按客户端支持使用 brotli（需要安装 brotli）或 gzip。
+"""
+import gzip
+
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可选依赖
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖
+    brotli = None
+
+NODE_COLUMNS = ('id', 'name', 'value', 'category', 'content', 'difficulty', 'x', 'y',
+                'pagerank', 'betweenness', 'in_degree', 'out_degree')
+
+
+def get_options():
+    options = {
+        'MIN_SIZE': 1024,  # 小于该字节数的响应不压缩
+        'GZIP_LEVEL': 6,
+        'BROTLI_QUALITY': 5,
+    }
+    options.update(getattr(settings, 'RESPONSE_COMPRESSION', {}))
+    return options
+
+
+def to_columnar(graph):
+    """把 map 接口的快照或增量转换为列式结构
+
+    完整快照中 links 的 source/target 是 nodes 数组的下标；增量中关联的端点
+    不一定在本次返回的节点里，此时为节点ID，由 link_endpoints 标明。
+    """
+    nodes = graph.get('nodes', [])
+    links = graph.get('links', [])
+    categories = graph.get('categories', [])
+    category_codes = {category: code for code, category in enumerate(categories)}
+    relation_types = sorted({link['relation_type'] for link in links})
+    relation_codes = {relation: code for code, relation in enumerate(relation_types)}
+
+    full = graph.get('full', True)
+    if full:
+        positions = {node['id']: position for position, node in enumerate(nodes)}
+        endpoint = positions.__getitem__
+    else:
+        endpoint = int
+
+    columnar = {key: value for key, value in graph.items() if key not in ('nodes', 'links')}
+    columnar['nodes'] = {column: [node[column] for node in nodes] for column in NODE_COLUMNS}
+    columnar['nodes']['id'] = [int(node['id']) for node in nodes]
+    columnar['nodes']['category'] = [category_codes[node['category']] for node in nodes]
+    columnar['links'] = {
+        'id': [int(link['id']) for link in links],
+        'source': [endpoint(link['source']) for link in links],
+        'target': [endpoint(link['target']) for link in links],
+        'relation_type': [relation_codes[link['relation_type']] for link in links],
+    }
+    columnar['relation_types'] = relation_types
+    columnar['link_endpoints'] = 'index' if full else 'id'
+    for key in ('deleted_nodes', 'deleted_links'):
+        if key in columnar:
+            columnar[key] = [int(object_id) for object_id in columnar[key]]
+    return columnar
+
+
+def pack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def accepted_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩算法，优先 brotli"""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in accept_encoding.split(',')
+        if not part.strip().endswith(';q=0')
+    }
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, options=None):
+    options = options or get_options()
+    if encoding == 'br':
+        return brotli.compress(body, quality=options['BROTLI_QUALITY'])
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=options['GZIP_LEVEL'], mtime=0)
+    return body
@@ -0,0 +1,52 @@
+"""列表接口的筛选条件（django-filter）"""
+import django_filters
+from django.db.models import Exists, OuterRef
+
+from .models import Question
+from .question_bank import get_options
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class QuestionFilter(django_filters.FilterSet):
+    """?difficulty=1,2&node=3,4&category=代数&created_after=2024-01-01&created_before=2024-02-01
+
+    知识节点和分类用关联表的子查询筛选，一道题关联多个匹配的节点时也不会重复。
+    匹配的题目少时用 id IN (子查询)，按主键取出后排序；匹配的题目多时排序的代价高，
+    改用 EXISTS，沿 (created_at, id) 索引扫描并逐条检查关联，取满一页即可停止。
+    分面统计要读取全部匹配的题目，设置 use_exists = False 始终用子查询。
+    """
+    use_exists = True
+
+    difficulty = NumberInFilter(field_name='difficulty', lookup_expr='in')
+    node = NumberInFilter(method='filter_node')
+    category = CharInFilter(method='filter_category')
+    created_after = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Question
+        fields = ('difficulty', 'node', 'category', 'created_after', 'created_before')
+
+    def filter_node(self, queryset, name, value):
+        links = Question.knowledge_nodes.through.objects.filter(knowledgenode_id__in=value)
+        return self.filter_links(queryset, links)
+
+    def filter_category(self, queryset, name, value):
+        links = Question.knowledge_nodes.through.objects.filter(knowledgenode__category__in=value)
+        return self.filter_links(queryset, links)
+
+    def filter_links(self, queryset, links):
+        if not self.use_exists:
+            return queryset.filter(id__in=links.values('question_id'))
+        # 只数到阈值为止，热门节点也只读取索引的一小段
+        limit = get_options()['HOT_FILTER_ROWS']
+        if links[:limit].count() < limit:
+            return queryset.filter(id__in=links.values('question_id'))
+        return queryset.filter(Exists(links.filter(question_id=OuterRef('pk'))))
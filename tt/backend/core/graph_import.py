@@ -0,0 +1,239 @@
+"""知识图谱批量导入
+
+从 JSON Lines 或 CSV 流式读取节点和关联，按自然键更新或插入，不清空已有数据：
+- 节点以标题为键，内容、分类、层级、难度有变化时才更新；
+- 关联以 (源节点, 目标节点, 关系类型) 为键，已存在的忽略，端点按标题在内存中解析为ID。
+
+每批在一个事务中写入：节点用 bulk_create/bulk_update，数量大得多的关联和变更记录
+用 executemany 直接插入。新增和修改的对象都会写入变更记录，
+使图谱版本、增量同步和布局与逐条保存时一致。
+"""
+import csv
+import json
+import os
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .graph_index import refresh_index_version
+from .knowledge_map import refresh_map_version
+from .models import KnowledgeChange, KnowledgeLink, KnowledgeNode
+from .search import index_documents
+
+NODE_FIELDS = ('content', 'category', 'level', 'difficulty')
+MAX_ERRORS = 100  # 最多保留的错误明细条数，计数不受限制
+QUERY_CHUNK = 10000
+
+
+def insert_rows(model, fields, rows, ignore_conflicts=False):
+    """用 executemany 直接插入元组，跳过模型实例化，百万行时比 bulk_create 快数倍"""
+    opts = model._meta
+    on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+    columns = [opts.get_field(name).column for name in fields]
+    sql = '{} {} ({}) VALUES ({}) {}'.format(
+        connection.ops.insert_statement(on_conflict=on_conflict),
+        connection.ops.quote_name(opts.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+        connection.ops.on_conflict_suffix_sql([opts.get_field(name) for name in fields], on_conflict, None, None) or '',
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_records(path, fmt=None):
+    """逐行读取记录，返回 (行号, 字典) 的迭代器；格式默认按扩展名判断"""
+    fmt = fmt or ('csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            # 表头占第1行
+            for line_no, record in enumerate(csv.DictReader(f), start=2):
+                yield line_no, record
+            return
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, RecordError(f'JSON 格式错误: {e.msg}')
+                continue
+            yield line_no, record if isinstance(record, dict) else RecordError('每行应为一个 JSON 对象')
+
+
+def _batches(records, size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(record, key, max_length=None, required=False):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RecordError(f'缺少 {key}')
+    if max_length and len(value) > max_length:
+        raise RecordError(f'{key} 超过 {max_length} 个字符')
+    return value
+
+
+def _integer(record, key, default, choices=None):
+    value = record.get(key)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f'{key} 应为整数')
+    if choices and value not in choices:
+        raise RecordError(f'{key} 应为 {min(choices)}-{max(choices)}')
+    return value
+
+
+def parse_node(record):
+    return _text(record, 'title', 200, required=True), {
+        'content': _text(record, 'content'),
+        'category': _text(record, 'category', 50),
+        'level': _integer(record, 'level', 1),
+        'difficulty': _integer(record, 'difficulty', 1, {value for value, _ in KnowledgeNode.DIFFICULTY_CHOICES}),
+    }
+
+
+def parse_link(record):
+    return (_text(record, 'source', required=True), _text(record, 'target', required=True),
+            _text(record, 'relation_type', 50, required=True))
+
+
+class GraphImporter:
+    """导入状态：标题到ID的映射和各项计数"""
+
+    def __init__(self, batch_size=20000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # 标题重复时使用ID最小的节点
+        self.titles = dict(KnowledgeNode.objects.order_by('-id').values_list('title', 'id'))
+        self.stats = Counter()
+        self.errors = []
+        self._placeholder = 0
+
+    def error(self, label, line_no, message):
+        self.stats['errors'] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'{label} 第{line_no}行: {message}')
+
+    def import_nodes(self, records, progress=None):
+        for batch in _batches(records, self.batch_size):
+            nodes = {}
+            for line_no, record in batch:
+                self.stats['node_rows'] += 1
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    title, values = parse_node(record)
+                except RecordError as e:
+                    self.error('节点', line_no, e)
+                    continue
+                nodes[title] = values  # 同一批内重复的标题以最后一行为准
+            self._write_nodes(nodes)
+            if progress:
+                progress(self)
+
+    def _write_nodes(self, nodes):
+        existing = {self.titles[title]: (title, values) for title, values in nodes.items() if title in self.titles}
+        new_titles = [title for title in nodes if title not in self.titles]
+
+        changed = []
+        documents = []
+        now = timezone.now()
+        ids = list(existing)
+        # 分段查询，避免超出 SQLite 的参数个数限制
+        for start in range(0, len(ids), QUERY_CHUNK):
+            rows = KnowledgeNode.objects.filter(id__in=ids[start:start + QUERY_CHUNK]).values('id', *NODE_FIELDS)
+            for row in rows:
+                title, values = existing[row['id']]
+                if any(row[field] != values[field] for field in NODE_FIELDS):
+                    changed.append(KnowledgeNode(id=row['id'], updated_at=now, **values))
+                    documents.append((row['id'], title, values['content']))
+        self.stats['nodes_updated'] += len(changed)
+        self.stats['nodes_unchanged'] += len(existing) - len(changed)
+        self.stats['nodes_created'] += len(new_titles)
+
+        if self.dry_run:
+            for title in new_titles:
+                self._placeholder -= 1
+                self.titles[title] = self._placeholder
+            return
+
+        with transaction.atomic():
+            last_id = KnowledgeNode.objects.aggregate(last=Max('id'))['last'] or 0
+            KnowledgeNode.objects.bulk_create([KnowledgeNode(title=title, **nodes[title]) for title in new_titles])
+            KnowledgeNode.objects.bulk_update(changed, NODE_FIELDS + ('updated_at',))
+            created_ids = []
+            for title, node_id in KnowledgeNode.objects.filter(id__gt=last_id).values_list('title', 'id'):
+                self.titles.setdefault(title, node_id)
+                created_ids.append(node_id)
+                if title in nodes:
+                    documents.append((node_id, title, nodes[title]['content']))
+            self._record_changes('node', created_ids + [node.id for node in changed])
+            # bulk_create/bulk_update 不触发信号，全文索引也要自己更新
+            index_documents('node', documents)
+
+    def import_links(self, records, progress=None):
+        for batch in _batches(records, self.batch_size):
+            keys = set()
+            for line_no, record in batch:
+                self.stats['link_rows'] += 1
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    source, target, relation_type = parse_link(record)
+                except RecordError as e:
+                    self.error('关联', line_no, e)
+                    continue
+                source_id, target_id = self.titles.get(source), self.titles.get(target)
+                if source_id is None or target_id is None:
+                    self.stats['links_unresolved'] += 1
+                    self.error('关联', line_no, f'找不到节点 {source if source_id is None else target}')
+                    continue
+                keys.add((source_id, target_id, relation_type))
+            self._write_links(keys)
+            if progress:
+                progress(self)
+
+    def _write_links(self, keys):
+        if self.dry_run:
+            # 试运行时不查询已有关联，新增数为上限
+            self.stats['links_created'] += len(keys)
+            return
+        with transaction.atomic():
+            last_id = KnowledgeLink.objects.aggregate(last=Max('id'))['last'] or 0
+            now = connection.ops.adapt_datetimefield_value(timezone.now())
+            insert_rows(KnowledgeLink, ('source', 'target', 'relation_type', 'created_at'),
+                        [key + (now,) for key in keys], ignore_conflicts=True)
+            # 忽略冲突时拿不到主键，用插入前的最大ID找出新增的关联
+            created_ids = list(KnowledgeLink.objects.filter(id__gt=last_id).values_list('id', flat=True))
+            self.stats['links_created'] += len(created_ids)
+            self.stats['links_existing'] += len(keys) - len(created_ids)
+            self._record_changes('link', created_ids)
+
+    def _record_changes(self, kind, object_ids):
+        # bulk_create/bulk_update 不触发模型信号，需要自己写变更记录
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        insert_rows(KnowledgeChange, ('kind', 'object_id', 'action', 'created_at'),
+                    [(kind, object_id, 'upsert', now) for object_id in object_ids])
+        if object_ids:
+            transaction.on_commit(refresh_map_version)
+            transaction.on_commit(refresh_index_version)
@@ -0,0 +1,219 @@
+"""知识图谱邻接索引
+
+把 KnowledgeLink 压缩为 CSR 格式的整数数组（出边和入边各一份），
+按结构版本保存为 .npy 文件，各工作进程以内存映射方式只读加载、共享同一份页缓存。
+结构版本是节点或关联最近一次新增、修改、删除的变更ID，布局和指标的更新不改变它；
+事务提交后写入共享缓存且不过期，版本变化后第一个查询的进程重建索引，其余进程直接加载新文件。
+邻域查询只读共享缓存中的版本号和内存中的数组，不访问数据库。
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import KnowledgeChange, KnowledgeLink, KnowledgeNode
+
+INDEX_VERSION_KEY = 'knowledge_index:version'
+
+ARRAYS = ('node_ids', 'difficulty', 'level', 'out_indptr', 'out_indices', 'out_relations',
+          'in_indptr', 'in_indices', 'in_relations')
+# 数组组成变化时递增，旧格式的索引文件会被重建
+LAYOUT = 2
+
+GraphIndex = namedtuple('GraphIndex', ('version', 'relations') + ARRAYS)
+
+
+def get_options():
+    options = {
+        'DIR': os.path.join(settings.BASE_DIR, 'knowledge_index'),
+        'MAX_DEPTH': 3,
+        'KEEP_VERSIONS': 2,  # 保留的旧版本数，正在使用旧索引的进程仍可读取
+    }
+    options.update(getattr(settings, 'KNOWLEDGE_INDEX', {}))
+    return options
+
+
+def structure_version():
+    """节点或关联最近一次新增、修改、删除的变更ID"""
+    changes = KnowledgeChange.objects.filter(action__in=('upsert', 'delete'))
+    return changes.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def refresh_index_version():
+    """事务提交后把结构版本写入共享缓存，并发提交时较旧的版本不覆盖较新的"""
+    version = structure_version()
+    if version > (cache.get(INDEX_VERSION_KEY) or 0):
+        cache.set(INDEX_VERSION_KEY, version, None)
+    return version
+
+
+def get_index_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        # 只在共享缓存被清空后读一次数据库
+        version = refresh_index_version()
+    return version
+
+
+def _csr(count, rows, cols, relations):
+    """按行排序后生成 (indptr, indices, relations)"""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), relations[order].astype(np.int16)
+
+
+def build_arrays():
+    """从数据库读取节点和关联，返回 (关系类型列表, 数组字典)"""
+    nodes = np.array(
+        list(KnowledgeNode.objects.order_by('id').values_list('id', 'difficulty', 'level')), dtype=np.int64
+    ).reshape(-1, 3)
+    links = list(KnowledgeLink.objects.values_list('source_id', 'target_id', 'relation_type'))
+
+    node_ids = nodes[:, 0]
+    relations = sorted({relation for _, _, relation in links})
+    relation_codes = {relation: code for code, relation in enumerate(relations)}
+
+    edges = np.array([(source, target, relation_codes[relation]) for source, target, relation in links],
+                     dtype=np.int64).reshape(-1, 3)
+    sources = np.searchsorted(node_ids, edges[:, 0])
+    targets = np.searchsorted(node_ids, edges[:, 1])
+
+    count = len(node_ids)
+    out_indptr, out_indices, out_relations = _csr(count, sources, targets, edges[:, 2])
+    in_indptr, in_indices, in_relations = _csr(count, targets, sources, edges[:, 2])
+    return relations, {
+        'node_ids': node_ids,
+        'difficulty': nodes[:, 1].astype(np.int8),
+        'level': nodes[:, 2].astype(np.int32),
+        'out_indptr': out_indptr,
+        'out_indices': out_indices,
+        'out_relations': out_relations,
+        'in_indptr': in_indptr,
+        'in_indices': in_indices,
+        'in_relations': in_relations,
+    }
+
+
+def _version_dir(directory, version):
+    return os.path.join(directory, f'v{version}')
+
+
+def write_index(version, directory=None):
+    """生成指定版本的索引文件，先写临时目录再原子重命名"""
+    directory = directory or get_options()['DIR']
+    os.makedirs(directory, exist_ok=True)
+    relations, arrays = build_arrays()
+
+    tmp_dir = tempfile.mkdtemp(prefix=f'v{version}.', dir=directory)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'layout': LAYOUT, 'relations': relations}, f, ensure_ascii=False)
+    try:
+        os.rename(tmp_dir, _version_dir(directory, version))
+    except OSError:
+        # 其他进程已经生成了同一版本
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _remove_old_versions(directory, version)
+
+
+def _remove_old_versions(directory, version):
+    keep = get_options()['KEEP_VERSIONS']
+    versions = sorted(
+        int(name[1:]) for name in os.listdir(directory)
+        if name.startswith('v') and name[1:].isdigit()
+    )
+    for old in versions:
+        if old < version and old not in versions[-keep - 1:]:
+            # Linux 上已映射的文件删除后仍可读取；Windows 上删除失败则留到下次
+            shutil.rmtree(_version_dir(directory, old), ignore_errors=True)
+
+
+def load_index(version, directory=None):
+    """以内存映射方式加载索引，文件不存在时先生成"""
+    directory = directory or get_options()['DIR']
+    path = _version_dir(directory, version)
+    if not os.path.isdir(path):
+        write_index(version, directory)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('layout') != LAYOUT:
+        shutil.rmtree(path, ignore_errors=True)
+        return load_index(version, directory)
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+    return GraphIndex(version=version, relations=meta['relations'], **arrays)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """获取当前结构版本的索引，版本未变化时直接复用已加载的数组"""
+    global _index
+    version = get_index_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = load_index(version)
+        return _index
+
+
+def neighborhood(index, node_id, depth=1, relation_types=None, difficulties=None, direction='both'):
+    """k 跳邻域，返回 (节点列表 [(节点ID, 跳数)], 关联列表 [(源, 目标, 关系类型)])；节点不存在时返回 None
+
+    relation_types 限制经过的关联类型，difficulties 限制经过的节点难度（起点不受限制）。
+    """
+    node_ids = index.node_ids
+    start = int(np.searchsorted(node_ids, node_id))
+    if start >= len(node_ids) or node_ids[start] != node_id:
+        return None
+
+    allowed_relations = None
+    if relation_types:
+        allowed_relations = {code for code, relation in enumerate(index.relations) if relation in relation_types}
+    allowed_difficulty = set(difficulties) if difficulties else None
+
+    sides = []
+    if direction in ('out', 'both'):
+        sides.append((index.out_indptr, index.out_indices, index.out_relations, True))
+    if direction in ('in', 'both'):
+        sides.append((index.in_indptr, index.in_indices, index.in_relations, False))
+
+    depths = {start: 0}
+    edges = set()
+    frontier = [start]
+    for hop in range(1, depth + 1):
+        next_frontier = []
+        for position in frontier:
+            for indptr, indices, relations, outgoing in sides:
+                begin, end = indptr[position], indptr[position + 1]
+                for neighbor, relation in zip(indices[begin:end].tolist(), relations[begin:end].tolist()):
+                    if allowed_relations is not None and relation not in allowed_relations:
+                        continue
+                    if allowed_difficulty is not None and int(index.difficulty[neighbor]) not in allowed_difficulty:
+                        continue
+                    edges.add((position, neighbor, relation) if outgoing else (neighbor, position, relation))
+                    if neighbor not in depths:
+                        depths[neighbor] = hop
+                        next_frontier.append(neighbor)
+        frontier = next_frontier
+        if not frontier:
+            break
+
+    nodes = [(int(node_ids[position]), hop) for position, hop in sorted(depths.items(), key=lambda item: item[1])]
+    links = [
+        (int(node_ids[source]), int(node_ids[target]), index.relations[relation])
+        for source, target, relation in sorted(edges)
+    ]
+    return nodes, links
@@ -0,0 +1,136 @@
+"""OCR异步任务队列
+
+任务只在进程内的线程池中执行，进程重启后排队中、处理中的任务不会继续，
+sweep_jobs（进程内第一次提交任务时，以及 sweep_ocr_jobs 命令）把超时的任务标记为失败。
+任务结束后上传的图片不再需要，随即删除。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import OCRJob
+from .metrics import span
+from .ocr import run_ocr_pipeline
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """获取进程内共享的识别线程池，创建时清理之前的进程遗留的任务"""
+    global _executor, _slots
+    created = False
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, 'OCR_JOB_WORKERS', 2)
+            queue_size = getattr(settings, 'OCR_JOB_QUEUE_SIZE', 20)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-job')
+            # 排队中和处理中的任务总数上限
+            _slots = threading.BoundedSemaphore(workers + queue_size)
+            created = True
+    if created:
+        sweep_jobs()
+    return _executor
+
+
+def submit_ocr_job(job_id):
+    """提交识别任务，队列已满时返回 False"""
+    executor = get_executor()
+    if not _slots.acquire(blocking=False):
+        return False
+    try:
+        executor.submit(_run_job, job_id)
+    except RuntimeError:
+        _slots.release()
+        return False
+    return True
+
+
+def _run_job(job_id):
+    try:
+        run_ocr_job(job_id)
+    finally:
+        _slots.release()
+        # 工作线程不会经过请求周期，需要手动释放数据库连接
+        close_old_connections()
+
+
+def run_ocr_job(job_id):
+    """执行单个识别任务并保存结果"""
+    close_old_connections()
+    job = OCRJob.objects.get(id=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    timings = {'queue': round((job.started_at - job.created_at).total_seconds() * 1000, 1)}
+    try:
+        with span('upload_read', timings):
+            with job.image.open('rb') as image_file:
+                data = image_file.read()
+
+        text, result, stage_timings = run_ocr_pipeline(data)
+        timings.update(stage_timings)
+
+        job.text = text
+        job.result = result
+        job.status = 'success'
+    except Exception as e:
+        logger.exception("识别任务 %s 出错: %s", job_id, e)
+        job.error = str(e)
+        job.status = 'failed'
+
+    delete_job_image(job)
+    job.timings = timings
+    job.finished_at = timezone.now()
+    job.save(update_fields=['text', 'result', 'error', 'status', 'timings', 'finished_at', 'image'])
+    return job
+
+
+def delete_job_image(job):
+    """删除任务的图片，不保存任务"""
+    if not job.image:
+        return
+    try:
+        job.image.delete(save=False)
+    except OSError as e:
+        logger.warning("删除识别任务 %s 的图片出错: %s", job.id, e)
+
+
+def fail_job(job, error):
+    job.status = 'failed'
+    job.error = error
+    job.finished_at = timezone.now()
+    delete_job_image(job)
+    job.save(update_fields=['status', 'error', 'finished_at', 'image'])
+
+
+def sweep_jobs(timeout=None):
+    """把创建超过 timeout 秒仍未结束的任务标记为失败，并删除已结束任务遗留的图片
+
+    返回 (标记为失败的任务数, 删除图片的任务数)。
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'OCR_JOB_TIMEOUT', 600)
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    failed = 0
+    for job in OCRJob.objects.filter(status__in=('pending', 'running'), created_at__lt=deadline):
+        fail_job(job, '识别任务超时未完成')
+        failed += 1
+
+    cleaned = 0
+    for job in OCRJob.objects.filter(status__in=('success', 'failed')).exclude(image=''):
+        delete_job_image(job)
+        job.save(update_fields=['image'])
+        cleaned += 1
+    if failed or cleaned:
+        logger.info("清理识别任务：%s 个超时任务标记为失败，删除 %s 个任务的图片", failed, cleaned)
+    return failed, cleaned
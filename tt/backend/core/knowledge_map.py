@@ -0,0 +1,220 @@
+"""知识图谱快照与增量同步
+
+KnowledgeNode/KnowledgeLink 的每次新增、修改、删除都会写入一条 KnowledgeChange，
+其自增ID就是图谱版本号。完整图谱序列化后的JSON按版本号保存在共享缓存中，
+版本变化后的下一次请求重建一次快照；版本号同时作为强 ETag，
+客户端未变化时只需读取缓存中的版本号，不访问数据库。
+
+客户端携带 since=<版本号> 时只返回此后变化的节点和关联，
+落后太多（变更记录已被清理）时退回完整快照。
+"""
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .encoding import compress, get_options as get_compression_options, pack, to_columnar
+from .graph_index import structure_version
+from .models import KnowledgeChange, KnowledgeLink, KnowledgeNode
+
+MAP_VERSION_KEY = 'knowledge_map:version'
+# 布局、指标等派生字段整批更新时只写一条变更记录，object_id 为 0
+BATCH_OBJECT_ID = 0
+MAP_SNAPSHOT_KEY = 'knowledge_map:snapshot:{version}:{variant}'
+SNAPSHOT_TTL = 24 * 3600
+# 缓存中的版本号只是数据库的镜像，定期过期重新读取，并发提交时即使写入了旧值也能自动恢复
+VERSION_TTL = 60
+
+
+def get_options():
+    options = {
+        'MAX_DELTA_CHANGES': 1000,  # 增量超过该条数时直接返回完整快照，也是变更记录的保留条数
+        'MAX_TOP': 5000,  # map?top=N 允许的最大 N
+    }
+    options.update(getattr(settings, 'KNOWLEDGE_MAP', {}))
+    return options
+
+
+def _latest_change_id():
+    return KnowledgeChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def get_map_version():
+    """当前图谱版本号"""
+    version = cache.get(MAP_VERSION_KEY)
+    if version is None:
+        version = _latest_change_id()
+        cache.set(MAP_VERSION_KEY, version, VERSION_TTL)
+    return version
+
+
+def refresh_map_version():
+    """事务提交后把最新的变更ID写入缓存"""
+    cache.set(MAP_VERSION_KEY, _latest_change_id(), VERSION_TTL)
+
+
+def record_change(kind, object_id, action):
+    KnowledgeChange.objects.create(kind=kind, object_id=object_id, action=action)
+
+
+def record_batch_change(action):
+    """一次布局或指标计算只递增一次版本，避免大量变更记录挤掉节点和关联的变更"""
+    record_change('node', BATCH_OBJECT_ID, action)
+
+
+def map_variant(fmt='json', encoding=None, top=None):
+    """快照的表示形式：编码格式加压缩算法，只取中心性最高的部分节点时再加上节点数"""
+    variant = f'{fmt}.top{top}' if top else fmt
+    return f'{variant}.{encoding}' if encoding else variant
+
+
+def map_etag(version, variant='json'):
+    # 不同表示形式的字节不同，强 ETag 需要区分
+    return f'"map-{version}"' if variant == 'json' else f'"map-{version}-{variant}"'
+
+
+def _node_data(node):
+    return {
+        'id': str(node['id']),
+        'name': node['title'],
+        'value': node['level'],
+        'category': node['category'],
+        'content': node['content'],
+        'difficulty': node['difficulty'],
+        # 预计算的布局坐标，尚未布局的节点为 null，由前端自行布局
+        'x': node['layout__x'],
+        'y': node['layout__y'],
+        'pagerank': node['pagerank'],
+        'betweenness': node['betweenness'],
+        'in_degree': node['in_degree'],
+        'out_degree': node['out_degree'],
+    }
+
+
+def _link_data(link_id, source_id, target_id, relation_type):
+    return {
+        'id': str(link_id),
+        'source': str(source_id),
+        'target': str(target_id),
+        'value': 1,
+        'relation_type': relation_type
+    }
+
+
+NODE_FIELDS = ('id', 'title', 'level', 'category', 'content', 'difficulty', 'layout__x', 'layout__y',
+               'pagerank', 'betweenness', 'in_degree', 'out_degree')
+LINK_FIELDS = ('id', 'source_id', 'target_id', 'relation_type')
+
+
+def build_snapshot(version, top=None):
+    """从数据库生成完整图谱，只查询两次（坐标随节点一起连接查询）
+
+    top 为 N 时只取 PageRank 最高的 N 个节点（按 PageRank 降序）和它们之间的关联。
+    """
+    if top:
+        nodes = list(KnowledgeNode.objects.order_by('-pagerank', 'id').values(*NODE_FIELDS)[:top])
+        ids = [node['id'] for node in nodes]
+        links = KnowledgeLink.objects.filter(source_id__in=ids, target_id__in=ids)
+    else:
+        nodes = list(KnowledgeNode.objects.order_by('id').values(*NODE_FIELDS))
+        links = KnowledgeLink.objects.all()
+    links = links.order_by('id').values_list(*LINK_FIELDS)
+
+    snapshot = {
+        'version': version,
+        'full': True,
+        'nodes': [_node_data(node) for node in nodes],
+        'links': [_link_data(*link) for link in links],
+        'categories': sorted({node['category'] for node in nodes}),
+    }
+    if top:
+        snapshot['top'] = top
+    return snapshot
+
+
+def encode_graph(data, fmt='json'):
+    """按格式编码 map 接口的数据：json、columnar、msgpack、columnar-msgpack"""
+    if fmt.startswith('columnar'):
+        data = to_columnar(data)
+    if fmt.endswith('msgpack'):
+        return pack(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def get_snapshot(version, fmt='json', encoding=None, top=None):
+    """获取指定版本、格式的快照，返回 (实际使用的压缩算法, 字节)
+
+    每种表示形式在每个版本只编码和压缩一次；小于压缩阈值时不压缩。
+    """
+    key = MAP_SNAPSHOT_KEY.format(version=version, variant=map_variant(fmt, encoding, top))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    if fmt == 'json' and encoding is None:
+        # 先读版本号再查询数据库：构建期间发生的变化会使版本号再次递增，不会被旧数据覆盖
+        cached = (None, encode_graph(build_snapshot(version, top)))
+        if not top:
+            prune_changes(version)
+    else:
+        body = get_snapshot(version, top=top)[1]
+        if fmt != 'json':
+            body = encode_graph(json.loads(body), fmt)
+        options = get_compression_options()
+        if encoding is None or len(body) < options['MIN_SIZE']:
+            cached = (None, body)
+        else:
+            cached = (encoding, compress(body, encoding, options))
+    cache.set(key, cached, SNAPSHOT_TTL)
+    return cached
+
+
+def prune_changes(version):
+    """清理不再需要的变更记录：比它们更旧的客户端只能拿完整快照
+
+    最近一条节点或关联的新增、修改、删除记录始终保留，邻接索引、中心性指标的结构版本由它得到。
+    """
+    KnowledgeChange.objects.filter(id__lte=version - get_options()['MAX_DELTA_CHANGES']).exclude(
+        id=structure_version()
+    ).delete()
+
+
+def get_delta(since, version):
+    """返回 since 之后的变化；无法增量同步时返回 None"""
+    if since == version:
+        return {'version': version, 'full': False}
+    max_changes = get_options()['MAX_DELTA_CHANGES']
+    if since > version or version - since > max_changes:
+        return None
+
+    changes = KnowledgeChange.objects.filter(id__gt=since, id__lte=version)
+    # 整批更新了派生字段，变化的节点不单独记录，返回完整快照
+    if changes.filter(object_id=BATCH_OBJECT_ID, action__in=('layout', 'metrics')).exists():
+        return None
+
+    # 同一对象多次变化只保留最后一次
+    latest = {}
+    for kind, object_id, action in changes.order_by('id').values_list('kind', 'object_id', 'action'):
+        latest[kind, object_id] = action
+
+    changed = {'node': [], 'link': []}
+    deleted = {'node': [], 'link': []}
+    for (kind, object_id), action in latest.items():
+        # 布局、指标更新只改变派生字段，和修改一样返回整个节点
+        (deleted if action == 'delete' else changed)[kind].append(object_id)
+
+    nodes = KnowledgeNode.objects.filter(id__in=changed['node']).order_by('id').values(*NODE_FIELDS)
+    links = KnowledgeLink.objects.filter(id__in=changed['link']).order_by('id').values_list(*LINK_FIELDS)
+    delta = {
+        'version': version,
+        'full': False,
+        'nodes': [_node_data(node) for node in nodes],
+        'links': [_link_data(*link) for link in links],
+        'deleted_nodes': [str(object_id) for object_id in sorted(deleted['node'])],
+        'deleted_links': [str(object_id) for object_id in sorted(deleted['link'])],
+    }
+    if delta['nodes'] or delta['deleted_nodes']:
+        # 分类列表很短，有节点变化时整体返回
+        delta['categories'] = sorted(KnowledgeNode.objects.values_list('category', flat=True).distinct())
+    return delta
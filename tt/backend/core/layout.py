@@ -0,0 +1,371 @@
+"""知识图谱布局
+
+服务端预先计算节点坐标，随 map 接口返回，前端只需渲染。
+
+力导向布局（Fruchterman-Reingold），斥力用四叉树网格近似：
+每一层网格上，单元格只与父单元格相邻、自身不相邻的单元格（最多27个）按质心计算斥力，
+最细一层的相邻单元格内逐对精确计算，每轮迭代的计算量接近 O(N)，全部用 NumPy 向量化。
+
+节点或关联变化后只对受影响的节点及其邻居做增量布局，其余节点保持不动，
+力的计算也只在这些节点和与它们相连的固定节点组成的子图上进行。
+"""
+import logging
+import math
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+
+from .knowledge_map import get_options as get_map_options, record_batch_change, refresh_map_version
+from .models import KnowledgeChange, KnowledgeLink, KnowledgeNode, NodeLayout
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'graph_layout:lock'
+
+LEAF_SIZE = 4
+# 最细一层单元格内的节点数上限，超过时继续细分网格
+MAX_LEAF_NODES = 8
+MAX_DEPTH = 10
+
+
+def get_options():
+    options = {
+        'EDGE_LENGTH': 100,  # 理想的关联长度，坐标单位与前端像素一致
+        'ITERATIONS': 200,  # 完整布局的迭代次数
+        'INCREMENTAL_ITERATIONS': 50,
+        'GRAVITY': 0.05,  # 把各连通分量拉向中心
+        # 节点或关联变化后在 Web 进程中自动增量布局；关闭时由定时执行 compute_graph_layout --incremental 完成
+        'AUTO_RELAYOUT': False,
+        'DEBOUNCE': 5,  # 连续修改时等待多少秒后再布局，单位：秒
+        'LOCK_TIMEOUT': 300,  # 跨进程布局锁的过期时间，单位：秒
+    }
+    options.update(getattr(settings, 'GRAPH_LAYOUT', {}))
+    return options
+
+
+def _cell_coords(positions, origin, size, cells):
+    coords = np.floor((positions - origin) / size * cells).astype(np.int64)
+    return np.clip(coords, 0, cells - 1)
+
+
+def _far_field(positions, origin, size, depth, k2):
+    """各层网格中不相邻单元格的斥力，在单元格质心处计算后分给格内节点"""
+    displacement = np.zeros_like(positions)
+    for level in range(2, depth + 1):
+        cells = 1 << level
+        coords = _cell_coords(positions, origin, size, cells)
+        flat = coords[:, 0] * cells + coords[:, 1]
+        mass = np.bincount(flat, minlength=cells * cells).astype(np.float64)
+        sum_x = np.bincount(flat, weights=positions[:, 0], minlength=cells * cells)
+        sum_y = np.bincount(flat, weights=positions[:, 1], minlength=cells * cells)
+
+        occupied = np.nonzero(mass)[0]
+        cx, cy = occupied // cells, occupied % cells
+        centroid_x = sum_x[occupied] / mass[occupied]
+        centroid_y = sum_y[occupied] / mass[occupied]
+        force = np.zeros((len(occupied), 2))
+
+        # 父单元格的相邻单元格（含自身）的子单元格中，与自身不相邻的构成交互列表
+        for parent_dx in (-1, 0, 1):
+            for child_dx in (0, 1):
+                tx = 2 * (cx // 2 + parent_dx) + child_dx
+                for parent_dy in (-1, 0, 1):
+                    for child_dy in (0, 1):
+                        ty = 2 * (cy // 2 + parent_dy) + child_dy
+                        valid = ((tx >= 0) & (tx < cells) & (ty >= 0) & (ty < cells)
+                                 & ((np.abs(tx - cx) > 1) | (np.abs(ty - cy) > 1)))
+                        if not valid.any():
+                            continue
+                        target = np.where(valid, tx * cells + ty, 0)
+                        target_mass = np.where(valid, mass[target], 0.0)
+                        with np.errstate(invalid='ignore', divide='ignore'):
+                            dx = centroid_x - np.where(valid, sum_x[target] / np.maximum(mass[target], 1), 0)
+                            dy = centroid_y - np.where(valid, sum_y[target] / np.maximum(mass[target], 1), 0)
+                        dist2 = np.maximum(dx * dx + dy * dy, 1e-2)
+                        scale = k2 * target_mass / dist2
+                        force[:, 0] += dx * scale
+                        force[:, 1] += dy * scale
+
+        cell_force = np.zeros((cells * cells, 2))
+        cell_force[occupied] = force
+        displacement += cell_force[flat]
+    return displacement
+
+
+def _near_field(positions, origin, size, depth, k2):
+    """最细一层相邻单元格内逐对精确计算斥力"""
+    count = len(positions)
+    cells = 1 << depth
+    coords = _cell_coords(positions, origin, size, cells)
+    flat = coords[:, 0] * cells + coords[:, 1]
+    order = np.argsort(flat, kind='stable')
+    occupancy = np.bincount(flat, minlength=cells * cells)
+    starts = np.concatenate([[0], np.cumsum(occupancy)[:-1]])
+
+    # 展开成 (节点, 相邻单元格中的另一个节点) 的点对
+    nodes = np.arange(count)
+    firsts, others = [], []
+    for dx in (-1, 0, 1):
+        tx = coords[:, 0] + dx
+        for dy in (-1, 0, 1):
+            ty = coords[:, 1] + dy
+            valid = (tx >= 0) & (tx < cells) & (ty >= 0) & (ty < cells)
+            target = (tx * cells + ty)[valid]
+            member_count = occupancy[target]
+            total = int(member_count.sum())
+            offsets = np.arange(total) - np.repeat(np.cumsum(member_count) - member_count, member_count)
+            firsts.append(np.repeat(nodes[valid], member_count))
+            others.append(order[np.repeat(starts[target], member_count) + offsets])
+    first = np.concatenate(firsts)
+    other = np.concatenate(others)
+    keep = first != other
+    first, other = first[keep], other[keep]
+
+    delta = positions[first] - positions[other]
+    scale = k2 / np.maximum((delta * delta).sum(axis=1), 1e-2)
+    displacement = np.empty_like(positions)
+    displacement[:, 0] = np.bincount(first, weights=delta[:, 0] * scale, minlength=count)
+    displacement[:, 1] = np.bincount(first, weights=delta[:, 1] * scale, minlength=count)
+    return displacement
+
+
+def repulsion(positions, k):
+    """近似的斥力位移"""
+    count = len(positions)
+    if count < 2:
+        return np.zeros_like(positions)
+    origin = positions.min(axis=0)
+    size = max(float((positions.max(axis=0) - origin).max()), 1e-6) * (1 + 1e-9)
+    depth = min(MAX_DEPTH, max(2, math.ceil(math.log(max(count / LEAF_SIZE, 1), 4))))
+    # 节点分布不均匀时按最拥挤的单元格加深网格，避免逐对计算退化为平方复杂度
+    while depth < MAX_DEPTH:
+        cells = 1 << depth
+        coords = _cell_coords(positions, origin, size, cells)
+        if np.bincount(coords[:, 0] * cells + coords[:, 1]).max() <= MAX_LEAF_NODES:
+            break
+        depth += 1
+    k2 = k * k
+    return _far_field(positions, origin, size, depth, k2) + _near_field(positions, origin, size, depth, k2)
+
+
+def force_layout(positions, sources, targets, iterations, k, gravity, movable=None, temperature=None):
+    """在 positions 上原地迭代，movable 为 None 时所有节点都可移动"""
+    count = len(positions)
+    if count == 0:
+        return positions
+    temperature = temperature if temperature is not None else k * math.sqrt(count) / 10
+    for step in range(iterations):
+        displacement = repulsion(positions, k)
+
+        delta = positions[sources] - positions[targets]
+        dist = np.sqrt(np.maximum((delta * delta).sum(axis=1), 1e-4))
+        pull = delta * (dist / k)[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] -= np.bincount(sources, weights=pull[:, axis], minlength=count)
+            displacement[:, axis] += np.bincount(targets, weights=pull[:, axis], minlength=count)
+
+        displacement -= gravity * (positions - positions.mean(axis=0))
+
+        length = np.sqrt(np.maximum((displacement * displacement).sum(axis=1), 1e-12))
+        limit = temperature * (1 - step / iterations)
+        step_vector = displacement * (np.minimum(length, limit) / length)[:, None]
+        if movable is not None:
+            step_vector[~movable] = 0
+        positions += step_vector
+    return positions
+
+
+def _coarsen(count, sources, targets, rng):
+    """互相选中的相邻节点两两合并，返回 (每个节点所属的粗节点, 粗节点数, 粗图的边)"""
+    key = rng.random(count)
+    ends = np.concatenate([sources, targets])
+    others = np.concatenate([targets, sources])
+    # 每个节点选择随机键最小的邻居
+    order = np.lexsort((key[others], ends))
+    first = np.unique(ends[order], return_index=True)[1]
+    choice = np.full(count, -1)
+    choice[ends[order][first]] = others[order][first]
+
+    nodes = np.arange(count)
+    mutual = (choice >= 0) & (choice[np.maximum(choice, 0)] == nodes)
+    representative = np.where(mutual, np.minimum(nodes, choice), nodes)
+    _, groups = np.unique(representative, return_inverse=True)
+    coarse_count = int(groups.max()) + 1
+
+    edges = np.unique(np.sort(np.stack([groups[sources], groups[targets]], axis=1), axis=1), axis=0)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return groups, coarse_count, edges[:, 0], edges[:, 1]
+
+
+def multilevel_layout(count, sources, targets, iterations, k, gravity, rng):
+    """多层布局：逐层合并节点，先布局最粗的图，再逐层展开并局部调整"""
+    levels = []
+    level_count, level_sources, level_targets = count, sources, targets
+    while level_count > 50:
+        groups, coarse_count, coarse_sources, coarse_targets = _coarsen(level_count, level_sources, level_targets, rng)
+        if coarse_count > level_count * 0.9:
+            break
+        levels.append((level_count, level_sources, level_targets, groups))
+        level_count, level_sources, level_targets = coarse_count, coarse_sources, coarse_targets
+
+    spread = k * math.sqrt(max(level_count, 1))
+    positions = rng.uniform(-spread / 2, spread / 2, size=(level_count, 2))
+    force_layout(positions, level_sources, level_targets, iterations, k, gravity)
+    for fine_count, fine_sources, fine_targets, groups in reversed(levels):
+        # 面积与节点数成正比，展开后按比例放大，合并的节点在原位置附近分开
+        positions = positions[groups] * math.sqrt(fine_count / len(positions))
+        positions += rng.normal(0, k / 4, size=positions.shape)
+        force_layout(positions, fine_sources, fine_targets, max(iterations // 8, 10), k, gravity, temperature=k * 2)
+    return positions
+
+
+def _load_graph():
+    node_ids = np.array(list(KnowledgeNode.objects.order_by('id').values_list('id', flat=True)), dtype=np.int64)
+    links = np.array(list(KnowledgeLink.objects.values_list('source_id', 'target_id')), dtype=np.int64).reshape(-1, 2)
+    sources = np.searchsorted(node_ids, links[:, 0])
+    targets = np.searchsorted(node_ids, links[:, 1])
+    keep = sources != targets
+    return node_ids, sources[keep], targets[keep]
+
+
+def compute_layout(incremental=False, iterations=None, seed=0, allow_full=True):
+    """计算布局，返回 (节点ID数组, 坐标数组, 移动过的节点掩码, 布局对应的图谱版本)
+
+    增量布局无法进行（尚未布局，或上次布局之后的变更记录可能已被清理）时改为完整布局；
+    allow_full 为 False 时不布局，返回的掩码全为 False。
+    """
+    options = get_options()
+    k = options['EDGE_LENGTH']
+    # 先记下版本，布局期间的修改会在下一次增量布局中处理
+    version = KnowledgeChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+    node_ids, sources, targets = _load_graph()
+    count = len(node_ids)
+    rng = np.random.default_rng(seed)
+    spread = k * math.sqrt(max(count, 1))
+
+    stored = {node_id: (x, y, layout_version) for node_id, x, y, layout_version in
+              NodeLayout.objects.values_list('node_id', 'x', 'y', 'version')}
+    # 上次布局之后的变更记录超过保留条数时，可能已被 prune_changes 清理，无法确定受影响的节点
+    last_version = min((layout_version for _, _, layout_version in stored.values()), default=0)
+    pruned = version - last_version > get_map_options()['MAX_DELTA_CHANGES']
+    if not incremental or not stored or pruned:
+        if not allow_full:
+            return node_ids, np.zeros((count, 2)), np.zeros(count, dtype=bool), version
+        positions = multilevel_layout(count, sources, targets, iterations or options['ITERATIONS'],
+                                      k, options['GRAVITY'], rng)
+        return node_ids, positions, np.ones(count, dtype=bool), version
+
+    positions = rng.uniform(-spread / 2, spread / 2, size=(count, 2))
+    placed = np.zeros(count, dtype=bool)
+    for position, node_id in enumerate(node_ids.tolist()):
+        if node_id in stored:
+            positions[position] = stored[node_id][:2]
+            placed[position] = True
+
+    # 受影响的节点：尚未布局的、布局之后被修改的节点，以及布局之后新增或修改的关联的端点
+    changes = KnowledgeChange.objects.filter(id__gt=last_version, action__in=('upsert', 'delete'))
+    affected = ~placed
+    changed_nodes = list(changes.filter(kind='node').values_list('object_id', flat=True))
+    changed_links = list(changes.filter(kind='link').values_list('object_id', flat=True))
+    for source_id, target_id in KnowledgeLink.objects.filter(id__in=changed_links).values_list('source_id', 'target_id'):
+        changed_nodes += [source_id, target_id]
+    affected |= np.isin(node_ids, changed_nodes)
+    if not affected.any():
+        return node_ids, positions, affected, version
+
+    # 新节点放在已布局邻居的中心附近
+    for _ in range(2):
+        for source, target in ((sources, targets), (targets, sources)):
+            mask = ~placed[source] & placed[target]
+            if not mask.any():
+                continue
+            totals = np.zeros((count, 2))
+            np.add.at(totals, source[mask], positions[target[mask]])
+            counts = np.bincount(source[mask], minlength=count)
+            fill = counts > 0
+            positions[fill] = totals[fill] / counts[fill][:, None] + rng.normal(0, k / 2, size=(fill.sum(), 2))
+            placed |= fill
+
+    # 受影响节点和它们的直接邻居可以移动
+    movable = affected.copy()
+    movable[sources[affected[targets]]] = True
+    movable[targets[affected[sources]]] = True
+    # 只在可移动节点和与它们相连的固定节点组成的子图上计算，远处节点的斥力忽略不计
+    region = movable.copy()
+    region[sources[movable[targets]]] = True
+    region[targets[movable[sources]]] = True
+    local = np.flatnonzero(region)
+    index = np.full(count, -1)
+    index[local] = np.arange(len(local))
+    inside = region[sources] & region[targets]
+    local_positions = positions[local]
+    force_layout(local_positions, index[sources[inside]], index[targets[inside]],
+                 iterations or options['INCREMENTAL_ITERATIONS'], k, options['GRAVITY'],
+                 movable=movable[local], temperature=k * 2)
+    positions[local] = local_positions
+    return node_ids, positions, movable, version
+
+
+def save_layout(node_ids, positions, moved, version):
+    """保存坐标，并写入一条布局变更记录递增图谱版本，客户端下次同步时获取带新坐标的完整快照"""
+    rows = [
+        NodeLayout(node_id=node_id, x=round(float(x), 1), y=round(float(y), 1), version=version)
+        for node_id, (x, y) in zip(node_ids[moved].tolist(), positions[moved].tolist())
+    ]
+    with transaction.atomic():
+        NodeLayout.objects.bulk_create(
+            rows, batch_size=500, update_conflicts=True,
+            unique_fields=['node'], update_fields=['x', 'y', 'version']
+        )
+        NodeLayout.objects.exclude(version=version).update(version=version)
+        if rows:
+            record_batch_change('layout')
+            transaction.on_commit(refresh_map_version)
+    return len(rows)
+
+
+def relayout(incremental=True, iterations=None, allow_full=True):
+    node_ids, positions, moved, version = compute_layout(incremental, iterations, allow_full=allow_full)
+    if not moved.any():
+        return 0
+    return save_layout(node_ids, positions, moved, version)
+
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def schedule_relayout():
+    """节点或关联变化后延迟执行增量布局，连续修改只触发一次"""
+    global _timer
+    options = get_options()
+    if not options['AUTO_RELAYOUT']:
+        return
+    with _timer_lock:
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(options['DEBOUNCE'], _run_scheduled)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _run_scheduled():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    # 多个进程同时收到修改时只由一个进程布局，其余进程的修改在它的下一次增量布局中处理
+    if not cache.add(LOCK_KEY, True, get_options()['LOCK_TIMEOUT']):
+        return
+    try:
+        # 完整布局耗时较长，不在 Web 进程中执行，留给 compute_graph_layout
+        moved = relayout(incremental=True, allow_full=False)
+        logger.info('增量布局完成，更新了 %s 个节点', moved)
+    except Exception:
+        logger.exception('增量布局失败')
+    finally:
+        cache.delete(LOCK_KEY)
+        close_old_connections()
@@ -0,0 +1,221 @@
+"""学习路径
+
+在邻接索引之上按关联类型构建前置关系图，并按图谱版本缓存在进程内：
+- 学习路径：目标节点的全部前置知识按拓扑顺序排列，同一层级先学难度和层级低的；
+  已掌握的节点及其前置知识不再列出。
+- 最短路径：两个节点之间忽略方向的最短路径，可按难度加权。
+"""
+import heapq
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+
+from .graph_index import get_index
+from .models import NodeMastery
+
+PrerequisiteGraph = namedtuple(
+    'PrerequisiteGraph', 'version node_ids positions difficulty level prerequisites neighbors'
+)
+
+
+def get_options():
+    options = {
+        # 关联类型 -> 前置知识所在的一端：source 表示源节点要先学，target 表示目标节点要先学
+        'PREREQUISITES': {'包含': 'source', '使用': 'target', '扩展': 'target'},
+        'MASTERY_THRESHOLD': 0.8,  # 正确率达到该值视为已掌握
+        'MASTERY_MIN_PRACTICES': 3,  # 至少练习的次数
+    }
+    options.update(getattr(settings, 'LEARNING_PATH', {}))
+    return options
+
+
+def build_graph(index, prerequisite_relations=None):
+    """把 CSR 索引展开为按位置编号的邻接表"""
+    if prerequisite_relations is None:
+        prerequisite_relations = get_options()['PREREQUISITES']
+    count = len(index.node_ids)
+    sources = np.repeat(np.arange(count), np.diff(index.out_indptr)).tolist()
+    targets = np.asarray(index.out_indices).tolist()
+    relations = [prerequisite_relations.get(relation) for relation in index.relations]
+
+    prerequisites = [[] for _ in range(count)]
+    neighbors = [[] for _ in range(count)]
+    for source, target, code in zip(sources, targets, np.asarray(index.out_relations).tolist()):
+        neighbors[source].append(target)
+        neighbors[target].append(source)
+        side = relations[code]
+        if side == 'source':
+            prerequisites[target].append(source)
+        elif side == 'target':
+            prerequisites[source].append(target)
+
+    node_ids = np.asarray(index.node_ids).tolist()
+    return PrerequisiteGraph(
+        version=index.version,
+        node_ids=node_ids,
+        positions={node_id: position for position, node_id in enumerate(node_ids)},
+        difficulty=np.asarray(index.difficulty).tolist(),
+        level=np.asarray(index.level).tolist(),
+        prerequisites=prerequisites,
+        neighbors=neighbors,
+    )
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """获取当前版本的前置关系图"""
+    global _graph
+    index = get_index()
+    graph = _graph
+    if graph is not None and graph.version == index.version:
+        return graph
+    with _graph_lock:
+        if _graph is None or _graph.version != index.version:
+            _graph = build_graph(index)
+        return _graph
+
+
+def mastered_nodes(user):
+    """根据练习统计判断用户已掌握的知识节点ID"""
+    options = get_options()
+    return set(
+        NodeMastery.objects.filter(
+            user=user, attempts__gte=options['MASTERY_MIN_PRACTICES'],
+            correct__gte=F('attempts') * options['MASTERY_THRESHOLD']
+        ).values_list('node_id', flat=True)
+    )
+
+
+def _sort_key(graph, position):
+    return graph.difficulty[position], graph.level[position], graph.node_ids[position]
+
+
+def study_path(graph, target_id, mastered=()):
+    """到达目标节点的学习顺序，返回 (节点ID列表, 是否存在循环依赖)；节点不存在时返回 None"""
+    target = graph.positions.get(target_id)
+    if target is None:
+        return None
+    skipped = {graph.positions[node_id] for node_id in mastered if node_id in graph.positions}
+
+    # 收集尚未掌握的前置知识，已掌握节点的前置知识视为同样已掌握
+    required = set()
+    stack = [target] if target not in skipped else []
+    while stack:
+        position = stack.pop()
+        if position in required:
+            continue
+        required.add(position)
+        stack.extend(p for p in graph.prerequisites[position] if p not in skipped and p not in required)
+
+    # Kahn 拓扑排序，可同时学习的节点中先学难度低、层级低的
+    waiting = {position: 0 for position in required}
+    followers = {position: [] for position in required}
+    for position in required:
+        for prerequisite in set(graph.prerequisites[position]):
+            if prerequisite in required:
+                waiting[position] += 1
+                followers[prerequisite].append(position)
+
+    ready = [_sort_key(graph, position) + (position,) for position, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        position = heapq.heappop(ready)[-1]
+        order.append(position)
+        for follower in followers[position]:
+            waiting[follower] -= 1
+            if waiting[follower] == 0:
+                heapq.heappush(ready, _sort_key(graph, follower) + (follower,))
+
+    has_cycle = len(order) < len(required)
+    if has_cycle:
+        # 循环依赖中的节点无法排出先后，按难度追加在最后
+        remaining = sorted((p for p in required if waiting[p] > 0), key=lambda p: _sort_key(graph, p))
+        order.extend(remaining)
+    return [graph.node_ids[position] for position in order], has_cycle
+
+
+def shortest_path(graph, source_id, target_id, weighted=False):
+    """两个节点之间的最短路径（忽略方向），weighted 时以经过节点的难度为代价
+
+    返回 (节点ID列表, 总代价)；节点不存在返回 None，不连通时路径为空列表。
+    """
+    source = graph.positions.get(source_id)
+    target = graph.positions.get(target_id)
+    if source is None or target is None:
+        return None
+
+    if not weighted:
+        return _bidirectional_path(graph, source, target)
+
+    # Dijkstra，到达目标即停止
+    previous = {source: None}
+    costs = {source: 0}
+    heap = [(0, source)]
+    while heap:
+        cost, position = heapq.heappop(heap)
+        if position == target:
+            break
+        if cost > costs[position]:
+            continue
+        for neighbor in graph.neighbors[position]:
+            new_cost = cost + graph.difficulty[neighbor]
+            if new_cost < costs.get(neighbor, float('inf')):
+                costs[neighbor] = new_cost
+                previous[neighbor] = position
+                heapq.heappush(heap, (new_cost, neighbor))
+
+    if target not in previous:
+        return [], None
+    path = _walk(previous, target)
+    path.reverse()
+    return [graph.node_ids[position] for position in path], costs[target]
+
+
+def _walk(previous, position):
+    path = []
+    while position is not None:
+        path.append(position)
+        position = previous[position]
+    return path
+
+
+def _bidirectional_path(graph, source, target):
+    """双向 BFS：每次扩展较小的一侧，两侧相遇即得到最短路径"""
+    forward, backward = {source: None}, {target: None}
+    forward_frontier, backward_frontier = [source], [target]
+    meeting = source if source == target else None
+    while meeting is None and forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, parents, others = forward_frontier, forward, backward
+        else:
+            frontier, parents, others = backward_frontier, backward, forward
+        next_frontier = []
+        for position in frontier:
+            for neighbor in graph.neighbors[position]:
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = position
+                if neighbor in others:
+                    meeting = neighbor
+                    break
+                next_frontier.append(neighbor)
+            if meeting is not None:
+                break
+        if parents is forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    if meeting is None:
+        return [], None
+    path = _walk(forward, meeting)
+    path.reverse()
+    path.extend(_walk(backward, backward[meeting]))
+    return [graph.node_ids[position] for position in path], len(path) - 1
@@ -0,0 +1,233 @@
+"""本地确定性解题
+
+纯算术题（如 "3.6+4.7+6.4=" 或 "□-2.5=7.5"）不需要调用大模型：
+规范化 ×/÷/分数/小数/百分数后，用只允许四则运算和乘方的安全求值器
+以分数精确计算。能确定唯一答案的小题在本地作答，其余交给大模型。
+"""
+import ast
+import re
+from decimal import Decimal, localcontext
+from fractions import Fraction
+
+BLANK = '□'
+
+# 小题编号，如 (1) 1. 1、 ①
+NUMBERING_RE = re.compile(r'^\s*(?:[(（]\s*(\d+)\s*[)）]|(\d+)\s*[.、．](?!\d)|([①-⑳]))\s*')
+NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)(%?)')
+CJK_RE = re.compile(r'[一-鿿]')
+# 空格紧挨着数字或括号、中间没有运算符：可能是填运算符号或填数字，不能当作乘法
+ADJACENT_BLANK_RE = re.compile(r'[\d.%)]□|□[\d.(]')
+# 要求填运算符号、数字或大小关系的题目，答案不是空格的数值
+FILL_SYMBOL_RE = re.compile(r'填.*(?:符号|运算符|数字|[<>＜＞])')
+
+CHAR_MAP = str.maketrans({
+    '×': '*', '✕': '*', '·': '*', '÷': '/', '＋': '+', '－': '-', '−': '-', '—': '-',
+    '（': '(', '）': ')', '［': '(', '］': ')', '[': '(', ']': ')', '＝': '=',
+    '？': '?', '％': '%', '／': '/',
+    **{chr(ord('０') + i): str(i) for i in range(10)},
+})
+
+MAX_EXPONENT = 10
+# 乘方结果分子、分母的最大位数，嵌套乘方如 ((9^10)^10)^10 在计算前就拒绝
+MAX_POWER_BITS = 512
+
+
+class LocalSolveError(Exception):
+    """算式无法在本地精确求解"""
+
+
+def normalize_expression(text):
+    """把OCR得到的算式转换为可以求值的形式，填空位置统一为 □"""
+    expr = text.translate(CHAR_MAP).strip()
+    expr = re.sub(r'[(]\s*[)]', BLANK, expr)
+    expr = re.sub(r'_{2,}', BLANK, expr)
+    # OCR 常把乘号识别成字母 x
+    expr = re.sub(r'(?<=[\d)□])\s*[xX]\s*(?=[\d(□])', '*', expr)
+    expr = expr.replace('²', '^2').replace('³', '^3')
+    expr = re.sub(r'\s+', '', expr)
+    left, sep, right = expr.partition('=')
+    if sep and right in ('', '?'):
+        expr = f'{left}={BLANK}'
+    return expr
+
+
+def _to_python(expr, numbers):
+    """把数字替换为占位名，保证小数按十进制精确计算"""
+    def replace_number(match):
+        value = Fraction(match.group(1))
+        numbers.append(value / 100 if match.group(2) else value)
+        return f'n{len(numbers) - 1}'
+
+    source = NUMBER_RE.sub(replace_number, expr)
+    source = source.replace(BLANK, 'x').replace('^', '**')
+    # 隐式乘法：2(3+4)、(1+2)(3+4)，空格不参与
+    source = re.sub(r'(?<=[\d)])(?=[(n])', '*', source)
+    return source
+
+
+class _Evaluator:
+    def __init__(self, numbers, blank_value=None):
+        self.numbers = numbers
+        self.blank_value = blank_value
+
+    def eval(self, node):
+        if isinstance(node, ast.Expression):
+            return self.eval(node.body)
+        if isinstance(node, ast.Name):
+            if node.id == 'x':
+                if self.blank_value is None:
+                    raise LocalSolveError('算式中有未知的空格')
+                return self.blank_value
+            if node.id.startswith('n'):
+                return self.numbers[int(node.id[1:])]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            value = self.eval(node.operand)
+            return value if isinstance(node.op, ast.UAdd) else -value
+        if isinstance(node, ast.BinOp):
+            left = self.eval(node.left)
+            right = self.eval(node.right)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.Div):
+                if right == 0:
+                    raise LocalSolveError('除数为0')
+                return left / right
+            if isinstance(node.op, ast.Pow):
+                if right.denominator != 1 or abs(right) > MAX_EXPONENT:
+                    raise LocalSolveError('只支持较小的整数次幂')
+                if left == 0 and right < 0:
+                    raise LocalSolveError('0的负数次幂没有意义')
+                bits = max(left.numerator.bit_length(), left.denominator.bit_length())
+                if bits * abs(int(right)) > MAX_POWER_BITS:
+                    raise LocalSolveError('乘方结果过大')
+                return left ** int(right)
+        raise LocalSolveError('算式包含不支持的内容')
+
+
+def _parse(source):
+    try:
+        return ast.parse(source, mode='eval')
+    except SyntaxError:
+        raise LocalSolveError('无法解析算式')
+
+
+def solve_expression(text):
+    """求解单个算式，返回 (规范化后的算式, 空格的值)
+
+    支持 "算式=□"，以及只含一个空格的一次等式（如 "□×4=10"）。
+    """
+    expr = normalize_expression(text)
+    if expr.count('=') != 1 or expr.count(BLANK) != 1:
+        raise LocalSolveError('只支持含一个等号和一个空格的算式')
+    if CJK_RE.search(expr) or re.search(r'[A-Za-z]', expr):
+        raise LocalSolveError('算式包含文字或字母')
+    if ADJACENT_BLANK_RE.search(expr):
+        raise LocalSolveError('空格与数字之间没有运算符')
+
+    numbers = []
+    left, right = (_to_python(side, numbers) for side in expr.split('='))
+    if not left or not right:
+        raise LocalSolveError('等号两边不能为空')
+    left_tree, right_tree = _parse(left), _parse(right)
+
+    def residual(x):
+        evaluator = _Evaluator(numbers, x)
+        try:
+            return evaluator.eval(left_tree) - evaluator.eval(right_tree)
+        except ZeroDivisionError:
+            raise LocalSolveError('除数为0')
+
+    # 空格的方程是一次的：用两点确定直线并验证第三点
+    g0, g1, g2 = residual(Fraction(0)), residual(Fraction(1)), residual(Fraction(2))
+    slope = g1 - g0
+    if slope == 0 or g2 - g1 != slope:
+        raise LocalSolveError('空格的值不唯一或不是一次方程')
+    value = -g0 / slope
+    if residual(value) != 0:
+        raise LocalSolveError('验算不通过')
+    return expr, value
+
+
+def format_number(value):
+    """整数和有限小数按小数输出，其余按最简分数输出"""
+    if value.denominator == 1:
+        return str(value.numerator)
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    if denominator != 1:
+        return f'{value.numerator}/{value.denominator}'
+    with localcontext() as context:
+        context.prec = 60
+        return format(Decimal(value.numerator) / Decimal(value.denominator), 'f')
+
+
+def split_sub_questions(cleaned_text):
+    """把题目拆分为 (题目要求, [(小题编号, 小题内容)])
+
+    题目要求为第一道算式之前的文字行；无法识别为算式或题目要求的行返回 None。
+    """
+    header = []
+    items = []
+    for line in cleaned_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if '=' not in line and '＝' not in line:
+            if items or not CJK_RE.search(line):
+                return None
+            header.append(line)
+            continue
+        # 一行里可能有多道用空格或分号隔开的小题
+        for part in re.split(r'\s{2,}|[;；]', line):
+            part = part.strip()
+            if not part:
+                continue
+            match = NUMBERING_RE.match(part)
+            if match:
+                part = part[match.end():]
+            items.append(part)
+
+    if not items:
+        return None
+    return ' '.join(header), [(str(index), content) for index, content in enumerate(items, 1)]
+
+
+def solve_locally(cleaned_text):
+    """尝试在本地解答全部小题
+
+    返回 None 表示题目不是可拆分的算式题；否则返回字典：
+    main、sub_questions、analysis、answer 为已解答部分，pending 为需要交给大模型的小题。
+    """
+    split = split_sub_questions(cleaned_text)
+    if split is None:
+        return None
+    main, items = split
+
+    solution = {
+        'main': main or '计算',
+        'sub_questions': [],
+        'analysis': {},
+        'answer': {},
+        'pending': [],
+    }
+    fill_symbol = bool(FILL_SYMBOL_RE.search(main))
+    for sub_id, content in items:
+        solution['sub_questions'].append({'id': sub_id, 'content': content})
+        if fill_symbol:
+            solution['pending'].append({'id': sub_id, 'content': content})
+            continue
+        try:
+            expr, value = solve_expression(content)
+        except LocalSolveError:
+            solution['pending'].append({'id': sub_id, 'content': content})
+            continue
+        answer = format_number(value)
+        solution['analysis'][sub_id] = f'按运算顺序精确计算，{BLANK}={answer}'
+        solution['answer'][sub_id] = answer
+    return solution
@@ -0,0 +1,72 @@
+"""OCR基准测试使用的样例图片"""
+import glob
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+SAMPLE_LINES = [
+    '59x2.5x0.4=59x(2.5x0.4)',
+    '125x32x25=125x8x(4x25)',
+    '3.6+4.7+6.4=3.6+6.4+4.7',
+    '(1/2+1/3)x6=3+2=5',
+    '48x99+48=48x(99+1)',
+    '7.5-2.8-1.2=7.5-(2.8+1.2)',
+]
+
+
+def char_accuracy(expected, actual):
+    """字符准确率：1 - 编辑距离 / 标准文本长度（忽略空白）"""
+    expected = ''.join(expected.split())
+    actual = ''.join(actual.split())
+    if not expected:
+        return 1.0 if not actual else 0.0
+    previous = list(range(len(actual) + 1))
+    for i, a in enumerate(expected, 1):
+        current = [i]
+        for j, b in enumerate(actual, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return max(0.0, 1 - previous[-1] / len(expected))
+
+
+def generate_fixture(seed, size=(4000, 3000)):
+    """生成模拟手机拍摄的作业照片：大尺寸、轻微倾斜、光照不均、带噪点"""
+    rng = random.Random(seed)
+    lines = rng.sample(SAMPLE_LINES, 4)
+    page = Image.new('L', (size[0] // 4, size[1] // 4), 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default()
+    for i, line in enumerate(lines):
+        draw.text((120, 120 + i * 60), line, fill=0, font=font)
+    page = page.resize(size, Image.BICUBIC).rotate(rng.uniform(-3, 3), fillcolor=255)
+
+    # 从左到右变暗的光照
+    shade = Image.linear_gradient('L').rotate(90).resize(size)
+    page = Image.blend(page, shade.point(lambda v: 255 - v // 3), 0.35)
+    noise = Image.effect_noise(size, 20)
+    page = Image.blend(page, noise, 0.15).filter(ImageFilter.GaussianBlur(1.5))
+
+    buffer = io.BytesIO()
+    page.convert('RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue(), '\n'.join(lines)
+
+
+def load_fixtures(directory=None, count=3):
+    """读取样例目录中的 (图片字节, 标准文本)；不指定目录时生成模拟照片"""
+    if not directory:
+        return [generate_fixture(seed) for seed in range(count)]
+
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*'))):
+        base, ext = os.path.splitext(path)
+        if ext.lower() not in ('.jpg', '.jpeg', '.png', '.tif', '.tiff'):
+            continue
+        if not os.path.exists(base + '.txt'):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(base + '.txt', encoding='utf-8') as f:
+            fixtures.append((data, f.read()))
+    return fixtures
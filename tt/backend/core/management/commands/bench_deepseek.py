@@ -0,0 +1,75 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from core.deepseek import DeepseekClient, DeepseekUnavailable
+from core.deepseek_stub import start_stub_server
+
+class Command(BaseCommand):
+    help = '对 Deepseek 客户端进行压测（默认使用本地模拟服务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='压测目标地址，不指定时启动本地模拟服务')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=32, help='并发调用的线程数')
+        parser.add_argument('--max-concurrency', type=int, default=8, help='客户端允许的在途请求数')
+        parser.add_argument('--latency', type=float, default=0.05)
+        parser.add_argument('--error-rate', type=float, default=0.05)
+        parser.add_argument('--rate-limit-rate', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if not url:
+            server = start_stub_server(
+                latency=options['latency'],
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate']
+            )
+            url = server.url
+        self.stdout.write(f'压测目标: {url}')
+
+        client = DeepseekClient(
+            url, 'bench',
+            pool_size=options['max_concurrency'],
+            max_concurrency=options['max_concurrency'],
+            acquire_timeout=60,
+            backoff_base=0.05,
+            backoff_max=0.5,
+        )
+        payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "1+1"}]}
+
+        def call(_):
+            started = time.perf_counter()
+            try:
+                status = client.post(payload).status_code
+            except DeepseekUnavailable:
+                status = 'unavailable'
+            except Exception as e:
+                status = type(e).__name__
+            return status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(call, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+
+        self.stdout.write(f'请求数: {len(results)}，耗时 {elapsed:.2f}s，吞吐 {len(results) / elapsed:.1f} req/s')
+        self.stdout.write(f'状态分布: {statuses}')
+        self.stdout.write(
+            f'延迟 p50={statistics.median(latencies) * 1000:.1f}ms '
+            f'p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms'
+        )
+        if server:
+            self.stdout.write(
+                f'模拟服务收到请求 {server.request_count} 个，'
+                f'最大在途 {server.max_in_flight}（上限 {options["max_concurrency"]}）'
+            )
+            server.shutdown()
+            server.server_close()
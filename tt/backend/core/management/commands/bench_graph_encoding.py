@@ -0,0 +1,95 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.encoding import brotli, compress, msgpack
+from core.knowledge_map import encode_graph
+
+class Command(BaseCommand):
+    help = '在合成的大图谱上对比各种编码和压缩方式的体积与编码耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=50000)
+        parser.add_argument('--links-per-node', type=float, default=2.0)
+        parser.add_argument('--content-length', type=int, default=60, help='每个节点内容的平均字数')
+        parser.add_argument('--repeat', type=int, default=3, help='每种方式重复编码的次数，取最快一次')
+
+    def handle(self, *args, **options):
+        graph = self.build_graph(options)
+        self.stdout.write(f'节点: {len(graph["nodes"])}  关联: {len(graph["links"])}')
+
+        formats = ['json', 'columnar']
+        if msgpack is not None:
+            formats += ['msgpack', 'columnar-msgpack']
+        else:
+            self.stdout.write(self.style.WARNING('未安装 msgpack，跳过 MessagePack 编码'))
+        encodings = [None, 'gzip']
+        if brotli is not None:
+            encodings.append('br')
+        else:
+            self.stdout.write(self.style.WARNING('未安装 brotli，跳过 brotli 压缩'))
+
+        self.stdout.write(f'{"编码":<18}{"压缩":<8}{"体积(KB)":>12}{"编码(ms)":>12}{"压缩(ms)":>12}')
+        for fmt in formats:
+            body, encode_ms = self.timed(options['repeat'], encode_graph, graph, fmt)
+            for encoding in encodings:
+                if encoding is None:
+                    payload, compress_ms = body, 0.0
+                else:
+                    payload, compress_ms = self.timed(options['repeat'], compress, body, encoding)
+                self.stdout.write(
+                    f'{fmt:<18}{encoding or "-":<8}{len(payload) / 1024:>12.1f}'
+                    f'{encode_ms:>12.1f}{compress_ms:>12.1f}'
+                )
+
+    def timed(self, repeat, func, *args):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func(*args)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    def build_graph(self, options):
+        """生成与 map 接口结构相同的合成图谱"""
+        rng = random.Random(0)
+        categories = ['代数', '几何', '方程', '函数', '统计', '概率', '数论', '基础数学']
+        relations = ['包含', '使用', '相关', '扩展']
+        words = '数学方程函数几何代数概率统计定理公式运算分数小数整数图形面积体积角度证明推导'
+        count = options['nodes']
+        nodes = [{
+            'id': str(index + 1),
+            'name': f'知识点{index + 1}',
+            'value': rng.randint(1, 5),
+            'category': rng.choice(categories),
+            'content': ''.join(rng.choice(words) for _ in range(rng.randint(1, 2 * options['content_length']))),
+            'difficulty': rng.randint(1, 5),
+            'x': round(rng.uniform(-1000, 1000), 2),
+            'y': round(rng.uniform(-1000, 1000), 2),
+            'pagerank': rng.random() / count,
+            'betweenness': rng.random(),
+            'in_degree': 0,
+            'out_degree': 0,
+        } for index in range(count)]
+        links = []
+        for index in range(int(count * options['links_per_node'])):
+            source = rng.randint(1, count)
+            target = rng.randint(1, count)
+            nodes[source - 1]['out_degree'] += 1
+            nodes[target - 1]['in_degree'] += 1
+            links.append({
+                'id': str(index + 1),
+                'source': str(source),
+                'target': str(target),
+                'value': 1,
+                'relation_type': rng.choice(relations)
+            })
+        return {
+            'version': 1,
+            'full': True,
+            'nodes': nodes,
+            'links': links,
+            'categories': sorted(categories),
+        }
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+from django.core.management.base import BaseCommand
+
+from core.ocr_engine import PytesseractEngine, TesseractPoolEngine, tesserocr
+from core.preprocess import open_image, preprocess_image
+from ._ocr_fixtures import load_fixtures
+
+class Command(BaseCommand):
+    help = '对比常驻进程池与 pytesseract 的识别吞吐量（张/秒）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', help='样例图片目录，不指定时生成模拟照片')
+        parser.add_argument('--count', type=int, default=4, help='生成模拟照片的数量')
+        parser.add_argument('--rounds', type=int, default=5, help='每张图片重复识别的次数')
+        parser.add_argument('--pool-size', type=int, default=2)
+        parser.add_argument('--lang', default='chi_sim+eng')
+        parser.add_argument('--tessdata', help='traineddata 所在目录')
+        parser.add_argument('--tesseract-cmd', help='tesseract 可执行文件路径')
+
+    def handle(self, *args, **options):
+        if options['tesseract_cmd']:
+            pytesseract.pytesseract.tesseract_cmd = options['tesseract_cmd']
+
+        # 只比较识别本身，预处理提前完成
+        images = [
+            preprocess_image(open_image(data))
+            for data, _ in load_fixtures(options['fixtures'], options['count'])
+        ]
+        images = images * options['rounds']
+        self.stdout.write(f'图片数: {len(images)}，并发数: {options["pool_size"]}')
+
+        engines = [PytesseractEngine(options['lang'])]
+        if tesserocr is None:
+            self.stdout.write(self.style.WARNING('未安装 tesserocr，跳过进程池'))
+        else:
+            engines.append(TesseractPoolEngine(
+                lang=options['lang'],
+                pool_size=options['pool_size'],
+                tessdata=options['tessdata'],
+            ))
+
+        for engine in engines:
+            try:
+                started = time.perf_counter()
+                engine.recognize(images[0])
+                warmup = time.perf_counter() - started
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['pool_size']) as executor:
+                    list(executor.map(engine.recognize, images))
+                elapsed = time.perf_counter() - started
+            except pytesseract.TesseractNotFoundError:
+                self.stdout.write(self.style.WARNING(f'{engine.name}: 未找到 tesseract'))
+                continue
+            finally:
+                engine.close()
+
+            self.stdout.write(
+                f'{engine.name:<12} 首次识别 {warmup * 1000:.0f}ms，'
+                f'{len(images) / elapsed:.2f} 张/秒，平均 {elapsed / len(images) * 1000:.0f}ms/张'
+            )
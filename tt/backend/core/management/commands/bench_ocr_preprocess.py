@@ -0,0 +1,58 @@
+import time
+
+import pytesseract
+from django.core.management.base import BaseCommand
+
+from core.preprocess import ALL_STEPS, get_options, open_image, preprocess_image
+from ._ocr_fixtures import char_accuracy, load_fixtures
+
+class Command(BaseCommand):
+    help = '对比各个预处理步骤对OCR耗时和字符准确率的影响'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', help='样例图片目录，每张图片需要同名的 .txt 标准文本；不指定时生成模拟照片')
+        parser.add_argument('--count', type=int, default=3, help='生成模拟照片的数量')
+        parser.add_argument('--lang', default='chi_sim+eng')
+        parser.add_argument('--tesseract-cmd', help='tesseract 可执行文件路径')
+
+    def handle(self, *args, **options):
+        if options['tesseract_cmd']:
+            pytesseract.pytesseract.tesseract_cmd = options['tesseract_cmd']
+
+        fixtures = load_fixtures(options['fixtures'], options['count'])
+        self.stdout.write(f'样例数: {len(fixtures)}')
+
+        configs = [('不预处理', ())]
+        configs.append(('全部步骤', ALL_STEPS))
+        for step in ALL_STEPS:
+            configs.append((f'去掉 {step}', tuple(s for s in ALL_STEPS if s != step)))
+
+        ocr_available = True
+        self.stdout.write(f'{"配置":<16}{"解码+预处理(ms)":>16}{"OCR(ms)":>12}{"总计(ms)":>12}{"准确率":>10}')
+        for name, steps in configs:
+            prep_total = ocr_total = 0.0
+            accuracies = []
+            for data, expected in fixtures:
+                started = time.perf_counter()
+                image = preprocess_image(open_image(data, get_options(STEPS=steps)), get_options(STEPS=steps))
+                prep_total += time.perf_counter() - started
+
+                if not ocr_available:
+                    continue
+                started = time.perf_counter()
+                try:
+                    text = pytesseract.image_to_string(image, lang=options['lang'])
+                except pytesseract.TesseractNotFoundError:
+                    ocr_available = False
+                    self.stdout.write(self.style.WARNING('未找到 tesseract，只统计预处理耗时'))
+                    continue
+                ocr_total += time.perf_counter() - started
+                accuracies.append(char_accuracy(expected, text))
+
+            count = len(fixtures)
+            accuracy = f'{sum(accuracies) / len(accuracies):.1%}' if accuracies else '-'
+            ocr_ms = f'{ocr_total / count * 1000:.0f}' if accuracies else '-'
+            self.stdout.write(
+                f'{name:<16}{prep_total / count * 1000:>16.0f}{ocr_ms:>12}'
+                f'{(prep_total + ocr_total) / count * 1000:>12.0f}{accuracy:>10}'
+            )
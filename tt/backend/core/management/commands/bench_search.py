@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.search import available, build_match, create_table, document_rows, highlight, query_terms, ranked_matches
+
+BENCH_TABLE = 'bench_search'
+TERMS = [
+    '方程', '一元二次方程', '因式分解', '配方法', '求根公式', '判别式', '韦达定理', '函数', '二次函数',
+    '一次函数', '反比例函数', '抛物线', '对称轴', '顶点', '三角形', '全等三角形', '相似三角形', '勾股定理',
+    '平行四边形', '圆', '切线', '圆周角', '弧长', '扇形面积', '概率', '统计', '平均数', '方差', '不等式',
+    '不等式组', '绝对值', '平方根', '立方根', '实数', '有理数', '数列', '等差数列', '等比数列', '向量',
+    '导数', '积分', '极限', '三角函数', '正弦', '余弦', '正切', '坐标系', '直线', '斜率', '截距',
+]
+FILLERS = '已知求设若则的是在和与为中且当时有一个两点其所以因此可得证明计算化简下列正确'
+WORDS = ['sin', 'cos', 'tan', 'log', 'x', 'y', 'abc', 'x2']
+
+class Command(BaseCommand):
+    help = '在合成的中文语料上测试全文索引的写入速度和查询延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=200000)
+        parser.add_argument('--length', type=int, default=80, help='每个文档正文的平均字数')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not available():
+            raise CommandError('全文索引需要 SQLite（FTS5），当前数据库不支持')
+        rng = random.Random(options['seed'])
+        documents = [self.document(rng, index, options['length']) for index in range(options['documents'])]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS temp.{BENCH_TABLE}')
+        create_table(f'temp.{BENCH_TABLE}')
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            for start in range(0, len(documents), 5000):
+                cursor.executemany(
+                    f'INSERT INTO {BENCH_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+                    list(document_rows('question', documents[start:start + 5000]))
+                )
+            cursor.execute(f"INSERT INTO {BENCH_TABLE} ({BENCH_TABLE}) VALUES ('optimize')")
+        self.stdout.write(f'索引 {len(documents)} 个文档，用时 {time.perf_counter() - started:.1f}s')
+
+        queries = [self.query(rng) for _ in range(options['queries'])]
+        timings, hits = [], []
+        try:
+            for query in queries:
+                started = time.perf_counter()
+                matches = ranked_matches(build_match(query), limit=options['limit'], table=BENCH_TABLE)
+                terms = query_terms(query)
+                for _, object_id, _ in matches:
+                    highlight(documents[object_id][2], terms, 80)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits.append(len(matches))
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS temp.{BENCH_TABLE}')
+
+        timings.sort()
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+        self.stdout.write(
+            f'{len(queries)} 次查询（含摘要）：p50 {percentile(0.5):.2f}ms  p95 {percentile(0.95):.2f}ms  '
+            f'p99 {percentile(0.99):.2f}ms  最大 {timings[-1]:.2f}ms  平均命中 {statistics.mean(hits):.1f}'
+        )
+
+    def document(self, rng, index, length):
+        body = []
+        while sum(map(len, body)) < length:
+            body.append(rng.choice(TERMS) if rng.random() < 0.4 else rng.choice(FILLERS))
+            if rng.random() < 0.05:
+                body.append(f' {rng.choice(WORDS)} ')
+        return index, f'{rng.choice(TERMS)}练习{index}', ''.join(body)
+
+    def query(self, rng):
+        kind = rng.random()
+        if kind < 0.5:
+            return rng.choice(TERMS)
+        if kind < 0.7:
+            return f'{rng.choice(TERMS)} {rng.choice(TERMS)}'
+        if kind < 0.85:
+            return rng.choice(FILLERS + ''.join(TERMS))
+        return f'{rng.choice(WORDS)} {rng.choice(TERMS)}'
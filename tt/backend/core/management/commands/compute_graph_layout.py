@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.layout import compute_layout, save_layout
+
+class Command(BaseCommand):
+    help = '计算知识图谱的布局坐标，随 map 接口返回给前端'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='只重新布局尚未布局或布局之后发生变化的节点及其邻居')
+        parser.add_argument('--iterations', type=int, help='迭代次数，默认使用 GRAPH_LAYOUT 设置')
+        parser.add_argument('--seed', type=int, default=0, help='初始位置的随机种子')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        node_ids, positions, moved, version = compute_layout(
+            incremental=options['incremental'], iterations=options['iterations'], seed=options['seed']
+        )
+        elapsed = time.perf_counter() - started
+        if not moved.any():
+            self.stdout.write('没有需要重新布局的节点')
+            return
+        saved = save_layout(node_ids, positions, moved, version)
+        self.stdout.write(self.style.SUCCESS(
+            f'布局完成：{len(node_ids)} 个节点，更新 {saved} 个，计算耗时 {elapsed:.2f}s'
+        ))
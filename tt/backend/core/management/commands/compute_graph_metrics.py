@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.centrality import update_metrics
+
+class Command(BaseCommand):
+    help = '计算知识节点的 PageRank、出入度和介数中心性，图谱未变化时跳过（适合定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='图谱未变化时也重新计算')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = update_metrics(force=options['force'])
+        if updated is None:
+            self.stdout.write('图谱没有变化，跳过')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'指标计算完成，更新了 {updated} 个节点，用时 {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from core.deepseek_stub import StubServer
+
+class Command(BaseCommand):
+    help = '启动本地 Deepseek API 模拟服务（设置 DEEPSEEK_API_URL 指向它即可离线调试）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.5, help='每个请求的模拟延迟，单位：秒')
+        parser.add_argument('--token-delay', type=float, default=0.02, help='流式响应中每段内容的间隔，单位：秒')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='返回503的比例')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的比例')
+
+    def handle(self, *args, **options):
+        server = StubServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            token_delay=options['token_delay'],
+            verbose=True
+        )
+        self.stdout.write(self.style.SUCCESS(f'模拟服务已启动: {server.url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.graph_import import GraphImporter, read_records
+
+class Command(BaseCommand):
+    help = '从 JSON Lines 或 CSV 流式导入知识节点和关联，按标题更新已有节点，不清空现有数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', help='节点文件，字段：title, content, category, level, difficulty')
+        parser.add_argument('--links', help='关联文件，字段：source, target, relation_type（端点为节点标题）')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help='文件格式，默认按扩展名判断')
+        parser.add_argument('--batch-size', type=int, default=20000, help='每个事务写入的行数，越大提交次数越少')
+        parser.add_argument('--progress', type=int, default=100000, help='每处理多少行输出一次进度')
+        parser.add_argument('--dry-run', action='store_true', help='只校验和统计，不写入数据库')
+
+    def handle(self, *args, **options):
+        if not options['nodes'] and not options['links']:
+            raise CommandError('至少需要指定 --nodes 或 --links')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必须大于0')
+
+        importer = GraphImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        self.started = time.perf_counter()
+        self.reported = {'nodes': 0, 'links': 0}
+        for kind in ('nodes', 'links'):
+            path = options[kind]
+            if not path:
+                continue
+            try:
+                records = read_records(path, options['format'])
+                getattr(importer, f'import_{kind}')(records, progress=lambda i, kind=kind: self.progress(i, kind, options))
+            except OSError as e:
+                raise CommandError(f'无法读取 {path}: {e}')
+
+        stats = importer.stats
+        elapsed = time.perf_counter() - self.started
+        prefix = '[试运行] ' if options['dry_run'] else ''
+        self.stdout.write(
+            f'{prefix}节点：新增 {stats["nodes_created"]}，更新 {stats["nodes_updated"]}，'
+            f'未变化 {stats["nodes_unchanged"]}'
+        )
+        self.stdout.write(
+            f'{prefix}关联：新增 {stats["links_created"]}，已存在 {stats["links_existing"]}，'
+            f'端点不存在 {stats["links_unresolved"]}'
+        )
+        for message in importer.errors:
+            self.stdout.write(self.style.WARNING(message))
+        if stats['errors'] > len(importer.errors):
+            self.stdout.write(self.style.WARNING(f'……共 {stats["errors"]} 行错误'))
+        self.stdout.write(self.style.SUCCESS(f'{prefix}导入完成，用时 {elapsed:.1f}s'))
+        if stats['nodes_created'] and not options['dry_run']:
+            self.stdout.write('新增了节点，可执行 python manage.py compute_graph_layout 重新计算布局')
+
+    def progress(self, importer, kind, options):
+        rows = importer.stats[f'{kind[:-1]}_rows']
+        if rows - self.reported[kind] < options['progress']:
+            return
+        self.reported[kind] = rows
+        elapsed = time.perf_counter() - self.started
+        label = '节点' if kind == 'nodes' else '关联'
+        self.stdout.write(f'{label}：已处理 {rows} 行，用时 {elapsed:.1f}s')
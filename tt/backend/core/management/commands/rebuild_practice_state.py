@@ -0,0 +1,22 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.recommendations import rebuild_practice_state
+
+class Command(BaseCommand):
+    help = '从练习历史重新汇总推荐使用的练习状态（节点掌握情况、每道题的最近作答）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', help='只重建指定用户名，可重复')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = None
+        if options['user']:
+            users = list(get_user_model().objects.filter(username__in=options['user']))
+        nodes, questions = rebuild_practice_state(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'重建完成：{nodes} 条节点统计，{questions} 条题目统计，用时 {time.perf_counter() - started:.1f}s'
+        ))
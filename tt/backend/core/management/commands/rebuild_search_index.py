@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import available, rebuild
+
+class Command(BaseCommand):
+    help = '重建题目和知识节点的全文索引'
+
+    def handle(self, *args, **options):
+        if not available():
+            raise CommandError('全文索引需要 SQLite（FTS5），当前数据库不支持')
+        started = time.perf_counter()
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'已索引 {count} 个文档，用时 {time.perf_counter() - started:.1f}s'))
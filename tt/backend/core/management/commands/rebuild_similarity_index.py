@@ -0,0 +1,13 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.similarity import rebuild
+
+class Command(BaseCommand):
+    help = '重建相似题目索引（题目内容的 MinHash 签名和 LSH 桶）'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'已索引 {count} 道题目，用时 {time.perf_counter() - started:.1f}s'))
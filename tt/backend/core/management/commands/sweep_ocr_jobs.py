@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import sweep_jobs
+
+class Command(BaseCommand):
+    help = '把超时仍在排队或处理中的识别任务（如进程重启后遗留的）标记为失败，并删除已结束任务的图片'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int, help='任务创建后超过该秒数视为超时，默认使用 OCR_JOB_TIMEOUT')
+
+    def handle(self, *args, **options):
+        failed, cleaned = sweep_jobs(options['timeout'])
+        self.stdout.write(self.style.SUCCESS(f'{failed} 个超时任务标记为失败，删除了 {cleaned} 个任务的图片'))
@@ -0,0 +1,159 @@
+"""识别/解题流程的分阶段计时与 Prometheus 指标
+
+每个阶段用 span() 包裹，记录耗时和结果（ok/error/timeout/cancelled），
+汇总为直方图，并单独统计错误和超时次数。指标保存在当前进程内，
+多进程部署时需要分别抓取每个进程。
+"""
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶上限，单位：秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TIMEOUT_ERRORS = (TimeoutError, requests.Timeout)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # 标签值 -> [各桶计数, 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), label_values + (_format_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    'mathhelper_stage_duration_seconds', '识别与解题各阶段耗时', labels=('stage', 'outcome')
+)
+STAGE_ERRORS = Counter('mathhelper_stage_errors_total', '各阶段出错次数', labels=('stage',))
+STAGE_TIMEOUTS = Counter('mathhelper_stage_timeouts_total', '各阶段超时次数', labels=('stage',))
+
+REGISTRY = [STAGE_DURATION, STAGE_ERRORS, STAGE_TIMEOUTS]
+
+
+def record(stage, seconds, outcome='ok'):
+    """记录一次阶段耗时"""
+    STAGE_DURATION.observe(seconds, stage, outcome)
+    if outcome == 'error':
+        STAGE_ERRORS.inc(stage)
+    elif outcome == 'timeout':
+        STAGE_TIMEOUTS.inc(stage)
+
+
+class Span:
+    """阶段计时，传入 timings 时同时写入以毫秒为单位的耗时"""
+
+    def __init__(self, stage, timings=None):
+        self.stage = stage
+        self.timings = timings
+        self.outcome = 'ok'
+        self.duration = None
+        self._started = None
+
+    def fail(self, outcome='error'):
+        """没有抛出异常但结果失败时手动标记"""
+        self.outcome = outcome
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            if not issubclass(exc_type, Exception):
+                # 例如客户端断开时流式响应收到 GeneratorExit
+                self.outcome = 'cancelled'
+            elif isinstance(exc, TIMEOUT_ERRORS):
+                self.outcome = 'timeout'
+            else:
+                self.outcome = 'error'
+        record(self.stage, self.duration, self.outcome)
+        if self.timings is not None:
+            self.timings[self.stage] = round(self.duration * 1000, 1)
+        logger.debug('阶段 %s: %s，耗时 %.1fms', self.stage, self.outcome, self.duration * 1000)
+        return False
+
+
+def span(stage, timings=None):
+    return Span(stage, timings)
+
+
+def render_metrics():
+    """以 Prometheus 文本格式导出全部指标"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,37 @@
+"""响应压缩中间件"""
+from django.utils.cache import patch_vary_headers
+
+from .encoding import accepted_encoding, compress, get_options
+
+
+class CompressionMiddleware:
+    """超过阈值的响应按客户端支持使用 brotli 或 gzip 压缩
+
+    流式响应（例如 SSE）和已经编码过的响应保持不变。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        options = get_options()
+        if len(response.content) < options['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        response.content = compress(response.content, encoding, options)
+        response['Content-Length'] = str(len(response.content))
+        response['Content-Encoding'] = encoding
+        # 压缩后的字节与原内容不同，强 ETag 需要改为弱 ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_knowledgechange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NodeLayout",
+            fields=[
+                (
+                    "node",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="layout",
+                        serialize=False,
+                        to="core.knowledgenode",
+                    ),
+                ),
+                ("x", models.FloatField()),
+                ("y", models.FloatField()),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="knowledgechange",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("upsert", "新增或修改"),
+                    ("delete", "删除"),
+                    ("layout", "布局更新"),
+                ],
+                max_length=10,
+            ),
+        ),
+    ]
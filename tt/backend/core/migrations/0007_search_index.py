@@ -0,0 +1,60 @@
+import re
+
+from django.db import migrations
+
+# 迁移不导入 core.search：之后修改表结构或分词规则时，这里保持建表当时的定义
+SEARCH_TABLE = "core_search"
+KINDS = {"question": 0, "node": 1}
+TOKEN_RE = re.compile(r"([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)|([0-9A-Za-z]+)")
+
+
+def index_text(text):
+    """汉字串切成重叠的二元组再加末尾单字，字母数字按单词小写"""
+    tokens = []
+    for han, word in TOKEN_RE.findall(text or ""):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(han[i:i + 2] for i in range(len(han) - 1))
+        tokens.append(han[-1])
+    return " ".join(tokens)
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 只有 SQLite 支持，其他数据库搜索时退化为 icontains
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Question = apps.get_model("core", "Question")
+    KnowledgeNode = apps.get_model("core", "KnowledgeNode")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(title, body, tokenize='unicode61')"
+        )
+        for kind, documents in (
+            ("question", Question.objects.values_list("id", "title", "content", "answer")),
+            ("node", KnowledgeNode.objects.values_list("id", "title", "content")),
+        ):
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [
+                    (object_id * 2 + KINDS[kind], index_text(title), index_text(" ".join(part or "" for part in body)))
+                    for object_id, title, *body in documents
+                ],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_nodelayout"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="knowledgenode",
+            name="betweenness",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="knowledgenode",
+            name="in_degree",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="knowledgenode",
+            name="out_degree",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="knowledgenode",
+            name="pagerank",
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name="knowledgechange",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("upsert", "新增或修改"),
+                    ("delete", "删除"),
+                    ("layout", "布局更新"),
+                    ("metrics", "指标更新"),
+                ],
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_practice_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="questionattempt",
+            name="ease_factor",
+            field=models.FloatField(default=2.5),
+        ),
+        migrations.AddField(
+            model_name="questionattempt",
+            name="interval",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="questionattempt",
+            name="next_review_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="questionattempt",
+            name="repetitions",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="questionattempt",
+            index=models.Index(
+                fields=["user", "next_review_at"], name="core_attempt_due_idx"
+            ),
+        ),
+    ]
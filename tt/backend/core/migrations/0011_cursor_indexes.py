@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_questionattempt_review"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="knowledgelink",
+            index=models.Index(
+                fields=["created_at", "id"], name="core_link_cursor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="knowledgenode",
+            index=models.Index(
+                fields=["created_at", "id"], name="core_node_cursor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="practicehistory",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="core_practice_cursor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["created_at", "id"], name="core_question_cursor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["created_at", "id"], name="core_user_cursor_idx"
+            ),
+        ),
+    ]
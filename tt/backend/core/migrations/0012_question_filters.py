@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_cursor_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["difficulty", "created_at", "id"],
+                name="core_question_difficulty_idx",
+            ),
+        ),
+        # 自动生成的关联表不能在模型中声明索引。按知识节点筛选和统计时
+        # 只读这个索引就能拿到题目ID，不用回表
+        migrations.RunSQL(
+            "CREATE INDEX core_question_nodes_node_idx "
+            "ON core_question_knowledge_nodes (knowledgenode_id, question_id)",
+            "DROP INDEX core_question_nodes_node_idx",
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_question_similarity"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="question",
+            options={},
+        ),
+        # 0003 删除了 analysis，加了 answer_analysis 等一批 models.py 中没有的字段，
+        # 这里改回 models.py 的定义；解析内容通过改名保留
+        migrations.RenameField(
+            model_name="question",
+            old_name="answer_analysis",
+            new_name="analysis",
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="analysis",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="created_by",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="options",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="question_type",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="review_comment",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="reviewed_at",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="reviewed_by",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="solution_steps",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="source",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="status",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="tags",
+        ),
+        migrations.RemoveField(
+            model_name="question",
+            name="tips",
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="answer",
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="content",
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="difficulty",
+            field=models.IntegerField(
+                choices=[(1, "简单"), (2, "中等"), (3, "困难")], default=1
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="knowledge_nodes",
+            field=models.ManyToManyField(
+                related_name="questions", to="core.knowledgenode"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="title",
+            field=models.CharField(max_length=200),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
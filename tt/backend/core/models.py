@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
@@ -12,6 +14,7 @@ class User(AbstractUser):
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        indexes = [models.Index(fields=['created_at', 'id'], name='core_user_cursor_idx')]
 
 class KnowledgeNode(models.Model):
     """知识节点"""
@@ -28,9 +31,17 @@ class KnowledgeNode(models.Model):
     category = models.CharField(max_length=50)
     level = models.IntegerField(default=1)
     difficulty = models.IntegerField(choices=DIFFICULTY_CHOICES, default=1)
+    # 由 compute_graph_metrics 计算的冗余字段
+    pagerank = models.FloatField(default=0, db_index=True)
+    betweenness = models.FloatField(default=0)
+    in_degree = models.IntegerField(default=0)
+    out_degree = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='core_node_cursor_idx')]
+
     def __str__(self):
         return self.title
 
@@ -43,6 +54,7 @@ class KnowledgeLink(models.Model):
 
     class Meta:
         unique_together = ('source', 'target', 'relation_type')
+        indexes = [models.Index(fields=['created_at', 'id'], name='core_link_cursor_idx')]
 
 class Question(models.Model):
     """题目"""
@@ -61,6 +73,13 @@ class Question(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='core_question_cursor_idx'),
+            # 按难度筛选后仍按 (created_at, id) 分页
+            models.Index(fields=['difficulty', 'created_at', 'id'], name='core_question_difficulty_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -75,6 +94,36 @@ class PracticeHistory(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # 列表只返回当前用户的记录
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='core_practice_cursor_idx')]
+
+class NodeMastery(models.Model):
+    """用户在知识节点上的练习统计，练习记录保存时增量更新"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='node_mastery')
+    node = models.ForeignKey(KnowledgeNode, on_delete=models.CASCADE, related_name='+')
+    attempts = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    last_practiced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'node')
+
+class QuestionAttempt(models.Model):
+    """用户在每道题上的最近一次作答和复习计划，练习记录保存时增量更新"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='question_attempts')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    attempts = models.IntegerField(default=0)
+    last_correct = models.BooleanField(default=False)
+    last_attempted_at = models.DateTimeField(null=True, blank=True)
+    # SM-2 复习计划
+    repetitions = models.IntegerField(default=0)  # 连续答对的次数
+    interval = models.FloatField(default=0)  # 复习间隔，单位：天
+    ease_factor = models.FloatField(default=2.5)
+    next_review_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'question')
+        indexes = [models.Index(fields=['user', 'next_review_at'], name='core_attempt_due_idx')]
 
 class UserProgress(models.Model):
     """用户学习进度"""
@@ -91,3 +140,73 @@ class UserProgress(models.Model):
         if self.total_practices == 0:
             return 0
         return (self.correct_practices / self.total_practices) * 100
+
+
+class OCRJob(models.Model):
+    """OCR异步识别任务"""
+    STATUS_CHOICES = [
+        ('pending', '排队中'),
+        ('running', '处理中'),
+        ('success', '已完成'),
+        ('failed', '失败'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ocr_jobs')
+    image = models.ImageField(upload_to='ocr_jobs/')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    text = models.TextField(blank=True)  # 原始OCR识别结果
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    timings = models.JSONField(default=dict, blank=True)  # 各阶段耗时，单位：毫秒
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class KnowledgeChange(models.Model):
+    """知识图谱变更记录，自增ID即图谱版本号，用于增量同步"""
+    KIND_CHOICES = [
+        ('node', '知识节点'),
+        ('link', '知识关联'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', '新增或修改'),
+        ('delete', '删除'),
+        ('layout', '布局更新'),
+        ('metrics', '指标更新'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+
+class NodeLayout(models.Model):
+    """知识节点的预计算布局坐标"""
+    node = models.OneToOneField(KnowledgeNode, on_delete=models.CASCADE, primary_key=True, related_name='layout')
+    x = models.FloatField()
+    y = models.FloatField()
+    version = models.BigIntegerField(default=0)  # 布局时的图谱版本
+
+
+class QuestionSignature(models.Model):
+    """题目内容的 MinHash 签名，用于查找相似和重复的题目"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    signature = models.BinaryField()  # uint32 数组
+
+
+class QuestionBucket(models.Model):
+    """签名分段哈希得到的 LSH 桶，至少有一个桶相同的题目才作为相似候选"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['bucket', 'question'], name='core_question_bucket_idx')]
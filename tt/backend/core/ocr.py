@@ -0,0 +1,270 @@
+"""OCR识别与AI解题流程"""
+import json
+import logging
+import os
+
+import pytesseract
+
+from .cache import hash_bytes, normalize_text, ocr_text_cache, solve_cache
+from .deepseek import get_client
+from .local_solver import solve_locally
+from .metrics import span
+from .ocr_engine import get_engine
+from .preprocess import open_image, preprocess_image
+
+logger = logging.getLogger(__name__)
+
+# 设置 Tesseract-OCR 可执行文件路径
+pytesseract.pytesseract.tesseract_cmd = r'D:\Tesseract-OCR\tesseract.exe'
+
+# Deepseek API 配置
+DEEPSEEK_API_KEY = 'your_api'
+DEEPSEEK_API_URL = os.environ.get('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
+
+# 本地求解规则改变、旧的缓存结果可能有误时递增，使旧结果失效
+SOLVE_CACHE_VERSION = 2
+
+def recognize_image(image):
+    """对图片进行OCR识别"""
+    return get_engine().recognize(image)
+
+def clean_ocr_text(text):
+    """预处理OCR文本"""
+    return text.replace('X', '×').replace('十', '+').replace('\n\n', '\n').strip()
+
+def solve_cache_key(cleaned_text):
+    """解题结果的缓存键"""
+    return hash_bytes(f'{SOLVE_CACHE_VERSION}:{normalize_text(cleaned_text)}'.encode('utf-8'))
+
+def lookup_cached_result(data):
+    """查询图片是否已有完整的缓存结果，返回 (原始文本, 解题结果) 或 None"""
+    text = ocr_text_cache.get(hash_bytes(data))
+    if text is None:
+        return None
+    result = solve_cache.get(solve_cache_key(clean_ocr_text(text)))
+    if result is None:
+        return None
+    return text, result
+
+def build_prompt(cleaned_text):
+    """构造解题提示词"""
+    return f"""作为一个数学教育专家，请先整理题目内容，然后解答以下数学题目：
+
+原始题目：
+{cleaned_text}
+
+请按以下格式返回JSON：
+{{
+    "question": {{
+        "main": "题目主要要求",
+        "sub_questions": [
+            {{
+                "id": "1",
+                "content": "59×2.5×0.4=□×(□×□)"
+            }},
+            // ... 其他小题
+        ]
+    }},
+    "analysis": {{
+        "1": "第1题的解题思路",
+        "2": "第2题的解题思路",
+        // ... 其他小题的解题思路
+    }},
+    "answer": {{
+        "1": "第1题的答案",
+        "2": "第2题的答案",
+        // ... 其他小题的答案
+    }}
+}}
+
+注意：
+1. 请确保sub_questions中的content包含完整的算式，包括等号和空格位置
+2. 对于需要填空的位置，使用□符号表示
+3. 保持原题的格式和符号
+4. 请直接返回JSON，不要添加其他说明文字"""
+
+def build_payload(prompt, stream=False):
+    """构造 Deepseek 请求体"""
+    payload = {
+        "model": "deepseek-chat",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": 2000
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+def format_result(parsed_result):
+    """重新组织返回的数据结构"""
+    return {
+        "question": parsed_result["question"]["main"],
+        "sub_questions": parsed_result["question"]["sub_questions"],
+        "analysis": parsed_result["analysis"],
+        "answer": parsed_result["answer"]
+    }
+
+def ask_deepseek(cleaned_text):
+    """请求Deepseek解题，返回 (结果, 是否成功)，失败时结果为错误提示"""
+    prompt = build_prompt(cleaned_text)
+
+    try:
+        logger.debug("发送到Deepseek的请求:\n%s", prompt)
+        
+        with span('llm_request') as request_span:
+            response = get_client(DEEPSEEK_API_URL, DEEPSEEK_API_KEY).post(build_payload(prompt))
+            if response.status_code != 200:
+                request_span.fail()
+        
+        logger.info("Deepseek API 状态码: %s，耗时 %.1fms", response.status_code, request_span.duration * 1000)
+        logger.debug("Deepseek API 响应:\n%s", response.text)
+        
+        if response.status_code == 200:
+            try:
+                with span('json_parse'):
+                    content = response.json()['choices'][0]['message']['content']
+                    
+                    # 处理可能的 Markdown 格式
+                    if content.startswith("```json"):
+                        content = content.replace("```json", "").replace("```", "").strip()
+                    elif content.startswith("```"):
+                        content = content.replace("```", "").strip()
+                    
+                    solved = format_result(json.loads(content))
+                return solved, True
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("解析API响应时出错: %s", e)
+                return {
+                    "question": cleaned_text,
+                    "analysis": "抱歉，解析AI响应时出错，请稍后重试。",
+                    "answer": "无法生成答案"
+                }, False
+        else:
+            logger.warning("API调用失败: %s - %s", response.status_code, response.text)
+            return {
+                "question": cleaned_text,
+                "analysis": f"API调用失败: {response.status_code}",
+                "answer": "请稍后重试"
+            }, False
+            
+    except Exception as e:
+        logger.error("调用Deepseek API时出错: %s", e)
+        return {
+            "question": cleaned_text,
+            "analysis": f"API调用出错: {str(e)}",
+            "answer": "请稍后重试"
+        }, False
+
+def local_result(local):
+    """把本地解出的部分整理成与 format_result 相同的结构，solved_by 记录每道小题的解答来源"""
+    return {
+        "question": local['main'],
+        "sub_questions": list(local['sub_questions']),
+        "analysis": dict(local['analysis']),
+        "answer": dict(local['answer']),
+        "solved_by": {sub_id: 'local' for sub_id in local['answer']}
+    }
+
+def pending_text(local):
+    """本地解不出的小题重新编号，与题目要求一起组成交给Deepseek的题目"""
+    return '\n'.join([local['main']] + [f"({index}) {sub['content']}"
+                                        for index, sub in enumerate(local['pending'], 1)])
+
+def merge_pending(local, llm_result):
+    """把Deepseek对剩余小题的解答与本地答案合并"""
+    solved = local_result(local)
+    pending = local['pending']
+    llm_subs = llm_result['sub_questions']
+    if len(llm_subs) == len(pending):
+        # 按顺序对应回原题的小题编号
+        pairs = [(sub['id'], str(llm_sub['id'])) for sub, llm_sub in zip(pending, llm_subs)]
+    else:
+        # 模型重新拆分了小题，用它的拆分替换剩余小题，编号接在原题之后
+        pending_ids = {sub['id'] for sub in pending}
+        solved['sub_questions'] = [sub for sub in solved['sub_questions'] if sub['id'] not in pending_ids]
+        offset = len(local['sub_questions'])
+        pairs = []
+        for index, llm_sub in enumerate(llm_subs, 1):
+            sub_id = str(offset + index)
+            solved['sub_questions'].append({'id': sub_id, 'content': llm_sub['content']})
+            pairs.append((sub_id, str(llm_sub['id'])))
+
+    for sub_id, llm_id in pairs:
+        solved['analysis'][sub_id] = llm_result['analysis'].get(llm_id, '')
+        solved['answer'][sub_id] = llm_result['answer'].get(llm_id, '')
+        solved['solved_by'][sub_id] = 'llm'
+    return solved
+
+def solve_pending(local):
+    """本地解不出的小题交给Deepseek，再与本地答案合并，返回 (结果, 是否成功)"""
+    if not local['pending']:
+        return local_result(local), True
+
+    llm_result, ok = ask_deepseek(pending_text(local))
+    if not ok:
+        # 保留本地答案，剩余小题给出错误提示
+        solved = local_result(local)
+        for sub in local['pending']:
+            solved['analysis'][sub['id']] = llm_result['analysis']
+            solved['answer'][sub['id']] = llm_result['answer']
+        return solved, False
+    return merge_pending(local, llm_result), True
+
+def process_with_deepseek(text):
+    """解题：纯算术小题在本地精确求解，其余使用Deepseek API处理"""
+    # 预处理OCR文本
+    with span('cleanup'):
+        cleaned_text = clean_ocr_text(text)
+    logger.debug("预处理后的文本:\n%s", cleaned_text)
+
+    cache_key = solve_cache_key(cleaned_text)
+    cached = solve_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    with span('local_solve'):
+        local = solve_locally(cleaned_text)
+    if local is not None and len(local['pending']) < len(local['sub_questions']):
+        solved, ok = solve_pending(local)
+    else:
+        solved, ok = ask_deepseek(cleaned_text)
+        if ok:
+            solved['solved_by'] = {str(sub['id']): 'llm' for sub in solved['sub_questions']}
+
+    # 只缓存成功的结果，失败时下次重新请求
+    if ok:
+        solve_cache.set(cache_key, solved)
+    return solved
+
+def recognize_upload(data):
+    """识别上传图片的原始字节，返回 (原始文本, 各阶段耗时)
+
+    相同图片直接复用缓存的OCR文本。
+    """
+    timings = {}
+
+    image_key = hash_bytes(data)
+    text = ocr_text_cache.get(image_key)
+    if text is None:
+        with span('decode', timings):
+            image = open_image(data)
+        with span('preprocess', timings):
+            image = preprocess_image(image)
+        with span('ocr', timings):
+            text = recognize_image(image)
+        ocr_text_cache.set(image_key, text)
+    logger.debug("原始OCR识别结果:\n%s", text)
+    return text, timings
+
+
+def run_ocr_pipeline(data):
+    """执行完整的识别流程，返回 (原始文本, 解题结果, 各阶段耗时)
+
+    data 为上传图片的原始字节。
+    """
+    text, timings = recognize_upload(data)
+
+    with span('solve', timings):
+        result = process_with_deepseek(text)
+
+    return text, result, timings
@@ -0,0 +1,218 @@
+"""OCR引擎
+
+pytesseract 每次识别都会启动一个 tesseract 进程并重新加载语言模型。
+TesseractPoolEngine 维护一组常驻的工作进程，每个进程通过 tesserocr
+只加载一次语言模型；没有安装 tesserocr 或进程池不可用时退回 pytesseract。
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future
+
+import pytesseract
+from django.conf import settings
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr 是可选依赖
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+
+class OCRTimeout(TimeoutError):
+    """识别超时"""
+
+
+class PoolReset(Exception):
+    """进程池因其他任务超时被重建，任务没有完成"""
+
+
+class PytesseractEngine:
+    """每张图片启动一次 tesseract 进程"""
+
+    name = 'pytesseract'
+
+    def __init__(self, lang='chi_sim+eng'):
+        self.lang = lang
+
+    def recognize(self, image):
+        return pytesseract.image_to_string(image, lang=self.lang).strip()
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """在当前进程内常驻一个 tesserocr 实例，语言模型只加载一次"""
+
+    name = 'tesserocr'
+
+    def __init__(self, lang='chi_sim+eng', tessdata=None):
+        if tessdata:
+            self._api = tesserocr.PyTessBaseAPI(path=tessdata, lang=lang)
+        else:
+            self._api = tesserocr.PyTessBaseAPI(lang=lang)
+        self._lock = threading.Lock()
+
+    def recognize(self, image):
+        with self._lock:
+            self._api.SetImage(image)
+            return self._api.GetUTF8Text().strip()
+
+    def close(self):
+        self._api.End()
+
+
+# 工作进程内的引擎实例，进程启动时创建
+_worker_engine = None
+_worker_error = None
+
+
+def _init_worker(lang, tessdata):
+    global _worker_engine, _worker_error
+    try:
+        _worker_engine = TesserocrEngine(lang, tessdata)
+    except Exception as e:
+        # 初始化函数抛出异常时进程池会不断重启工作进程，任务永远等不到结果；记下错误，由任务报告
+        _worker_error = f'{type(e).__name__}: {e}'
+
+
+def _check_worker():
+    if _worker_engine is None:
+        raise RuntimeError(f'OCR工作进程初始化失败: {_worker_error}')
+
+
+def _recognize_in_worker(image):
+    _check_worker()
+    return _worker_engine.recognize(image)
+
+
+class TesseractPoolEngine:
+    """常驻工作进程池，处理指定数量的任务后自动重启工作进程
+
+    进程池创建后先执行一个预热任务，工作进程无法初始化（例如缺少语言模型）时
+    不再使用进程池，改用 fallback。
+    """
+
+    name = 'pool'
+
+    def __init__(self, lang='chi_sim+eng', pool_size=2, task_timeout=60,
+                 max_tasks_per_worker=200, tessdata=None, fallback=None, warmup_timeout=10):
+        self.lang = lang
+        self.pool_size = pool_size
+        self.task_timeout = task_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.tessdata = tessdata
+        self.fallback = fallback
+        self.warmup_timeout = warmup_timeout
+        self._pool = None
+        self._pending = set()  # 当前进程池中未完成的任务
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """调用时需要持有 self._lock"""
+        if self._disabled:
+            raise RuntimeError('OCR工作进程初始化失败')
+        if self._pool is None:
+            # 使用 spawn，避免在多线程的 Web 进程中 fork
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(
+                self.pool_size,
+                initializer=_init_worker,
+                initargs=(self.lang, self.tessdata),
+                maxtasksperchild=self.max_tasks_per_worker,
+            )
+            try:
+                pool.apply_async(_check_worker).get(self.warmup_timeout)
+            except Exception as e:
+                pool.terminate()
+                self._disabled = True
+                if isinstance(e, multiprocessing.TimeoutError):
+                    e = RuntimeError(f'OCR工作进程 {self.warmup_timeout} 秒内没有完成初始化')
+                logger.error("OCR进程池不可用: %s", e)
+                raise e
+            self._pool = pool
+        return self._pool
+
+    def recognize(self, image):
+        if self._disabled and self.fallback is not None:
+            return self.fallback.recognize(image)
+        future = Future()
+        try:
+            with self._lock:
+                pool = self._get_pool()
+                pool.apply_async(_recognize_in_worker, (image,),
+                                 callback=future.set_result, error_callback=future.set_exception)
+                self._pending.add(future)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.warning("OCR进程池不可用，改用 %s: %s", self.fallback.name, e)
+            return self.fallback.recognize(image)
+
+        try:
+            return future.result(self.task_timeout)
+        except TimeoutError:
+            # 卡住的工作进程无法单独回收，只能重建进程池，同一进程池中其他未完成的任务一并失败
+            self._reset(pool)
+            raise OCRTimeout(f'OCR识别超过 {self.task_timeout} 秒')
+        except PoolReset:
+            if self.fallback is None:
+                raise
+            logger.warning("OCR进程池已重建，改用 %s 识别", self.fallback.name)
+            return self.fallback.recognize(image)
+        finally:
+            with self._lock:
+                self._pending.discard(future)
+
+    def _reset(self, pool):
+        """终止 pool，并让其中未完成的任务立即以 PoolReset 失败，不再等到各自超时"""
+        with self._lock:
+            if pool is None or pool is not self._pool:
+                return
+            self._pool = None
+            pending, self._pending = self._pending, set()
+        pool.terminate()
+        for future in pending:
+            if not future.done():
+                future.set_exception(PoolReset())
+
+    def close(self):
+        self._reset(self._pool)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def build_engine(backend=None, **overrides):
+    options = dict(getattr(settings, 'OCR_ENGINE', {}))
+    options.update(overrides)
+    backend = backend or options.get('BACKEND', 'pool')
+    lang = options.get('LANG', 'chi_sim+eng')
+
+    fallback = PytesseractEngine(lang)
+    if backend == 'pytesseract' or tesserocr is None:
+        return fallback
+    if backend == 'tesserocr':
+        return TesserocrEngine(lang, options.get('TESSDATA'))
+    return TesseractPoolEngine(
+        lang=lang,
+        pool_size=options.get('POOL_SIZE', 2),
+        task_timeout=options.get('TASK_TIMEOUT', 60),
+        max_tasks_per_worker=options.get('MAX_TASKS_PER_WORKER', 200),
+        tessdata=options.get('TESSDATA'),
+        fallback=fallback,
+        warmup_timeout=options.get('WARMUP_TIMEOUT', 10),
+    )
+
+
+def get_engine():
+    """获取进程内共享的OCR引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = build_engine()
+    return _engine
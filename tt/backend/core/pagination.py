@@ -0,0 +1,104 @@
+"""游标分页
+
+按 (created_at, id) 倒序排列，游标记录上一页最后一条的这两个值，下一页用行值比较
+(created_at, id) < (游标) 取出，配合 (created_at, id) 联合索引是一次索引范围扫描，
+翻到多深都只读取一页的数据。OFFSET 分页需要跳过前面的全部行，不使用。
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import F, Field, Func, Value
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def get_options():
+    options = {
+        'PAGE_SIZE': 50,
+        'MAX_PAGE_SIZE': 500,
+    }
+    options.update(getattr(settings, 'CURSOR_PAGINATION', {}))
+    return options
+
+
+class RowValue(Func):
+    """SQL 行值 (a, b)，SQLite 3.15+、PostgreSQL 和 MySQL 都支持按字典序比较"""
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+class KeysetPagination(BasePagination):
+    """视图可以通过 cursor_field 指定排序的时间字段，默认 created_at"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        options = get_options()
+        self.request = request
+        self.page_size = self.get_page_size(request, options)
+        self.field = getattr(view, 'cursor_field', 'created_at')
+        model_field = queryset.model._meta.get_field(self.field)
+
+        queryset = queryset.order_by(f'-{self.field}', '-pk')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            position, pk = cursor
+            queryset = queryset.alias(_cursor=RowValue(F(self.field), F('pk'))).filter(
+                _cursor__lt=RowValue(Value(position, output_field=model_field),
+                                     Value(pk, output_field=queryset.model._meta.pk))
+            )
+
+        # 多取一条判断是否还有下一页
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_page_size(self, request, options):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, options['PAGE_SIZE']))
+        except ValueError:
+            size = options['PAGE_SIZE']
+        return max(1, min(size, options['MAX_PAGE_SIZE']))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = parse_datetime(data['t'])
+            pk = int(data['id'])
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound('无效的游标')
+        if position is None:
+            raise NotFound('无效的游标')
+        return position, pk
+
+    def encode_cursor(self, instance):
+        data = {'t': getattr(instance, self.field).isoformat(), 'id': instance.pk}
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.encode_cursor(self.last)
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,64 @@
+"""用户学习进度（UserProgress）的维护
+
+保存练习记录时在同一个事务中用 F() 表达式累加计数，数据库在一条 UPDATE 中完成读和写，
+并发提交时不会互相覆盖。reconcile_progress 用一条按用户分组的聚合查询从练习历史重新计算，
+只改写和计算结果不一致的记录，修正直接写数据库等原因造成的偏差。
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import PracticeHistory, UserProgress
+
+COUNTERS = ('total_practices', 'correct_practices', 'total_time_spent', 'last_practice_at')
+
+
+def record_progress(user_id, is_correct, time_spent, practiced_at):
+    """把一次作答累加到用户进度，需要在保存练习记录的事务中调用"""
+    # 第一次练习时创建进度记录，已存在时忽略
+    UserProgress.objects.bulk_create([UserProgress(user_id=user_id)], ignore_conflicts=True)
+    UserProgress.objects.filter(user_id=user_id).update(
+        total_practices=F('total_practices') + 1,
+        correct_practices=F('correct_practices') + int(is_correct),
+        total_time_spent=F('total_time_spent') + time_spent,
+        # 提交顺序和作答顺序可能不同，只保留较晚的时间
+        last_practice_at=Greatest(Coalesce('last_practice_at', Value(practiced_at)), Value(practiced_at)),
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_progress(users=None):
+    """从练习历史重新计算用户进度，返回 (核对的用户数, 修正的记录数)"""
+    history = PracticeHistory.objects.all()
+    progress = UserProgress.objects.all()
+    if users is not None:
+        history, progress = history.filter(user__in=users), progress.filter(user__in=users)
+
+    with transaction.atomic():
+        # 先锁住已有的进度记录，统计期间提交的练习会等待，之后在新的计数上继续累加
+        current = {row[0]: row[1:] for row in progress.select_for_update().values_list('user_id', *COUNTERS)}
+        totals = history.values('user').annotate(
+            total_practices=Count('id'),
+            correct_practices=Count('id', filter=Q(is_correct=True)),
+            total_time_spent=Sum('time_spent'),
+            last_practice_at=Max('created_at'),
+        ).order_by()
+
+        now = timezone.now()
+        changed = []
+        for row in totals:
+            values = tuple(row[field] for field in COUNTERS)
+            if current.pop(row['user'], None) != values:
+                changed.append(UserProgress(user_id=row['user'], updated_at=now, **dict(zip(COUNTERS, values))))
+        UserProgress.objects.bulk_create(
+            changed, batch_size=1000, update_conflicts=True, unique_fields=['user'],
+            update_fields=list(COUNTERS) + ['updated_at'],
+        )
+        checked = len(totals) + len(current)
+        # 剩下的用户没有练习记录
+        empty = [user_id for user_id, values in current.items() if values != (0, 0, 0, None)]
+        UserProgress.objects.filter(user_id__in=empty).update(
+            total_practices=0, correct_practices=0, total_time_spent=0, last_practice_at=None, updated_at=now
+        )
+    return checked, len(changed) + len(empty)
@@ -0,0 +1,81 @@
+"""题库版本与分面统计
+
+题目或题目与知识节点的关联变化时更新题库版本（存放在共享缓存中），
+依赖题库的进程内索引和缓存的统计结果都以版本为键，版本变化后自然失效。
+
+分面统计按当前筛选条件计算各难度、各分类、各知识节点的题目数，
+三个分组查询用 UNION ALL 合成一条 SQL，结果按 (版本, 筛选条件) 缓存。
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Cast
+
+from .models import Question
+
+QUESTION_BANK_VERSION_KEY = 'question_bank:version'
+
+
+def get_options():
+    options = {
+        'FACETS_TTL': 300,  # 分面统计的缓存时间，单位：秒；知识节点修改分类后最多延迟这么久
+        'FACET_NODE_LIMIT': 50,  # 知识节点分面只返回题目最多的前 N 个
+        'HOT_FILTER_ROWS': 5000,  # 按知识节点、分类筛选时匹配的关联超过这个数改用 EXISTS
+    }
+    options.update(getattr(settings, 'QUESTION_BANK', {}))
+    return options
+
+
+def get_version():
+    version = cache.get(QUESTION_BANK_VERSION_KEY)
+    if version is None:
+        cache.add(QUESTION_BANK_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(QUESTION_BANK_VERSION_KEY)
+    return version
+
+
+def bump_version():
+    cache.set(QUESTION_BANK_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _grouped(queryset, facet, key, count):
+    return queryset.order_by().values(key).annotate(
+        facet=Value(facet, output_field=CharField()), value=Cast(key, CharField()), count=count
+    ).values_list('facet', 'value', 'count')
+
+
+def compute_facets(questions):
+    """questions 为筛选后的题目查询集，返回 {total, difficulty, category, node}"""
+    options = get_options()
+    links = Question.knowledge_nodes.through.objects.all()
+    if questions.query.has_filters():
+        links = links.filter(question_id__in=questions.order_by().values('id'))
+    rows = _grouped(questions, 'difficulty', 'difficulty', Count('id')).union(
+        # 每个 (题目, 节点) 只有一行，按节点计数不需要去重；同一分类下可能有同一道题的多个节点
+        _grouped(links, 'node', 'knowledgenode_id', Count('id')),
+        _grouped(links, 'category', 'knowledgenode__category', Count('question_id', distinct=True)),
+        all=True,
+    )
+
+    facets = {'total': 0, 'difficulty': {}, 'category': {}, 'node': {}}
+    for facet, value, count in rows:
+        facets[facet][value] = count
+    facets['total'] = sum(facets['difficulty'].values())
+    top = sorted(facets['node'].items(), key=lambda item: (-item[1], int(item[0])))[:options['FACET_NODE_LIMIT']]
+    facets['node'] = dict(top)
+    return facets
+
+
+def get_facets(questions, params):
+    """params 为影响结果的筛选参数，和题库版本一起作为缓存键"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    key = f'question_bank:facets:{get_version()}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(questions)
+        cache.set(key, facets, get_options()['FACETS_TTL'])
+    return facets
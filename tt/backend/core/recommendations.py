@@ -0,0 +1,273 @@
+"""题目推荐
+
+每个用户的练习状态预先汇总在 NodeMastery（知识节点上的作答次数、正确次数、最近练习时间）
+和 QuestionAttempt（每道题最近一次作答）中，保存练习记录时增量更新，推荐时不扫描练习历史。
+
+推荐过程：
+1. 候选节点：掌握度低的节点（最近练习的权重更高），以及它们在图谱中的相邻节点；
+   另外以较低权重加入尚未练习的简单节点；
+2. 候选题目：候选节点关联的题目，题目与节点的对应关系按题库版本缓存在进程内；
+3. 用 NumPy 向量化打分：节点薄弱程度 × 难度匹配 × 新颖度，最近答对过的题目不推荐。
+"""
+import itertools
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Max, Q
+from django.utils import timezone
+
+from .learning_path import get_graph
+from .models import NodeMastery, PracticeHistory, Question, QuestionAttempt
+from .question_bank import get_version as get_question_bank_version
+from .review import apply_review, get_options as get_review_options
+
+QuestionIndex = namedtuple('QuestionIndex', 'version question_ids difficulty node_indptr node_questions easy_order')
+
+
+def get_options():
+    options = {
+        'WEAK_THRESHOLD': 0.7,  # 掌握度低于该值的节点视为薄弱
+        'MAX_WEAK_NODES': 20,  # 参与推荐的薄弱节点数
+        'NEIGHBOR_WEIGHT': 0.5,  # 相邻节点相对薄弱节点的权重
+        'EXPLORE_WEIGHT': 0.2,  # 未练习节点的权重，有薄弱节点时用于补足推荐数量
+        'RECENCY_DAYS': 14,  # 最近练习权重的衰减时间，单位：天
+        'EXCLUDE_CORRECT_DAYS': 7,  # 该天数内答对过的题目不推荐
+        'RETRY_NOVELTY': 0.6,  # 答错过的题目的新颖度
+        'SEEN_NOVELTY': 0.2,  # 很久以前答对过的题目的新颖度
+        'MAX_LIMIT': 50,
+    }
+    options.update(getattr(settings, 'RECOMMENDATIONS', {}))
+    return options
+
+
+def record_practice(user_id, question_id, is_correct, time_spent, practiced_at):
+    """把一次作答累加到用户的练习状态：节点统计用 F() 原子更新，题目的复习计划锁行后更新"""
+    node_ids = list(Question.knowledge_nodes.through.objects.filter(question_id=question_id)
+                    .values_list('knowledgenode_id', flat=True))
+    with transaction.atomic():
+        attempt, _ = QuestionAttempt.objects.select_for_update().get_or_create(user_id=user_id, question_id=question_id)
+        attempt.attempts += 1
+        attempt.last_correct = is_correct
+        attempt.last_attempted_at = practiced_at
+        apply_review(attempt, is_correct, time_spent, practiced_at)
+        attempt.save()
+        if node_ids:
+            NodeMastery.objects.bulk_create(
+                [NodeMastery(user_id=user_id, node_id=node_id) for node_id in node_ids], ignore_conflicts=True
+            )
+            NodeMastery.objects.filter(user_id=user_id, node_id__in=node_ids).update(
+                attempts=F('attempts') + 1, correct=F('correct') + int(is_correct), last_practiced_at=practiced_at
+            )
+
+
+def rebuild_practice_state(users=None):
+    """从练习历史重新汇总练习状态，返回 (节点统计行数, 题目统计行数)"""
+    history = PracticeHistory.objects.all()
+    if users is not None:
+        history = history.filter(user__in=users)
+
+    node_rows = (
+        history.filter(question__knowledge_nodes__isnull=False)
+        .values('user', 'question__knowledge_nodes')
+        .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)), latest=Max('created_at'))
+    )
+    with transaction.atomic():
+        mastery = NodeMastery.objects.all()
+        attempts = QuestionAttempt.objects.all()
+        if users is not None:
+            mastery, attempts = mastery.filter(user__in=users), attempts.filter(user__in=users)
+        mastery.delete()
+        attempts.delete()
+        NodeMastery.objects.bulk_create((
+            NodeMastery(user_id=row['user'], node_id=row['question__knowledge_nodes'], attempts=row['total'],
+                        correct=row['correct'], last_practiced_at=row['latest'])
+            for row in node_rows.iterator(chunk_size=5000)
+        ), batch_size=5000)
+        QuestionAttempt.objects.bulk_create(_replay_attempts(history), batch_size=5000)
+    return mastery.count(), attempts.count()
+
+
+def _replay_attempts(history):
+    """复习计划依赖作答顺序，不能聚合，按时间顺序重放每个用户每道题的练习记录"""
+    options = get_review_options()
+    attempt = None
+    rows = history.order_by('user', 'question', 'created_at', 'id').values_list(
+        'user', 'question', 'is_correct', 'time_spent', 'created_at'
+    )
+    for user_id, question_id, is_correct, time_spent, created_at in rows.iterator(chunk_size=5000):
+        if attempt is None or (attempt.user_id, attempt.question_id) != (user_id, question_id):
+            if attempt is not None:
+                yield attempt
+            attempt = QuestionAttempt(user_id=user_id, question_id=question_id)
+        attempt.attempts += 1
+        attempt.last_correct = is_correct
+        attempt.last_attempted_at = created_at
+        apply_review(attempt, is_correct, time_spent, created_at, options)
+    if attempt is not None:
+        yield attempt
+
+
+def build_question_index(version):
+    """节点 -> 题目的 CSR 数组，节点按前置关系图中的位置编号"""
+    graph = get_graph()
+    rows = np.array(list(Question.objects.order_by('id').values_list('id', 'difficulty')), dtype=np.int64)
+    rows = rows.reshape(-1, 2)
+    pairs = np.array(list(Question.knowledge_nodes.through.objects.values_list('knowledgenode_id', 'question_id')),
+                     dtype=np.int64).reshape(-1, 2)
+
+    question_ids = rows[:, 0]
+    node_positions = np.array([graph.positions.get(node_id, -1) for node_id in pairs[:, 0].tolist()], dtype=np.int64)
+    question_positions = np.searchsorted(question_ids, pairs[:, 1])
+    keep = node_positions >= 0
+    node_positions, question_positions = node_positions[keep], question_positions[keep]
+
+    order = np.argsort(node_positions, kind='stable')
+    indptr = np.zeros(len(graph.node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(node_positions, minlength=len(graph.node_ids)), out=indptr[1:])
+    return QuestionIndex(
+        version=(graph.version, version),
+        question_ids=question_ids,
+        difficulty=rows[:, 1].astype(np.float64),
+        node_indptr=indptr,
+        node_questions=question_positions[order],
+        # 节点按难度、层级排序，用于选取未练习的简单节点
+        easy_order=np.lexsort((graph.node_ids, graph.level, graph.difficulty)),
+    )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_question_index():
+    global _index
+    version = get_question_bank_version()
+    key = (get_graph().version, version)
+    index = _index
+    if index is not None and index.version == key:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != key:
+            _index = build_question_index(version)
+        return _index
+
+
+def candidate_nodes(user, graph, easy_order, now, options):
+    """返回 (节点位置数组, 优先级数组, 整体正确率)"""
+    stats = np.array(
+        list(NodeMastery.objects.filter(user=user).values_list('node_id', 'attempts', 'correct')), dtype=np.int64
+    ).reshape(-1, 3)
+    node_ids, attempts, correct = stats[:, 0], stats[:, 1].astype(np.float64), stats[:, 2].astype(np.float64)
+    accuracy = correct.sum() / attempts.sum() if attempts.sum() else 0.5
+    positions = np.array([graph.positions.get(node_id, -1) for node_id in node_ids.tolist()], dtype=np.int64)
+
+    priority = {}
+    mastery = (correct + 1) / (attempts + 2)  # 拉普拉斯平滑，练习少时接近 0.5
+    weak = (mastery < options['WEAK_THRESHOLD']) & (positions >= 0)
+    if weak.any():
+        # 权重 = (1 - 掌握度) × 最近练习系数，系数在 0.5-1 之间。按上界从大到小分批查询练习时间，
+        # 批大小逐次翻倍，剩余节点的上界不超过当前第 K 大的权重时停止
+        chosen = np.nonzero(weak)[0]
+        chosen = chosen[np.argsort(mastery[chosen], kind='stable')]
+        k = options['MAX_WEAK_NODES']
+        weight = np.zeros(0)
+        size = 2 * k
+        while len(weight) < len(chosen):
+            batch = chosen[len(weight):len(weight) + size]
+            size *= 2
+            practiced_at = dict(NodeMastery.objects.filter(user=user, node_id__in=node_ids[batch].tolist())
+                                .values_list('node_id', 'last_practiced_at'))
+            age_days = np.array([
+                (now - practiced_at[node_id]).total_seconds() / 86400 if practiced_at.get(node_id) else 365
+                for node_id in node_ids[batch].tolist()
+            ])
+            recency = 0.5 + 0.5 * np.exp(-age_days / options['RECENCY_DAYS'])
+            weight = np.concatenate([weight, (1 - mastery[batch]) * recency])
+            if len(weight) >= len(chosen) or (len(weight) >= k and 1 - mastery[chosen[len(weight)]] <= np.sort(weight)[-k]):
+                break
+        top = np.argsort(-weight, kind='stable')[:k]
+
+        mastered = set(positions[~weak & (positions >= 0)].tolist())
+        for position, value in zip(positions[chosen[top]].tolist(), weight[top].tolist()):
+            priority[position] = max(priority.get(position, 0), value)
+            for neighbor in graph.neighbors[position]:
+                if neighbor not in mastered:
+                    priority[neighbor] = max(priority.get(neighbor, 0), value * options['NEIGHBOR_WEIGHT'])
+
+    # 尚未练习的简单节点：没有薄弱节点时作为起点，否则以较低权重补足候选
+    explore = 1 if not priority else options['EXPLORE_WEIGHT']
+    practiced = set(positions.tolist())
+    fresh = (p for p in easy_order if p not in practiced and p not in priority)
+    for position in itertools.islice(fresh, options['MAX_WEAK_NODES']):
+        position = int(position)
+        priority[position] = explore * 0.5 / graph.difficulty[position]
+
+    nodes = np.fromiter(priority.keys(), dtype=np.int64, count=len(priority))
+    values = np.fromiter(priority.values(), dtype=np.float64, count=len(priority))
+    return nodes, values, accuracy
+
+
+def recommend(user, limit=5):
+    """返回 [(题目ID, 得分, 主要相关的节点ID)]，按得分降序"""
+    options = get_options()
+    now = timezone.now()
+    graph = get_graph()
+    index = get_question_index()
+    nodes, priority, accuracy = candidate_nodes(user, graph, index.easy_order, now, options)
+
+    # 展开候选节点的全部题目，同一道题取优先级最高的节点
+    starts = index.node_indptr[nodes]
+    counts = index.node_indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return []
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    questions = index.node_questions[np.repeat(starts, counts) + offsets]
+    pair_priority = np.repeat(priority, counts)
+    pair_nodes = np.repeat(nodes, counts)
+
+    order = np.lexsort((-pair_priority, questions))
+    questions, pair_priority, pair_nodes = questions[order], pair_priority[order], pair_nodes[order]
+    first = np.concatenate([[True], questions[1:] != questions[:-1]])
+    questions, relevance, source_nodes = questions[first], pair_priority[first], pair_nodes[first]
+
+    # 难度匹配：正确率越高，目标难度越高（题目难度 1-3）
+    target = 1 + 2 * accuracy
+    fit = np.exp(-((index.difficulty[questions] - target) ** 2) / 2)
+
+    # 新颖度：没做过的题最高；最近答对过的排除。
+    # 用候选节点的子查询过滤，避免把数千个题目ID作为参数传入
+    novelty = np.ones(len(questions))
+    question_ids = index.question_ids[questions]
+    candidate_questions = Question.knowledge_nodes.through.objects.filter(
+        knowledgenode_id__in=[graph.node_ids[position] for position in nodes.tolist()]
+    ).values('question_id')
+    rows = QuestionAttempt.objects.filter(user=user, question_id__in=candidate_questions).annotate(
+        recent=ExpressionWrapper(
+            Q(last_attempted_at__gte=now - timedelta(days=options['EXCLUDE_CORRECT_DAYS'])), output_field=BooleanField()
+        )
+    ).values_list('question_id', 'last_correct', 'recent')
+    attempts = np.array([(question_id, correct, bool(recent)) for question_id, correct, recent in rows],
+                        dtype=np.int64).reshape(-1, 3)
+    found = np.searchsorted(question_ids, attempts[:, 0])
+    found = np.minimum(found, len(question_ids) - 1)
+    matched = question_ids[found] == attempts[:, 0]
+    found, last_correct, recent = found[matched], attempts[matched, 1] == 1, attempts[matched, 2] == 1
+    novelty[found[~last_correct]] = options['RETRY_NOVELTY']
+    novelty[found[last_correct & ~recent]] = options['SEEN_NOVELTY']
+    novelty[found[last_correct & recent]] = 0
+
+    scores = relevance * fit * novelty
+    candidates = np.nonzero(scores > 0)[0]
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    # 得分相同时按题目ID，结果稳定
+    candidates = candidates[np.lexsort((question_ids[candidates], -scores[candidates]))]
+    return [
+        (int(question_ids[i]), round(float(scores[i]), 4), graph.node_ids[int(source_nodes[i])])
+        for i in candidates
+    ]
@@ -0,0 +1,58 @@
+"""DRF 渲染器：MessagePack 和列式图谱编码"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .encoding import msgpack, pack, to_columnar
+
+
+def _plain(data):
+    """把序列化结果中的日期、Decimal、UUID 等转换为 MessagePack 支持的类型"""
+    if isinstance(data, dict):
+        return {key: _plain(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_plain(value) for value in data]
+    if data is None or isinstance(data, (str, int, float, bool, bytes)):
+        return data
+    return JSONEncoder().default(data)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return pack(_plain(data))
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """知识图谱的列式编码，以JSON传输"""
+    media_type = 'application/vnd.mathhelper.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'nodes' in data:
+            data = to_columnar(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class ColumnarMessagePackRenderer(MessagePackRenderer):
+    """知识图谱的列式编码，以 MessagePack 传输"""
+    media_type = 'application/vnd.mathhelper.columnar+msgpack'
+    format = 'columnar-msgpack'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'nodes' in data:
+            data = to_columnar(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def graph_renderers():
+    """知识图谱接口可用的渲染器，未安装 msgpack 时只提供JSON"""
+    renderers = [JSONRenderer, ColumnarJSONRenderer]
+    if msgpack is not None:
+        renderers += [MessagePackRenderer, ColumnarMessagePackRenderer]
+    return renderers
@@ -0,0 +1,72 @@
+"""间隔复习
+
+每道做过的题目在 QuestionAttempt 上保存一份 SM-2 复习计划，保存练习记录时更新：
+- 作答质量 0-5 由是否正确和用时得到：答错为 1，答对时按用时分为 5/4/3；
+- 质量不低于 3 时复习间隔依次为 1 天、6 天、上次间隔 × 难度系数，否则从头开始；
+- 难度系数按 SM-2 公式调整，最低 1.3。
+
+下次复习时间 next_review_at 和用户ID建有联合索引，待复习队列是一次索引范围扫描。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import QuestionAttempt
+
+MIN_EASE_FACTOR = 1.3
+
+
+def get_options():
+    options = {
+        'FAST_SECONDS': 60,  # 答对且用时不超过该值，质量为 5
+        'SLOW_SECONDS': 300,  # 答对且用时超过该值，质量为 3，其余为 4
+        'MAX_INTERVAL': 365,  # 复习间隔上限，单位：天
+        'MAX_LIMIT': 100,
+    }
+    options.update(getattr(settings, 'REVIEW', {}))
+    return options
+
+
+def answer_quality(is_correct, time_spent, options=None):
+    options = options or get_options()
+    if not is_correct:
+        return 1
+    if time_spent is not None and time_spent <= options['FAST_SECONDS']:
+        return 5
+    if time_spent is not None and time_spent > options['SLOW_SECONDS']:
+        return 3
+    return 4
+
+
+def schedule(repetitions, interval, ease_factor, quality, max_interval=365):
+    """SM-2：返回新的 (连续答对次数, 间隔天数, 难度系数)"""
+    if quality >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = min(interval * ease_factor, max_interval)
+        repetitions += 1
+    else:
+        repetitions, interval = 0, 1
+    ease_factor = max(MIN_EASE_FACTOR, ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return repetitions, interval, ease_factor
+
+
+def apply_review(attempt, is_correct, time_spent, reviewed_at, options=None):
+    """把一次作答应用到 QuestionAttempt 实例的复习计划上，不保存"""
+    options = options or get_options()
+    quality = answer_quality(is_correct, time_spent, options)
+    attempt.repetitions, attempt.interval, attempt.ease_factor = schedule(
+        attempt.repetitions, attempt.interval, attempt.ease_factor, quality, options['MAX_INTERVAL']
+    )
+    attempt.next_review_at = reviewed_at + timedelta(days=attempt.interval)
+
+
+def due_reviews(user, now, limit=20):
+    """到期的复习项，按到期时间排序"""
+    return (
+        QuestionAttempt.objects.filter(user=user, next_review_at__lte=now)
+        .order_by('next_review_at', 'id')[:limit]
+    )
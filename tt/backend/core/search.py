@@ -0,0 +1,242 @@
+"""全文搜索
+
+题目（标题、内容、答案）和知识节点（标题、内容）写入同一张 SQLite FTS5 表。
+FTS5 自带的分词器不能切分中文，写入前先在 Python 中分词：
+连续的汉字切成重叠的二元组（末尾再加一个单字），字母数字按单词小写。
+查询时把汉字串转成二元组短语，相邻二元组必须连续出现，等价于子串匹配；
+单个汉字用前缀查询。排序使用 bm25，标题权重更高；摘要和高亮在原文上生成。
+
+rowid = 对象ID * 2 + 类型编号，更新和删除时直接按 rowid 定位。
+模型信号保持索引同步；非 SQLite 数据库退化为 icontains 查询。
+"""
+import html
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .models import KnowledgeNode, Question
+
+SEARCH_TABLE = 'core_search'
+KINDS = {'question': 0, 'node': 1}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+HAN = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'  # 汉字：扩展A、基本区、兼容区
+TOKEN_RE = re.compile(f'([{HAN}]+)|([0-9A-Za-z]+)')
+
+
+def get_options():
+    options = {
+        'TITLE_WEIGHT': 10.0,  # bm25 中标题相对内容的权重
+        'BODY_WEIGHT': 1.0,
+        'SNIPPET_LENGTH': 80,  # 摘要的字数
+        'MAX_LIMIT': 50,
+    }
+    options.update(getattr(settings, 'SEARCH', {}))
+    return options
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def tokenize(text):
+    tokens = []
+    for han, word in TOKEN_RE.findall(text or ''):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(han[i:i + 2] for i in range(len(han) - 1))
+        tokens.append(han[-1])
+    return tokens
+
+
+def index_text(text):
+    return ' '.join(tokenize(text))
+
+
+def query_terms(query):
+    """查询中的汉字串和单词，用于生成 MATCH 表达式和高亮"""
+    return [han or word.lower() for han, word in TOKEN_RE.findall(query or '')]
+
+
+def build_match(query):
+    """把用户输入转成 FTS5 查询，各个词之间是 AND 关系；没有可搜索的词时返回 None"""
+    parts = []
+    for term in query_terms(query):
+        if TOKEN_RE.fullmatch(term).group(2) or len(term) == 1:
+            parts.append(f'"{term}"*')
+        else:
+            parts.append('"{}"'.format(' '.join(term[i:i + 2] for i in range(len(term) - 1))))
+    return ' '.join(parts) or None
+
+
+def create_table(table=SEARCH_TABLE, cursor=None):
+    sql = f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(title, body, tokenize='unicode61')"
+    if cursor is not None:
+        cursor.execute(sql)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def _rowid(kind, object_id):
+    return object_id * 2 + KINDS[kind]
+
+
+def document_rows(kind, documents):
+    """(对象ID, 标题, 正文...) -> (rowid, 分词后的标题, 分词后的正文)"""
+    for object_id, title, *body in documents:
+        yield _rowid(kind, object_id), index_text(title), index_text(' '.join(part or '' for part in body))
+
+
+def index_documents(kind, documents, table=SEARCH_TABLE):
+    """写入或替换文档，documents 为 (对象ID, 标题, 正文...) 的序列"""
+    if not available():
+        return
+    rows = list(document_rows(kind, documents))
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {table} (rowid, title, body) VALUES (%s, %s, %s)', rows)
+
+
+def remove_document(kind, object_id, table=SEARCH_TABLE):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [_rowid(kind, object_id)])
+
+
+def question_documents(queryset=None):
+    queryset = Question.objects.all() if queryset is None else queryset
+    return queryset.values_list('id', 'title', 'content', 'answer').iterator(chunk_size=2000)
+
+
+def node_documents(queryset=None):
+    queryset = KnowledgeNode.objects.all() if queryset is None else queryset
+    return queryset.values_list('id', 'title', 'content').iterator(chunk_size=2000)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rebuild(table=SEARCH_TABLE):
+    """重建整个索引，返回写入的文档数"""
+    count = 0
+    with connection.cursor() as cursor:
+        create_table(table, cursor)
+        cursor.execute(f'DELETE FROM {table}')
+        for kind, documents in (('question', question_documents()), ('node', node_documents())):
+            for chunk in _chunks(documents, 2000):
+                cursor.executemany(
+                    f'INSERT INTO {table} (rowid, title, body) VALUES (%s, %s, %s)',
+                    list(document_rows(kind, chunk))
+                )
+                count += len(chunk)
+        # 合并 b-tree 段，提高查询速度
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return count
+
+
+def ranked_matches(match, kinds=None, limit=20, offset=0, table=SEARCH_TABLE):
+    """按 bm25 排序的 (类型, 对象ID, 得分) 列表，得分越小越相关"""
+    options = get_options()
+    sql = f'SELECT rowid, bm25({table}, %s, %s) AS score FROM {table} WHERE {table} MATCH %s'
+    params = [options['TITLE_WEIGHT'], options['BODY_WEIGHT'], match]
+    if kinds and len(kinds) < len(KINDS):
+        sql += ' AND rowid %% 2 IN ({})'.format(', '.join(['%s'] * len(kinds)))
+        params += [KINDS[kind] for kind in kinds]
+    sql += ' ORDER BY score LIMIT %s OFFSET %s'
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(KIND_NAMES[rowid % 2], rowid // 2, score) for rowid, score in cursor.fetchall()]
+
+
+def highlight(text, terms, length=None):
+    """截取第一个命中附近的一段原文，命中的词用 <mark> 包裹；length 为 None 时不截取"""
+    text = text or ''
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE) \
+        if terms else None
+    if length is not None:
+        first = pattern.search(text) if pattern else None
+        start = max(0, first.start() - length // 4) if first else 0
+        end = min(len(text), start + length)
+        prefix, suffix = ('…' if start > 0 else ''), ('…' if end < len(text) else '')
+        text = text[start:end]
+    else:
+        prefix = suffix = ''
+    if pattern is None:
+        return prefix + html.escape(text) + suffix
+    parts, position = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return prefix + ''.join(parts) + suffix
+
+
+def _load(kind, ids):
+    if kind == 'question':
+        rows = Question.objects.filter(id__in=ids).values('id', 'title', 'content', 'answer')
+    else:
+        rows = KnowledgeNode.objects.filter(id__in=ids).values('id', 'title', 'content')
+    return {row['id']: row for row in rows}
+
+
+def _fallback_matches(query, kinds, limit, offset):
+    matches = []
+    for kind in kinds or KINDS:
+        model = Question if kind == 'question' else KnowledgeNode
+        ids = model.objects.filter(title__icontains=query).values_list('id', flat=True)[:offset + limit]
+        matches += [(kind, object_id, 0.0) for object_id in ids]
+    return matches[offset:offset + limit]
+
+
+def search(query, kinds=None, limit=20, offset=0):
+    """搜索题目和知识节点，返回带摘要和高亮的结果列表"""
+    options = get_options()
+    limit = min(limit, options['MAX_LIMIT'])
+    match = build_match(query)
+    if match is None:
+        return []
+    if available():
+        matches = ranked_matches(match, kinds, limit, offset)
+    else:
+        matches = _fallback_matches(query.strip(), kinds, limit, offset)
+
+    objects = {
+        kind: _load(kind, [object_id for match_kind, object_id, _ in matches if match_kind == kind])
+        for kind in {kind for kind, _, _ in matches}
+    }
+    terms = query_terms(query)
+    results = []
+    for kind, object_id, score in matches:
+        row = objects[kind].get(object_id)
+        if row is None:
+            continue
+        # 摘要取第一个包含查询词的正文字段
+        body = next(
+            (row[field] for field in ('content', 'answer') if field in row and any(
+                term.lower() in (row[field] or '').lower() for term in terms)),
+            row['content']
+        )
+        results.append({
+            'type': kind,
+            'id': object_id,
+            'title': highlight(row['title'], terms),
+            'snippet': highlight(body, terms, options['SNIPPET_LENGTH']),
+            'score': round(-score, 4),
+        })
+    return results
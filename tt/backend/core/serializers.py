@@ -1,9 +1,86 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import KnowledgeNode, KnowledgeLink, Question, PracticeHistory, UserProgress
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from .models import KnowledgeNode, KnowledgeLink, Question, PracticeHistory, UserProgress, OCRJob
 
 User = get_user_model()
 
+class SparseFieldsetMixin:
+    """按请求裁剪字段：
+
+    - context['fields']：只输出这些字段，未指定时列表使用 Meta.list_fields，详情输出全部字段；
+    - 列表中的嵌套对象默认使用 Meta.brief_serializers 中的精简序列化器，
+      context['expand'] 中列出的字段保持完整嵌套。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        slim = self.context.get('slim', False)
+        if fields is None and slim:
+            fields = getattr(self.Meta, 'list_fields', None)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if slim:
+            expand = self.context.get('expand', ())
+            for name, serializer_class in getattr(self.Meta, 'brief_serializers', {}).items():
+                if name in self.fields and name not in expand:
+                    field = self.fields[name]
+                    self.fields[name] = serializer_class(many=isinstance(field, serializers.ListSerializer),
+                                                         read_only=True)
+
+    @classmethod
+    def available_fields(cls):
+        return set(cls().fields)
+
+    @classmethod
+    def expandable_fields(cls):
+        return set(getattr(cls.Meta, 'brief_serializers', {}))
+
+    def optimize_queryset(self, queryset):
+        """只查询输出需要的列，嵌套对象用 select_related/prefetch_related 一次取出"""
+        return _optimize(queryset, self)
+
+def _optimize(queryset, serializer):
+    plan = _plan(serializer)
+    if plan is None:
+        return queryset
+    only, related, prefetch = plan
+    return queryset.select_related(*related).prefetch_related(*prefetch).only(*only)
+
+def _plan(serializer, prefix=''):
+    """返回 (only 字段, select_related 字段, Prefetch 列表)；输出依赖模型之外的属性时返回 None"""
+    model = serializer.Meta.model
+    only, related, prefetch = [], [], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        name = prefix + model_field.name
+        if not isinstance(nested, serializers.ModelSerializer):
+            if model_field.concrete and not model_field.many_to_many:
+                only.append(name)
+        elif model_field.many_to_many:
+            prefetch.append(Prefetch(name, queryset=_optimize(nested.Meta.model.objects.all(), nested)))
+        elif model_field.many_to_one or model_field.one_to_one:
+            plan = _plan(nested, name + '__')
+            if plan is None:
+                return None
+            related.append(name)
+            only.append(name)
+            only.extend(plan[0])
+            related.extend(plan[1])
+            prefetch.extend(plan[2])
+        else:
+            return None
+    return only, related, prefetch
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -29,6 +106,13 @@ class KnowledgeNodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = KnowledgeNode
         fields = '__all__'
+        read_only_fields = ('pagerank', 'betweenness', 'in_degree', 'out_degree')
+
+class KnowledgeNodeBriefSerializer(serializers.ModelSerializer):
+    """列表中嵌套的知识节点，不含内容"""
+    class Meta:
+        model = KnowledgeNode
+        fields = ('id', 'title', 'category', 'difficulty')
 
 class KnowledgeLinkSerializer(serializers.ModelSerializer):
     source = KnowledgeNodeSerializer(read_only=True)
@@ -38,20 +122,31 @@ class KnowledgeLinkSerializer(serializers.ModelSerializer):
         model = KnowledgeLink
         fields = '__all__'
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     knowledge_nodes = KnowledgeNodeSerializer(many=True, read_only=True)
 
     class Meta:
         model = Question
         fields = '__all__'
+        list_fields = ('id', 'title', 'difficulty', 'knowledge_nodes', 'created_at')
+        brief_serializers = {'knowledge_nodes': KnowledgeNodeBriefSerializer}
+
+class QuestionBriefSerializer(serializers.ModelSerializer):
+    """列表中嵌套的题目，不含题干和答案"""
+    class Meta:
+        model = Question
+        fields = ('id', 'title', 'difficulty')
 
-class PracticeHistorySerializer(serializers.ModelSerializer):
+class PracticeHistorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     question = QuestionSerializer(read_only=True)
+    question_id = serializers.PrimaryKeyRelatedField(source='question', queryset=Question.objects.only('id'),
+                                                     write_only=True)
 
     class Meta:
         model = PracticeHistory
         fields = '__all__'
         read_only_fields = ('user', 'created_at')
+        brief_serializers = {'question': QuestionBriefSerializer}
 
 class UserProgressSerializer(serializers.ModelSerializer):
     mastery_level = serializers.SerializerMethodField()
@@ -62,4 +157,11 @@ class UserProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'created_at', 'updated_at')
 
     def get_mastery_level(self, obj):
-        return obj.calculate_mastery_level() 
\ No newline at end of file
+        return obj.calculate_mastery_level()
+
+class OCRJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OCRJob
+        fields = ('id', 'status', 'text', 'result', 'error', 'timings',
+                  'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
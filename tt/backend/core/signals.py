@@ -0,0 +1,73 @@
+"""模型信号：记录知识图谱的变更，使缓存的快照失效；同步全文索引、相似题目索引、题库版本、练习状态和学习进度"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .graph_index import refresh_index_version
+from .knowledge_map import record_change, refresh_map_version
+from .layout import schedule_relayout
+from .models import KnowledgeLink, KnowledgeNode, PracticeHistory, Question
+from .progress import record_progress
+from .question_bank import bump_version as bump_question_bank_version
+from .recommendations import record_practice
+from .search import index_documents, remove_document
+from .similarity import index_questions
+
+KINDS = {KnowledgeNode: 'node', KnowledgeLink: 'link'}
+
+
+@receiver(post_save, sender=KnowledgeNode)
+@receiver(post_save, sender=KnowledgeLink)
+def knowledge_graph_saved(sender, instance, **kwargs):
+    record_change(KINDS[sender], instance.pk, 'upsert')
+    # 事务提交后再更新版本，避免其他请求用未提交的数据重建快照
+    transaction.on_commit(refresh_map_version)
+    transaction.on_commit(refresh_index_version)
+    transaction.on_commit(schedule_relayout)
+
+
+@receiver(post_delete, sender=KnowledgeNode)
+@receiver(post_delete, sender=KnowledgeLink)
+def knowledge_graph_deleted(sender, instance, **kwargs):
+    record_change(KINDS[sender], instance.pk, 'delete')
+    transaction.on_commit(refresh_map_version)
+    transaction.on_commit(refresh_index_version)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=KnowledgeNode)
+def search_document_saved(sender, instance, **kwargs):
+    # 和数据写入在同一个事务中，回滚时索引一起回滚
+    if sender is Question:
+        index_documents('question', [(instance.pk, instance.title, instance.content, instance.answer)])
+    else:
+        index_documents('node', [(instance.pk, instance.title, instance.content)])
+
+
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=KnowledgeNode)
+def search_document_deleted(sender, instance, **kwargs):
+    remove_document('question' if sender is Question else 'node', instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def similarity_saved(sender, instance, **kwargs):
+    # 签名和桶随题目删除级联删除；内容未变化时不改写
+    index_questions([(instance.pk, instance.content)])
+
+
+@receiver(post_save, sender=PracticeHistory)
+def practice_saved(sender, instance, created, **kwargs):
+    if created:
+        record_practice(instance.user_id, instance.question_id, instance.is_correct, instance.time_spent,
+                        instance.created_at)
+        record_progress(instance.user_id, instance.is_correct, instance.time_spent, instance.created_at)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(m2m_changed, sender=Question.knowledge_nodes.through)
+def question_bank_changed(sender, action=None, **kwargs):
+    # m2m_changed 的 pre_* 阶段数据还没有写入
+    if action is None or action.startswith('post_'):
+        transaction.on_commit(bump_question_bank_version)
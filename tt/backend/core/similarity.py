@@ -0,0 +1,204 @@
+"""相似题目索引（MinHash + LSH）
+
+题目内容先规范化：全角转半角、小写、去掉空白、标点和不影响含义的 LaTeX 写法差异，
+再切成重叠的字符 n-gram，中文和数学符号都不需要分词。
+每个 n-gram 集合计算 MinHash 签名，两个签名相同位置相等的比例即 Jaccard 相似度的估计。
+
+签名分成 BANDS 段，每段哈希成一个桶号写入 QuestionBucket；查询时只读取与待查内容
+至少有一个桶相同的题目作为候选，再比较签名排序。每个桶最多读取 MAX_BUCKET_SIZE 道题，
+查询的代价与题库大小无关。题目保存时在同一个事务中更新签名和桶。
+
+修改 SHINGLE_SIZE、NUM_PERM、BANDS、SEED 后需要执行 python manage.py rebuild_similarity_index。
+"""
+import functools
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .graph_import import insert_rows
+from .models import Question, QuestionBucket, QuestionSignature
+
+PRIME = (1 << 31) - 1
+
+# 句读和引号不区分题目；括号、运算符等数学符号保留
+PUNCT_RE = re.compile(r'[\s,.;:!?\'"`$。、，；：！？“”‘’《》]+')
+# OCR 和手工录入的 LaTeX 常见的等价写法
+LATEX_RE = re.compile(r'\\(?:left|right|displaystyle)(?![a-z])|\\[,;!: ]')
+LATEX_ALIASES = {r'\dfrac': r'\frac', r'\tfrac': r'\frac', r'\le': r'\leq', r'\ge': r'\geq'}
+ALIAS_RE = re.compile('|'.join(re.escape(alias) + '(?![a-z])' for alias in LATEX_ALIASES))
+SCRIPT_RE = re.compile(r'([_^]){(\w)}')  # x^{2} -> x^2
+
+
+def get_options():
+    options = {
+        'SHINGLE_SIZE': 3,  # 字符 n-gram 的长度
+        'NUM_PERM': 64,  # 签名长度
+        'BANDS': 16,  # 签名分段数，相似度约 (1/BANDS) ** (BANDS/NUM_PERM) 以上的题目大概率成为候选
+        'SEED': 1,
+        'MAX_BUCKET_SIZE': 200,  # 每个桶最多读取的题目数，很多题目内容雷同时限制候选数量
+        'MAX_CANDIDATES': 500,  # 只比较相同桶最多的前 N 个候选的签名
+        'THRESHOLD': 0.5,  # 相似题目的最低相似度
+        'DUPLICATE_THRESHOLD': 0.9,  # 新建题目时超过这个相似度视为重复
+        'MAX_LIMIT': 50,
+    }
+    options.update(getattr(settings, 'SIMILARITY', {}))
+    return options
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = LATEX_RE.sub('', text)
+    text = ALIAS_RE.sub(lambda match: LATEX_ALIASES[match.group()], text)
+    text = SCRIPT_RE.sub(r'\1\2', text)
+    return PUNCT_RE.sub('', text)
+
+
+def shingles(text, size):
+    """规范化后的字符 n-gram 集合，内容比 n-gram 短时整段作为一个"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+@functools.lru_cache(maxsize=4)
+def _permutations(num_perm, seed):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(1, PRIME, num_perm, dtype=np.uint64)[:, None],
+            rng.integers(0, PRIME, num_perm, dtype=np.uint64)[:, None])
+
+
+def signature(text, options=None):
+    """uint32 签名数组，内容为空时返回 None"""
+    options = options or get_options()
+    grams = shingles(text, options['SHINGLE_SIZE'])
+    if not grams:
+        return None
+    # crc32 在各进程中稳定，不受 PYTHONHASHSEED 影响
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+    a, b = _permutations(options['NUM_PERM'], options['SEED'])
+    # a < 2^31，hashes < 2^32，乘积不会溢出 uint64
+    return ((a * hashes + b) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def buckets(sig, options=None):
+    """每段签名哈希成一个有符号 64 位桶号，段号参与哈希，不同段的桶不会混在一起"""
+    options = options or get_options()
+    bands = np.array_split(sig, options['BANDS'])
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest(), 'big', signed=True)
+        for band, rows in enumerate(bands)
+    ]
+
+
+def index_questions(rows):
+    """写入或替换题目的签名和桶，rows 为 (题目ID, 内容) 的序列；内容未变化的题目跳过"""
+    options = get_options()
+    computed = {question_id: signature(content, options) for question_id, content in rows}
+    if not computed:
+        return
+    existing = dict(QuestionSignature.objects.filter(question_id__in=computed).values_list('question_id', 'signature'))
+    changed = {
+        question_id: sig for question_id, sig in computed.items()
+        if sig is None or question_id not in existing or bytes(existing[question_id]) != sig.tobytes()
+    }
+    if not changed:
+        return
+    with transaction.atomic():
+        QuestionSignature.objects.filter(question_id__in=changed).delete()
+        QuestionBucket.objects.filter(question_id__in=changed).delete()
+        _insert(changed, options)
+
+
+def _insert(signatures, options):
+    signatures = {question_id: sig for question_id, sig in signatures.items() if sig is not None}
+    insert_rows(QuestionSignature, ('question', 'signature'),
+                [(question_id, sig.tobytes()) for question_id, sig in signatures.items()])
+    insert_rows(QuestionBucket, ('question', 'bucket'),
+                [(question_id, bucket) for question_id, sig in signatures.items() for bucket in buckets(sig, options)])
+
+
+def rebuild(chunk_size=2000):
+    """重建整个索引，返回写入签名的题目数"""
+    options = get_options()
+    count = 0
+    with transaction.atomic():
+        QuestionBucket.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+        chunk = {}
+        for question_id, content in Question.objects.values_list('id', 'content').iterator(chunk_size=chunk_size):
+            sig = signature(content, options)
+            if sig is not None:
+                chunk[question_id] = sig
+            if len(chunk) >= chunk_size:
+                _insert(chunk, options)
+                count += len(chunk)
+                chunk = {}
+        _insert(chunk, options)
+        count += len(chunk)
+    return count
+
+
+def _candidates(bucket_ids, exclude, options):
+    """与签名有相同桶的题目ID，按相同桶的个数从多到少取前 MAX_CANDIDATES 个"""
+    # 每个桶单独查询并限制行数（多数数据库不支持在 UNION 的子查询中使用 LIMIT），都是索引范围扫描
+    counts = Counter()
+    for bucket in bucket_ids:
+        counts.update(QuestionBucket.objects.filter(bucket=bucket).order_by('-question_id')
+                      .values_list('question_id', flat=True)[:options['MAX_BUCKET_SIZE']])
+    counts.pop(exclude, None)
+    return [question_id for question_id, _ in counts.most_common(options['MAX_CANDIDATES'])]
+
+
+def similar_to(text, limit=10, threshold=None, exclude=None):
+    """内容与 text 相似的题目，返回按相似度从高到低的 [(题目ID, 相似度)]；exclude 为要排除的题目ID"""
+    options = get_options()
+    threshold = options['THRESHOLD'] if threshold is None else threshold
+    sig = signature(text, options)
+    if sig is None:
+        return []
+    candidates = _candidates(buckets(sig, options), exclude, options)
+    if not candidates:
+        return []
+
+    rows = QuestionSignature.objects.filter(question_id__in=candidates).values_list('question_id', 'signature')
+    ids, signatures = [], []
+    for question_id, stored in rows:
+        ids.append(question_id)
+        signatures.append(np.frombuffer(stored, dtype=np.uint32))
+    if not ids:
+        return []
+    scores = (np.vstack(signatures) == sig).mean(axis=1)
+    ranked = sorted(
+        ((question_id, round(float(score), 4)) for question_id, score in zip(ids, scores) if score >= threshold),
+        key=lambda item: (-item[1], item[0])
+    )
+    return ranked[:limit]
+
+
+def find_duplicates(text, exclude=None):
+    """与 text 近似重复的题目 [(题目ID, 相似度)]
+
+    签名估计的误差约为 ±0.05，候选先按放宽的阈值取出，再用 n-gram 集合计算精确的 Jaccard 相似度。
+    """
+    options = get_options()
+    threshold = options['DUPLICATE_THRESHOLD']
+    candidates = similar_to(text, options['MAX_LIMIT'], threshold - 0.1, exclude)
+    if not candidates:
+        return []
+    grams = shingles(text, options['SHINGLE_SIZE'])
+    contents = dict(Question.objects.filter(id__in=[question_id for question_id, _ in candidates])
+                    .values_list('id', 'content'))
+    duplicates = []
+    for question_id, _ in candidates:
+        other = shingles(contents.get(question_id), options['SHINGLE_SIZE'])
+        score = len(grams & other) / len(grams | other) if other else 0.0
+        if score >= threshold:
+            duplicates.append((question_id, round(score, 4)))
+    return sorted(duplicates, key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,320 @@
+"""流式解题：把 Deepseek 的输出以 Server-Sent Events 推送给客户端
+
+模型返回的JSON边生成边解析，每道小题的解题思路和答案一旦完整就立即推送，
+不必等整个回答生成完毕。最后一个 result 事件携带完整的结构化结果。
+"""
+import json
+import logging
+
+from .cache import solve_cache
+from .deepseek import get_client
+from .ocr import (
+    DEEPSEEK_API_KEY, DEEPSEEK_API_URL, build_payload, build_prompt, clean_ocr_text,
+    format_result, local_result, merge_pending, pending_text, solve_cache_key,
+)
+from .local_solver import solve_locally
+from .metrics import TIMEOUT_ERRORS, span
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = ' \t\r\n'
+LITERALS = {'true': True, 'false': False, 'null': None}
+
+
+class IncrementalJSONParser:
+    """增量JSON解析器
+
+    每解析完一个值（包括嵌套的对象和数组）就回调 on_value(path, value)，
+    path 为从根到该值的键/下标元组。第一个 { 或 [ 之前的内容
+    （例如 Markdown 代码块标记）以及根值结束后的内容都会被忽略。
+    """
+
+    def __init__(self, on_value=None):
+        self.on_value = on_value or (lambda path, value: None)
+        self.root = None
+        self.done = False
+        self._stack = []  # [容器, 当前键或下标]
+        self._state = 'start'
+        self._buffer = []
+        self._string_is_key = False
+        self._escape = False
+        self._unicode = None
+        self._high_surrogate = None  # 等待与下一个 \uXXXX 组成代理对的高位代理
+
+    def feed(self, chunk):
+        for char in chunk:
+            if self.done:
+                return
+            self._feed_char(char)
+
+    def _feed_char(self, char):
+        state = self._state
+        if state == 'string':
+            self._feed_string(char)
+        elif state == 'scalar':
+            if char in ',}]' or char in WHITESPACE:
+                self._finish_scalar()
+                self._feed_char(char)
+            else:
+                self._buffer.append(char)
+        elif state == 'start':
+            if char in '{[':
+                self._open({} if char == '{' else [])
+        elif char in WHITESPACE:
+            return
+        elif state == 'key':
+            if char == '"':
+                self._start_string(is_key=True)
+            elif char == '}':
+                self._close()
+            else:
+                raise ValueError(f'期望对象键，得到 {char!r}')
+        elif state == 'colon':
+            if char != ':':
+                raise ValueError(f'期望冒号，得到 {char!r}')
+            self._state = 'value'
+        elif state in ('value', 'first_item'):
+            if char == ']' and state == 'first_item':
+                self._close()
+            elif char == '"':
+                self._start_string(is_key=False)
+            elif char in '{[':
+                self._open({} if char == '{' else [])
+            else:
+                self._buffer = [char]
+                self._state = 'scalar'
+        elif state == 'after':
+            container = self._stack[-1][0]
+            if char == ',':
+                self._state = 'key' if isinstance(container, dict) else 'value'
+            elif char in '}]':
+                self._close()
+            else:
+                raise ValueError(f'期望逗号或结束符，得到 {char!r}')
+
+    def _start_string(self, is_key):
+        self._buffer = []
+        self._string_is_key = is_key
+        self._state = 'string'
+
+    def _feed_string(self, char):
+        if self._unicode is not None:
+            self._unicode += char
+            if len(self._unicode) == 4:
+                self._feed_code_point(int(self._unicode, 16))
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if char == 'u':
+                self._unicode = ''
+            else:
+                self._append({'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}.get(char, char))
+        elif char == '\\':
+            self._escape = True
+        elif char == '"':
+            self._append('')
+            value = ''.join(self._buffer)
+            if self._string_is_key:
+                self._stack[-1][1] = value
+                self._state = 'colon'
+            else:
+                self._complete(value)
+        else:
+            self._append(char)
+
+    def _feed_code_point(self, code):
+        """\\uXXXX 转义：UTF-16 代理对的两半合成一个字符，不成对的代理替换为 U+FFFD，
+        否则之后编码为 UTF-8 时会出错"""
+        if 0xD800 <= code <= 0xDBFF:
+            self._append('')
+            self._high_surrogate = code
+        elif 0xDC00 <= code <= 0xDFFF:
+            if self._high_surrogate is None:
+                self._append('\ufffd')
+            else:
+                high, self._high_surrogate = self._high_surrogate, None
+                self._buffer.append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+        else:
+            self._append(chr(code))
+
+    def _append(self, char):
+        if self._high_surrogate is not None:
+            self._high_surrogate = None
+            self._buffer.append('\ufffd')
+        if char:
+            self._buffer.append(char)
+
+    def _finish_scalar(self):
+        token = ''.join(self._buffer)
+        if token in LITERALS:
+            value = LITERALS[token]
+        else:
+            value = json.loads(token)
+        self._complete(value)
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def _attach(self, value):
+        frame = self._stack[-1]
+        container = frame[0]
+        if isinstance(container, dict):
+            container[frame[1]] = value
+        else:
+            frame[1] = len(container)
+            container.append(value)
+
+    def _open(self, container):
+        if self._stack:
+            self._attach(container)
+        else:
+            self.root = container
+        self._stack.append([container, None])
+        self._state = 'key' if isinstance(container, dict) else 'first_item'
+
+    def _close(self):
+        container = self._stack.pop()[0]
+        self._emit(container)
+
+    def _complete(self, value):
+        if not self._stack:
+            self.root = value
+        else:
+            self._attach(value)
+        self._emit(value)
+
+    def _emit(self, value):
+        self.on_value(self._path(), value)
+        if self._stack:
+            self._state = 'after'
+        else:
+            self.done = True
+
+
+def sse_event(event, data):
+    """编码一条 Server-Sent Event"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+def _solution_events(path, value):
+    """把解析出的值映射为推送给客户端的事件"""
+    if path == ('question', 'main'):
+        return [('question', {'question': value})]
+    if len(path) == 3 and path[:2] == ('question', 'sub_questions'):
+        return [('sub_question', value)]
+    if len(path) == 2 and path[0] in ('analysis', 'answer'):
+        return [(path[0], {'id': path[1], path[0]: value})]
+    return []
+
+
+def _pending_events(pending):
+    """只解答剩余小题时的事件映射：题目和小题已随本地答案推送，
+    模型按 (1)、(2)… 编号的解答对应回原题的小题编号"""
+    ids = {str(index): sub['id'] for index, sub in enumerate(pending, 1)}
+
+    def to_events(path, value):
+        if len(path) == 2 and path[0] in ('analysis', 'answer') and path[1] in ids:
+            return [(path[0], {'id': ids[path[1]], path[0]: value})]
+        return []
+    return to_events
+
+
+def _replay_parts(result):
+    yield sse_event('question', {'question': result['question']})
+    for sub_question in result['sub_questions']:
+        yield sse_event('sub_question', sub_question)
+    for field in ('analysis', 'answer'):
+        for key, value in result[field].items():
+            yield sse_event(field, {'id': key, field: value})
+
+
+def _replay(result):
+    """把已有的完整结果按事件顺序推送"""
+    yield from _replay_parts(result)
+    yield sse_event('result', result)
+
+
+def stream_solution(text):
+    """流式解题，逐条生成 SSE 文本
+
+    全部小题都能在本地求解时不调用模型；只有部分能在本地求解时先推送本地答案，
+    模型只流式解答剩余小题，合并方式和缓存结果与 ocr.solve_pending 相同。
+    """
+    cleaned_text = clean_ocr_text(text)
+    cache_key = solve_cache_key(cleaned_text)
+
+    cached = solve_cache.get(cache_key)
+    if cached is not None:
+        yield from _replay(cached)
+        return
+
+    local = solve_locally(cleaned_text)
+    partial = local is not None and len(local['pending']) < len(local['sub_questions'])
+    if partial and not local['pending']:
+        result = local_result(local)
+        solve_cache.set(cache_key, result)
+        yield from _replay(result)
+        return
+
+    if partial:
+        yield from _replay_parts(local_result(local))
+        prompt = build_prompt(pending_text(local))
+        to_events = _pending_events(local['pending'])
+    else:
+        prompt = build_prompt(cleaned_text)
+        to_events = _solution_events
+
+    events = []
+    parser = IncrementalJSONParser(lambda path, value: events.extend(to_events(path, value)))
+    content = []
+    with span('llm_stream') as stream_span:
+        try:
+            lines = get_client(DEEPSEEK_API_URL, DEEPSEEK_API_KEY).stream_lines(
+                build_payload(prompt, stream=True)
+            )
+            for line in lines:
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                if not delta:
+                    continue
+                content.append(delta)
+                yield sse_event('token', {'content': delta})
+
+                parser.feed(delta)
+                for event, payload in events:
+                    yield sse_event(event, payload)
+                events.clear()
+
+            if not parser.done:
+                raise ValueError('AI响应不完整')
+            result = format_result(parser.root)
+            if partial:
+                result = merge_pending(local, result)
+            else:
+                result['solved_by'] = {str(sub['id']): 'llm' for sub in result['sub_questions']}
+        except (KeyError, TypeError, ValueError) as e:
+            stream_span.fail()
+            logger.warning("解析API流式响应时出错: %s", e)
+            yield sse_event('error', {
+                "question": cleaned_text,
+                "analysis": "抱歉，解析AI响应时出错，请稍后重试。",
+                "answer": "无法生成答案"
+            })
+            return
+        except Exception as e:
+            stream_span.fail('timeout' if isinstance(e, TIMEOUT_ERRORS) else 'error')
+            logger.error("调用Deepseek API时出错: %s", e)
+            yield sse_event('error', {
+                "question": cleaned_text,
+                "analysis": f"API调用出错: {str(e)}",
+                "answer": "请稍后重试"
+            })
+            return
+
+    solve_cache.set(cache_key, result)
+    yield sse_event('result', result)
@@ -1,3 +1,1072 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .batch import BatchError, split_pages
+from .cache import ResultCache
+from .deepseek import CircuitOpenError, ConcurrencyLimitError, DeepseekClient, get_client
+from .deepseek_stub import start_stub_server
+from . import graph_index, learning_path, ocr, recommendations, streaming
+from .centrality import update_metrics
+from .graph_index import get_index, neighborhood, structure_version
+from .jobs import run_ocr_job, sweep_jobs
+from .layout import relayout
+from .learning_path import PrerequisiteGraph, shortest_path, study_path
+from .knowledge_map import get_delta, get_map_version, prune_changes
+from .local_solver import LocalSolveError, format_number, solve_expression, solve_locally, split_sub_questions
+from .models import (
+    KnowledgeChange, KnowledgeLink, KnowledgeNode, OCRJob, PracticeHistory, Question, QuestionAttempt,
+    QuestionBucket, UserProgress,
+)
+from .ocr_engine import PoolReset, TesseractPoolEngine
+from .preprocess import get_options as get_preprocess_options, target_width
+from .progress import reconcile_progress
+from .recommendations import _replay_attempts, recommend
+from .review import answer_quality, get_options as get_review_options, schedule
+from .streaming import IncrementalJSONParser, sse_event
+from .similarity import find_duplicates, similar_to
+
+User = get_user_model()
+
+# 测试使用进程内缓存，不清空、不读取 django_cache 中开发服务器的缓存
+test_caches = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+class SparseFieldsetTests(TestCase):
+    """列表接口的精简表示、?fields=/?expand= 和查询次数"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+        cls.nodes = [
+            KnowledgeNode.objects.create(title=f'知识点{i}', content='很长的内容' * 100, category='代数')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_questions(self, count):
+        for i in range(count):
+            question = Question.objects.create(title=f'题目{i}', content='题干' * 100, answer='答案', difficulty=1)
+            question.knowledge_nodes.set(self.nodes)
+            PracticeHistory.objects.create(user=self.user, question=question, user_answer='答案',
+                                           is_correct=i % 2 == 0, time_spent=30)
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return len(queries), data['results'] if 'results' in data else data
+
+    def assertConstantQueries(self, url, params=None):
+        self.create_questions(2)
+        small, data = self.get(url, params)
+        self.assertEqual(len(data), 2)
+        self.create_questions(20)
+        large, data = self.get(url, params)
+        self.assertEqual(len(data), 22)
+        self.assertEqual(small, large)
+        return data
+
+    def test_question_list_is_slim(self):
+        data = self.assertConstantQueries('/api/questions/')
+        self.assertEqual(set(data[0]), {'id', 'title', 'difficulty', 'knowledge_nodes', 'created_at'})
+        self.assertEqual(set(data[0]['knowledge_nodes'][0]), {'id', 'title', 'category', 'difficulty'})
+
+    def test_question_list_expand(self):
+        data = self.assertConstantQueries('/api/questions/', {'expand': 'knowledge_nodes'})
+        self.assertIn('content', data[0]['knowledge_nodes'][0])
+
+    def test_question_list_fields(self):
+        data = self.assertConstantQueries('/api/questions/', {'fields': 'id,title,content'})
+        self.assertEqual(set(data[0]), {'id', 'title', 'content'})
+
+    def test_question_detail_is_rich(self):
+        self.create_questions(1)
+        question = Question.objects.get()
+        _, data = self.get(f'/api/questions/{question.id}/')
+        self.assertIn('content', data)
+        self.assertIn('answer', data)
+        self.assertIn('content', data['knowledge_nodes'][0])
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/questions/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/questions/', {'expand': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_practice_history_list_is_slim(self):
+        data = self.assertConstantQueries('/api/practice-history/')
+        self.assertEqual(set(data[0]['question']), {'id', 'title', 'difficulty'})
+
+    def test_practice_history_expand(self):
+        data = self.assertConstantQueries('/api/practice-history/', {'expand': 'question'})
+        self.assertIn('content', data[0]['question'])
+        self.assertIn('content', data[0]['question']['knowledge_nodes'][0])
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+        # 同一时间创建的节点按ID区分先后
+        now = timezone.now()
+        nodes = KnowledgeNode.objects.bulk_create(
+            [KnowledgeNode(title=f'知识点{i}', content='', category='代数') for i in range(25)]
+        )
+        KnowledgeNode.objects.filter(id__in=[node.id for node in nodes[5:15]]).update(created_at=now)
+        cls.expected = list(KnowledgeNode.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walk_all_pages(self):
+        seen = []
+        url = '/api/knowledge-nodes/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), 4)
+            seen.extend(node['id'] for node in data['results'])
+            url = data['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_page_size_is_capped(self):
+        with self.settings(CURSOR_PAGINATION={'PAGE_SIZE': 10, 'MAX_PAGE_SIZE': 20}):
+            self.assertEqual(len(self.client.get('/api/knowledge-nodes/').json()['results']), 10)
+            self.assertEqual(len(self.client.get('/api/knowledge-nodes/?page_size=100').json()['results']), 20)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/knowledge-nodes/?cursor=abc').status_code, 404)
+
+
+class QuestionFilterTests(TestCase):
+    """题目列表的筛选条件和分面统计"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+        algebra = KnowledgeNode.objects.create(title='方程', content='', category='代数')
+        function = KnowledgeNode.objects.create(title='函数', content='', category='代数')
+        geometry = KnowledgeNode.objects.create(title='三角形', content='', category='几何')
+        cls.nodes = [algebra, function, geometry]
+        cls.questions = []
+        for i, (difficulty, nodes) in enumerate([
+            (1, [algebra]), (1, [algebra, function]), (2, [function]), (2, [geometry]), (3, [algebra, geometry]),
+        ]):
+            question = Question.objects.create(title=f'题目{i}', content='', answer='', difficulty=difficulty)
+            question.knowledge_nodes.set(nodes)
+            cls.questions.append(question)
+        Question.objects.filter(id=cls.questions[0].id).update(created_at=timezone.now() - timedelta(days=30))
+
+    def setUp(self):
+        # 缓存在测试之间保留，清掉其他测试缓存的分面统计
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, params):
+        response = self.client.get('/api/questions/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {question['id'] for question in response.json()['results']}
+
+    def expected(self, *indexes):
+        return {self.questions[i].id for i in indexes}
+
+    def test_filters(self):
+        algebra, function, geometry = self.nodes
+        self.assertEqual(self.ids({'difficulty': '1,3'}), self.expected(0, 1, 4))
+        self.assertEqual(self.ids({'node': f'{algebra.id},{function.id}'}), self.expected(0, 1, 2, 4))
+        self.assertEqual(self.ids({'category': '代数', 'difficulty': '2'}), self.expected(2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.ids({'created_after': since, 'node': algebra.id}), self.expected(1, 4))
+        self.assertEqual(self.ids({'created_before': since}), self.expected(0))
+
+    def test_hot_filter_uses_same_results(self):
+        algebra, function, geometry = self.nodes
+        params = {'node': f'{algebra.id},{geometry.id}'}
+        expected = self.ids(params)
+        with self.settings(QUESTION_BANK={'HOT_FILTER_ROWS': 1}):
+            self.assertEqual(self.ids(params), expected)
+            self.assertEqual(self.ids({'category': '代数'}), self.expected(0, 1, 2, 4))
+
+    def test_invalid_filter(self):
+        self.assertEqual(self.client.get('/api/questions/', {'difficulty': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/questions/facets/', {'created_after': 'x'}).status_code, 400)
+
+    def test_facets(self):
+        algebra, function, geometry = self.nodes
+        response = self.client.get('/api/questions/facets/', {'category': '代数'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'total': 4,
+            'difficulty': {'1': 2, '2': 1, '3': 1},
+            # 题目1关联了两个代数节点，分类下只计一次
+            'category': {'代数': 4, '几何': 1},
+            'node': {str(algebra.id): 3, str(function.id): 2, str(geometry.id): 1},
+        })
+
+    def test_facets_follow_question_changes(self):
+        self.assertEqual(self.client.get('/api/questions/facets/').json()['total'], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(title='新题目', content='', answer='', difficulty=1)
+            question.knowledge_nodes.set(self.nodes[:1])
+        facets = self.client.get('/api/questions/facets/').json()
+        self.assertEqual(facets['total'], 6)
+        self.assertEqual(facets['node'][str(self.nodes[0].id)], 4)
+
+
+class SimilarQuestionTests(TestCase):
+    """相似题目索引、相似题目接口和新建题目时的重复检查"""
+
+    CONTENT = '已知函数 $f(x)=x^2-2ax+3$ 在区间 $[1,+\\infty)$ 上单调递增，求实数 $a$ 的取值范围。'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+        cls.original = Question.objects.create(title='单调性', content=cls.CONTENT, answer='a≤1', difficulty=2)
+        cls.variant = Question.objects.create(
+            title='单调性（变式）', difficulty=2, answer='a≤2',
+            content='已知函数 $f(x)=x^2-2ax+3$ 在区间 $[2,+\\infty)$ 上单调递增，求实数 $a$ 的取值范围。',
+        )
+        cls.other = Question.objects.create(title='三角形', content='在三角形ABC中，角A、B、C所对的边分别为a、b、c，求角C。',
+                                            answer='60°', difficulty=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_normalized_content_is_duplicate(self):
+        # 全角标点、空白和 LaTeX 写法的差异不影响判断
+        content = '已知函数$f(x)=x^{2}-2ax+3$在区间$\\left[1,+\\infty\\right)$上单调递增,求实数$a$的取值范围.'
+        self.assertEqual(find_duplicates(content)[0][0], self.original.id)
+        self.assertEqual(find_duplicates(self.other.content, exclude=self.other.id), [])
+
+    def test_similar_endpoint(self):
+        response = self.client.get(f'/api/questions/{self.original.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([question['id'] for question in data], [self.variant.id])
+        self.assertEqual(set(data[0]), {'id', 'title', 'difficulty', 'knowledge_nodes', 'created_at', 'similarity'})
+        self.assertEqual(self.client.get('/api/questions/0/similar/').status_code, 404)
+
+    def test_create_rejects_duplicate(self):
+        payload = {'title': '重复', 'content': self.CONTENT, 'answer': 'a≤1', 'difficulty': 2}
+        response = self.client.post('/api/questions/', payload)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['duplicates'][0]['id'], self.original.id)
+        self.assertEqual(self.client.post('/api/questions/?allow_duplicate=1', payload).status_code, 201)
+
+    def test_check_duplicate(self):
+        response = self.client.post('/api/questions/check_duplicate/', {'content': self.CONTENT})
+        self.assertTrue(response.json()['duplicate'])
+        response = self.client.post('/api/questions/check_duplicate/', {'content': '完全不同的一道题'})
+        self.assertEqual(response.json(), {'duplicate': False, 'duplicates': []})
+        self.assertEqual(self.client.post('/api/questions/check_duplicate/', {}).status_code, 400)
+
+    def test_index_follows_edits(self):
+        self.other.content = self.CONTENT
+        self.other.save()
+        self.assertIn(self.other.id, [question_id for question_id, _ in find_duplicates(self.CONTENT)])
+        self.other.delete()
+        self.assertFalse(QuestionBucket.objects.filter(question_id=self.other.id).exists())
+        self.assertEqual(len(similar_to(self.CONTENT)), 2)
+
+
+class UserProgressTests(TestCase):
+    """提交练习时累加学习进度，以及从练习历史核对进度"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+        cls.question = Question.objects.create(title='题目', content='题干', answer='答案', difficulty=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def practice(self, is_correct, time_spent):
+        response = self.client.post('/api/practice-history/', {
+            'question_id': self.question.id, 'user_answer': '答案', 'is_correct': is_correct, 'time_spent': time_spent,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def assertProgress(self, total, correct, time_spent):
+        progress = UserProgress.objects.get(user=self.user)
+        self.assertEqual((progress.total_practices, progress.correct_practices, progress.total_time_spent),
+                         (total, correct, time_spent))
+        return progress
+
+    def test_practice_history_is_append_only(self):
+        self.practice(True, 30)
+        record = PracticeHistory.objects.get(user=self.user)
+        url = f'/api/practice-history/{record.id}/'
+        self.assertEqual(self.client.patch(url, {'is_correct': False}).status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertProgress(1, 1, 30)
+
+    def test_practice_updates_progress(self):
+        self.practice(True, 30)
+        self.practice(False, 45)
+        progress = self.assertProgress(2, 1, 75)
+        self.assertEqual(progress.last_practice_at, PracticeHistory.objects.latest('created_at').created_at)
+        data = self.client.get('/api/user-progress/me/').json()
+        self.assertEqual(data['mastery_level'], 50)
+
+    def test_reconcile(self):
+        self.practice(True, 30)
+        self.practice(True, 20)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        UserProgress.objects.filter(user=self.user).update(total_practices=99, correct_practices=0)
+        UserProgress.objects.create(user=other, total_practices=3, correct_practices=3, total_time_spent=60)
+
+        self.assertEqual(reconcile_progress(), (2, 2))
+        self.assertProgress(2, 2, 50)
+        self.assertEqual(UserProgress.objects.get(user=other).total_practices, 0)
+        # 已经一致时不再改写
+        self.assertEqual(reconcile_progress(), (2, 0))
+
+
+class LocalSolverTests(SimpleTestCase):
+    """本地算式求解：决定用户看到的答案，结果必须精确，无法确定时交给大模型"""
+
+    def solve(self, text):
+        return format_number(solve_expression(text)[1])
+
+    def test_arithmetic(self):
+        self.assertEqual(self.solve('3.6+4.7+6.4='), '14.7')
+        self.assertEqual(self.solve('0.1+0.2=□'), '0.3')
+        self.assertEqual(self.solve('50%×8=□'), '4')
+        self.assertEqual(self.solve('2(3+4)=( )'), '14')
+        self.assertEqual(self.solve('1÷3=□'), '1/3')
+        self.assertEqual(self.solve('(1/2)^-3=□'), '8')
+        self.assertEqual(self.solve('３x４＝?'), '12')
+
+    def test_blank_in_equation(self):
+        self.assertEqual(self.solve('□-2.5=7.5'), '10')
+        self.assertEqual(self.solve('□×4=10'), '2.5')
+        self.assertEqual(self.solve('(　)÷4=2.5'.replace('　', ' ')), '10')
+
+    def test_rejected(self):
+        for text in ['□×□=4', '□^2=4', '1+1', '3=□=3', '学生有3个=□', '□/0=1', '0/□=1',
+                     '__import__("os")=□', '2^0.5=□', '2^11=□',
+                     # 空格在除数中不是一次方程，交给大模型
+                     '12÷□=4',
+                     # 空格紧挨数字：填运算符号或填数字，不是乘法
+                     '3□5=8', '4□×3=132', '□5=10', '(1+2)□=6']:
+            with self.subTest(text=text), self.assertRaises(LocalSolveError):
+                solve_expression(text)
+
+    def test_zero_to_negative_power(self):
+        for text in ['□^-1=2', '0^-1=□']:
+            with self.subTest(text=text), self.assertRaises(LocalSolveError):
+                solve_expression(text)
+
+    def test_huge_power_is_rejected_quickly(self):
+        with self.assertRaises(LocalSolveError):
+            solve_expression('((((((9^10)^10)^10)^10)^10)^10)=□')
+        self.assertEqual(self.solve('(2^10)^10=□'), str(2 ** 100))
+
+    def test_split_sub_questions(self):
+        self.assertEqual(
+            split_sub_questions('计算下面各题\n(1) 3+4=\n(2) 5×6=   ③ 1/4+1/4='),
+            ('计算下面各题', [('1', '3+4='), ('2', '5×6='), ('3', '1/4+1/4=')]),
+        )
+        self.assertIsNone(split_sub_questions('hello world'))
+        self.assertIsNone(split_sub_questions('计算\n1+1=\n然后呢'))
+
+    def test_solve_locally_leaves_unsolved_items_pending(self):
+        solution = solve_locally('计算\n1. 2^3=\n2. 小明有几个苹果=\n3. 0^-1=')
+        self.assertEqual(solution['answer'], {'1': '8'})
+        self.assertEqual([item['id'] for item in solution['pending']], ['2', '3'])
+        self.assertEqual(len(solution['sub_questions']), 3)
+
+
+    def test_fill_in_operator_or_digit_goes_to_llm(self):
+        for text in ['3□5=8\n4□×3=132', '在□里填上运算符号\n(1) 3□5=8\n(2) 6□2=3',
+                     '在□里填上合适的数字\n□+5=8', '在○里填上>或<\n□+1=2']:
+            with self.subTest(text=text):
+                solution = solve_locally(text)
+                self.assertEqual(solution['answer'], {})
+                self.assertEqual(len(solution['pending']), len(solution['sub_questions']))
+        self.assertEqual(solve_locally('在□里填上合适的数\n□+5=8')['answer'], {'1': '3'})
+
+
+class IncrementalJSONParserTests(SimpleTestCase):
+    """流式解题使用的增量 JSON 解析器"""
+
+    DOCUMENT = {
+        'question': {'main': '计算😀', 'sub_questions': [{'id': 1, 'content': '𝑥²+1="2"\\ 3'}]},
+        'analysis': {'1': '第一步\n第二步\t完成'},
+        'answer': {'1': -1.5e3},
+        'flags': [True, False, None, []],
+    }
+
+    def parse(self, text, chunk_sizes=None):
+        values = []
+        parser = IncrementalJSONParser(lambda path, value: values.append(path))
+        position = 0
+        while position < len(text):
+            size = next(chunk_sizes) if chunk_sizes else len(text)
+            parser.feed(text[position:position + size])
+            position += size
+        self.assertTrue(parser.done)
+        return parser.root, values
+
+    def test_random_chunk_boundaries(self):
+        for ensure_ascii in (True, False):
+            text = '```json\n' + json.dumps(self.DOCUMENT, ensure_ascii=ensure_ascii) + '\n```'
+            for seed in range(50):
+                rng = random.Random(seed)
+                with self.subTest(ensure_ascii=ensure_ascii, seed=seed):
+                    root, _ = self.parse(text, iter(lambda: rng.randint(1, 6), None))
+                    self.assertEqual(root, self.DOCUMENT)
+
+    def test_values_are_reported_when_complete(self):
+        _, paths = self.parse('{"analysis": {"1": "a", "2": "b"}, "answer": ["x"]}')
+        self.assertEqual(paths, [('analysis', '1'), ('analysis', '2'), ('analysis',), ('answer', 0), ('answer',), ()])
+
+    def test_surrogate_pair_split_across_chunks(self):
+        text = '{"main": "\\ud83d\\ude00"}'
+        for split in range(1, len(text)):
+            with self.subTest(split=split):
+                root, _ = self.parse(text, iter([split, len(text)]))
+                self.assertEqual(root, {'main': '😀'})
+
+    def test_lone_surrogates_are_replaced(self):
+        root, _ = self.parse('["\\ud83d", "\\ude00x", "\\ud83d\\ud83d\\ude00", "\\ud83d\\n"]')
+        self.assertEqual(root, ['\ufffd', '\ufffdx', '\ufffd😀', '\ufffd\n'])
+        sse_event('answer', root).encode('utf-8')
+
+
+class SplitPagesTests(SimpleTestCase):
+    """多页文件在渲染前检查页数"""
+
+    def tiff(self, frames):
+        output = io.BytesIO()
+        images = [Image.new('RGB', (8, 8), (i, i, i)) for i in range(frames)]
+        images[0].save(output, format='TIFF', save_all=True, append_images=images[1:])
+        return output.getvalue()
+
+    def test_frames_within_limit(self):
+        pages = split_pages('scan.tif', self.tiff(3), {'MAX_PAGES': 3, 'PDF_DPI': 200})
+        self.assertEqual([source for source, _, _ in pages], ['scan.tif#1', 'scan.tif#2', 'scan.tif#3'])
+
+    def test_too_many_frames(self):
+        with self.assertRaises(BatchError):
+            split_pages('scan.tif', self.tiff(4), {'MAX_PAGES': 3, 'PDF_DPI': 200})
+
+    def test_remaining_limit(self):
+        with self.assertRaises(BatchError):
+            split_pages('scan.tif', self.tiff(2), {'MAX_PAGES': 3, 'PDF_DPI': 200}, limit=1)
+
+
+class TesseractPoolResetTests(SimpleTestCase):
+    """进程池重建时其他未完成的任务立即失败"""
+
+    class DummyPool:
+        terminated = False
+
+        def terminate(self):
+            self.terminated = True
+
+    def test_reset_fails_pending_tasks(self):
+        engine = TesseractPoolEngine()
+        pool = engine._pool = self.DummyPool()
+        pending = [Future(), Future()]
+        pending[0].set_result('已完成')
+        engine._pending.update(pending)
+        engine._reset(pool)
+        self.assertTrue(pool.terminated)
+        self.assertIsNone(engine._pool)
+        self.assertEqual(pending[0].result(), '已完成')
+        self.assertIsInstance(pending[1].exception(), PoolReset)
+
+    def test_reset_ignores_replaced_pool(self):
+        engine = TesseractPoolEngine()
+        old, engine._pool = self.DummyPool(), self.DummyPool()
+        future = Future()
+        engine._pending.add(future)
+        engine._reset(old)
+        self.assertFalse(old.terminated)
+        self.assertFalse(future.done())
+
+
+class TargetWidthTests(SimpleTestCase):
+    """按DPI计算缩小后的宽度"""
+
+    def width(self, dpi):
+        image = Image.new('L', (4000, 100))
+        if dpi:
+            image.info['dpi'] = (dpi, dpi)
+        return target_width(image, get_preprocess_options(TARGET_DPI=300, PAGE_WIDTH_INCHES=8))
+
+    def test_missing_dpi_uses_page_width(self):
+        self.assertEqual(self.width(None), 2400)
+
+    def test_jfif_default_dpi_treated_as_missing(self):
+        self.assertEqual(self.width(72), 2400)
+
+    def test_real_dpi(self):
+        self.assertEqual(self.width(600), 2000)
+        self.assertEqual(self.width(200), 4000)
+
+
+class ResultCacheTests(SimpleTestCase):
+    """共享磁盘目录的多个进程之间的缓存失效"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # 两个实例模拟两个进程
+        self.first = ResultCache('solve', directory=directory.name)
+        self.second = ResultCache('solve', directory=directory.name)
+        self.first.set('abcd', {'answer': 1})
+        self.assertEqual(self.second.get('abcd'), {'answer': 1})
+
+    def test_invalidate_in_other_process(self):
+        self.second.invalidate('abcd')
+        self.assertIsNone(self.first.get('abcd'))
+
+    def test_clear_in_other_process(self):
+        self.second.clear()
+        self.assertIsNone(self.first.get('abcd'))
+
+    def test_rewrite_in_other_process(self):
+        self.second.set('abcd', {'answer': 2})
+        self.assertEqual(self.first.get('abcd'), {'answer': 2})
+
+    def test_memory_hit(self):
+        self.assertEqual(self.first.get('abcd'), {'answer': 1})
+        self.assertEqual(self.first.hits, 1)
+
+    def test_rewrite_keeping_inode(self):
+        # inode 可能被重用，内容变化后修改时间和大小不同
+        with open(self.second._path('abcd'), 'w', encoding='utf-8') as f:
+            json.dump({'expires_at': None, 'value': {'answer': 10}}, f)
+        self.assertEqual(self.first.get('abcd'), {'answer': 10})
+
+    def test_overwrite_counts_disk_bytes_once(self):
+        for answer in range(3):
+            self.first.set('abcd', {'answer': answer})
+        self.assertEqual(self.first._disk_bytes, self.first.stats()['disk_bytes'])
+
+    def test_remove_races(self):
+        self.second.invalidate('abcd')
+        self.first.invalidate('abcd')
+        self.first.clear()
+        self.assertIsNone(self.first.get('abcd'))
+
+
+class PartialSolveTests(SimpleTestCase):
+    """部分小题在本地求解时，流式和非流式解题只把剩余小题交给模型，结果和缓存一致"""
+
+    text = '计算\n1. 2^3=\n2. 小明有几个苹果='
+
+    def setUp(self):
+        server = start_stub_server()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.solve_cache = ResultCache('solve')
+        for module in (ocr, streaming):
+            for name, value in (('DEEPSEEK_API_URL', server.url), ('solve_cache', self.solve_cache)):
+                patcher = mock.patch.object(module, name, value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+    def test_stream_merges_local_answers(self):
+        chunks = list(streaming.stream_solution(self.text))
+        events = [chunk.split('\n')[0] for chunk in chunks]
+        self.assertNotIn('event: error', events)
+        result = json.loads(chunks[-1].split('data: ', 1)[1])
+        self.assertEqual(result['solved_by'], {'1': 'local', '2': 'llm'})
+        self.assertEqual(result['answer'], {'1': '8', '2': '59×(2.5×0.4)=59'})
+        # 本地答案在模型输出之前推送，模型的解答对应回原题的小题编号
+        self.assertLess(chunks.index(sse_event('answer', {'id': '1', 'answer': '8'})), events.index('event: token'))
+        self.assertIn(sse_event('answer', {'id': '2', 'answer': '59×(2.5×0.4)=59'}), chunks)
+
+        key = ocr.solve_cache_key(ocr.clean_ocr_text(self.text))
+        self.assertEqual(self.solve_cache.get(key), result)
+        self.solve_cache.clear()
+        self.assertEqual(ocr.process_with_deepseek(self.text), result)
+        self.assertEqual(self.server.request_count, 2)
+
+
+class DeepseekClientTests(SimpleTestCase):
+    """重试、熔断和并发限制，请求发往本地模拟服务"""
+
+    payload = {'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': '1+1'}]}
+
+    def start_server(self, **options):
+        server = start_stub_server(**options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_client(self, server, **options):
+        options = {'backoff_base': 0, 'backoff_max': 0, 'timeout': 5, **options}
+        return DeepseekClient(server.url, 'test', **options)
+
+    def test_retry_then_success(self):
+        server = self.start_server(fail_first=2)
+        client = self.make_client(server, max_retries=3)
+        response = client.post(self.payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.request_count, 3)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_breaker_opens_then_half_opens(self):
+        server = self.start_server(error_rate=1.0)
+        client = self.make_client(server, max_retries=0, failure_threshold=2, reset_timeout=0.2)
+        for _ in range(2):
+            self.assertEqual(client.post(self.payload).status_code, 503)
+        self.assertEqual(client.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.post(self.payload)
+        self.assertEqual(server.request_count, 2)
+
+        server.error_rate = 0.0
+        time.sleep(0.25)
+        self.assertEqual(client.breaker.state, 'half_open')
+        self.assertEqual(client.post(self.payload).status_code, 200)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_failed_probe_reopens(self):
+        server = self.start_server(error_rate=1.0)
+        client = self.make_client(server, max_retries=0, failure_threshold=1, reset_timeout=0.2)
+        client.post(self.payload)
+        time.sleep(0.25)
+        client.post(self.payload)
+        self.assertEqual(client.breaker.state, 'open')
+
+    def test_concurrency_limit(self):
+        server = self.start_server(latency=0.1)
+        client = self.make_client(server, max_concurrency=2, pool_size=2)
+        statuses = []
+        threads = [threading.Thread(target=lambda: statuses.append(client.post(self.payload).status_code))
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, [200] * 6)
+        self.assertEqual(server.max_in_flight, 2)
+
+    def test_acquire_timeout(self):
+        server = self.start_server(latency=0.3)
+        client = self.make_client(server, max_concurrency=1, acquire_timeout=0.05)
+        thread = threading.Thread(target=client.post, args=(self.payload,))
+        thread.start()
+        time.sleep(0.1)
+        with self.assertRaises(ConcurrencyLimitError):
+            client.post(self.payload)
+        thread.join()
+        self.assertEqual(server.request_count, 1)
+
+    def test_get_client_per_url_and_key(self):
+        client = get_client('http://127.0.0.1:1/a', 'key1')
+        self.assertIs(get_client('http://127.0.0.1:1/a', 'key1'), client)
+        other = get_client('http://127.0.0.1:1/b', 'key2')
+        self.assertIsNot(other, client)
+        self.assertEqual((other.url, other.api_key), ('http://127.0.0.1:1/b', 'key2'))
+
+
+def use_temporary_index(test):
+    """索引文件写到临时目录，并清空共享缓存和进程内缓存的索引、前置关系图、题目索引"""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings_override = override_settings(KNOWLEDGE_INDEX={'DIR': directory.name})
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    cache.clear()
+    for module in (graph_index, learning_path, recommendations):
+        attribute = '_graph' if module is learning_path else '_index'
+        setattr(module, attribute, None)
+        test.addCleanup(setattr, module, attribute, None)
+
+
+class GraphIndexTests(TestCase):
+    """邻接索引按结构版本重建，查询不访问数据库"""
+
+    def setUp(self):
+        use_temporary_index(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nodes = [KnowledgeNode.objects.create(title=f'知识点{i}', content='内容', category='代数')
+                          for i in range(3)]
+            KnowledgeLink.objects.create(source=self.nodes[0], target=self.nodes[1], relation_type='前置')
+
+    def neighbors(self, index, node):
+        nodes, _ = neighborhood(index, node.id)
+        return {node_id for node_id, _ in nodes}
+
+    def test_cached_index_does_not_query(self):
+        index = get_index()
+        with self.assertNumQueries(0):
+            self.assertIs(get_index(), index)
+
+    def test_layout_and_metrics_changes_keep_index(self):
+        index = get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            KnowledgeChange.objects.create(kind='node', object_id=self.nodes[0].id, action='layout')
+            KnowledgeChange.objects.create(kind='node', object_id=self.nodes[0].id, action='metrics')
+        self.assertIs(get_index(), index)
+
+    def test_link_change_rebuilds_index(self):
+        index = get_index()
+        self.assertEqual(self.neighbors(index, self.nodes[2]), {self.nodes[2].id})
+        with self.captureOnCommitCallbacks(execute=True):
+            KnowledgeLink.objects.create(source=self.nodes[1], target=self.nodes[2], relation_type='前置')
+        updated = get_index()
+        self.assertGreater(updated.version, index.version)
+        self.assertEqual(self.neighbors(updated, self.nodes[2]), {self.nodes[1].id, self.nodes[2].id})
+
+
+def make_graph(count, prerequisites=(), links=(), difficulty=None):
+    """按位置编号构造前置关系图，节点ID为位置加100；prerequisites 为 (前置, 后续) 对，links 为无向关联"""
+    neighbors = [[] for _ in range(count)]
+    for a, b in list(prerequisites) + list(links):
+        neighbors[a].append(b)
+        neighbors[b].append(a)
+    required = [[] for _ in range(count)]
+    for before, after in prerequisites:
+        required[after].append(before)
+    node_ids = [position + 100 for position in range(count)]
+    return PrerequisiteGraph(
+        version=1, node_ids=node_ids, positions={node_id: i for i, node_id in enumerate(node_ids)},
+        difficulty=list(difficulty or [1] * count), level=[1] * count,
+        prerequisites=required, neighbors=neighbors,
+    )
+
+
+class StudyPathTests(SimpleTestCase):
+    """学习路径的拓扑顺序和循环依赖"""
+
+    def test_topological_order(self):
+        # 0 -> 1 -> 3，2 -> 3；0 和 2 都可先学，难度低的在前
+        graph = make_graph(4, [(0, 1), (1, 3), (2, 3)], difficulty=[3, 1, 2, 1])
+        path, has_cycle = study_path(graph, 103)
+        self.assertEqual(path, [102, 100, 101, 103])
+        self.assertFalse(has_cycle)
+
+    def test_mastered_nodes_skip_their_prerequisites(self):
+        graph = make_graph(4, [(0, 1), (1, 3), (2, 3)])
+        self.assertEqual(study_path(graph, 103, mastered={101}), ([102, 103], False))
+        self.assertEqual(study_path(graph, 103, mastered={103}), ([], False))
+
+    def test_cycle(self):
+        # 0 和 1 互为前置，2 依赖 0
+        graph = make_graph(4, [(0, 1), (1, 0), (0, 2), (3, 2)], difficulty=[2, 1, 1, 1])
+        path, has_cycle = study_path(graph, 102)
+        self.assertTrue(has_cycle)
+        self.assertEqual(path[0], 103)
+        self.assertEqual(path[1:], [101, 102, 100])
+
+    def test_missing_node(self):
+        self.assertIsNone(study_path(make_graph(2), 999))
+
+
+class ShortestPathTests(SimpleTestCase):
+    """双向 BFS 和按难度加权的最短路径"""
+
+    def assertValidPath(self, graph, path, source, target):
+        self.assertEqual((path[0], path[-1]), (source, target))
+        for a, b in zip(path, path[1:]):
+            self.assertIn(graph.positions[b], graph.neighbors[graph.positions[a]])
+
+    def test_path_exists(self):
+        graph = make_graph(5, links=[(0, 1), (1, 2), (2, 3), (0, 4), (4, 3)])
+        path, cost = shortest_path(graph, 100, 103)
+        self.assertEqual(path, [100, 104, 103])
+        self.assertEqual(cost, 2)
+
+    def test_no_path(self):
+        graph = make_graph(4, links=[(0, 1), (2, 3)])
+        self.assertEqual(shortest_path(graph, 100, 103), ([], None))
+        self.assertIsNone(shortest_path(graph, 100, 999))
+
+    def test_cycle_takes_shorter_side(self):
+        graph = make_graph(6, links=[(i, (i + 1) % 6) for i in range(6)])
+        self.assertEqual(shortest_path(graph, 100, 104), ([100, 105, 104], 2))
+        self.assertEqual(shortest_path(graph, 102, 102), ([102], 0))
+
+    def test_matches_bfs_on_random_graphs(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            count = rng.randint(2, 40)
+            links = [(rng.randrange(count), rng.randrange(count)) for _ in range(rng.randint(0, count * 2))]
+            graph = make_graph(count, links=links)
+            source, target = rng.randrange(count), rng.randrange(count)
+            # 单向 BFS 求出的距离作为参照
+            distance = {source: 0}
+            frontier = [source]
+            while frontier:
+                next_frontier = []
+                for position in frontier:
+                    for neighbor in graph.neighbors[position]:
+                        if neighbor not in distance:
+                            distance[neighbor] = distance[position] + 1
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+            path, cost = shortest_path(graph, source + 100, target + 100)
+            if target in distance:
+                self.assertEqual(cost, distance[target])
+                self.assertEqual(len(path), cost + 1)
+                self.assertValidPath(graph, path, source + 100, target + 100)
+            else:
+                self.assertEqual((path, cost), ([], None))
+
+    def test_weighted(self):
+        # 经过 1 的路径更短，但 1 的难度高
+        graph = make_graph(4, links=[(0, 1), (1, 3), (0, 2), (2, 3)], difficulty=[1, 5, 1, 1])
+        self.assertEqual(shortest_path(graph, 100, 103, weighted=True), ([100, 102, 103], 2))
+
+
+class ReviewScheduleTests(SimpleTestCase):
+    """SM-2 复习间隔和难度系数"""
+
+    def test_answer_quality(self):
+        options = get_review_options()
+        self.assertEqual(answer_quality(False, 10, options), 1)
+        self.assertEqual(answer_quality(True, 30, options), 5)
+        self.assertEqual(answer_quality(True, 120, options), 4)
+        self.assertEqual(answer_quality(True, None, options), 4)
+        self.assertEqual(answer_quality(True, 400, options), 3)
+
+    def test_intervals_grow(self):
+        state = (0, 0, 2.5)
+        expected = [(1, 1, 2.6), (2, 6, 2.7), (3, 6 * 2.7, 2.7), (4, 6 * 2.7 * 2.7, 2.56)]
+        for quality, (repetitions, interval, ease_factor) in zip((5, 5, 4, 3), expected):
+            state = schedule(*state, quality)
+            self.assertEqual(state[0], repetitions)
+            self.assertAlmostEqual(state[1], interval)
+            self.assertAlmostEqual(state[2], ease_factor)
+
+    def test_failure_resets_interval(self):
+        repetitions, interval, ease_factor = schedule(3, 16, 2.5, 1)
+        self.assertEqual((repetitions, interval), (0, 1))
+        self.assertAlmostEqual(ease_factor, 1.96)
+
+    def test_ease_factor_floor(self):
+        self.assertEqual(schedule(0, 1, 1.4, 1)[2], 1.3)
+
+    def test_max_interval(self):
+        self.assertEqual(schedule(5, 300, 2.5, 5, max_interval=365)[1], 365)
+
+
+class RecommendationTests(TestCase):
+    """题目推荐和练习状态的重放"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', 'learner@example.com', 'password')
+        cls.node = KnowledgeNode.objects.create(title='分数', content='内容', category='代数')
+        cls.questions = []
+        for i in range(4):
+            question = Question.objects.create(title=f'题目{i}', content=f'分数题{i}', answer='答案', difficulty=2)
+            question.knowledge_nodes.add(cls.node)
+            cls.questions.append(question)
+
+    def setUp(self):
+        use_temporary_index(self)
+
+    def practice(self, question, is_correct, time_spent=30, days_ago=0):
+        record = PracticeHistory.objects.create(user=self.user, question=question, user_answer='答案',
+                                                is_correct=is_correct, time_spent=time_spent)
+        PracticeHistory.objects.filter(id=record.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return record
+
+    def test_recommend_excludes_recently_correct(self):
+        recent, wrong, old, fresh = self.questions
+        self.practice(recent, True)
+        self.practice(wrong, False)
+        self.practice(old, True)
+        QuestionAttempt.objects.filter(user=self.user, question=old).update(
+            last_attempted_at=timezone.now() - timedelta(days=30)
+        )
+        recommended = [question_id for question_id, _, _ in recommend(self.user, limit=10)]
+        # 没做过的 > 答错过的 > 很久以前答对过的，最近答对过的不推荐
+        self.assertEqual(recommended, [fresh.id, wrong.id, old.id])
+
+    def test_replay_in_time_order(self):
+        question = self.questions[0]
+        # 按插入顺序是 答错、答对、答对，按时间顺序是 答对、答对、答错
+        self.practice(question, False, days_ago=1)
+        self.practice(question, True, days_ago=10)
+        self.practice(question, True, days_ago=5)
+        attempts = list(_replay_attempts(PracticeHistory.objects.filter(user=self.user)))
+        self.assertEqual(len(attempts), 1)
+        attempt = attempts[0]
+        state = (0, 0, 2.5)
+        for quality in (5, 5, 1):
+            state = schedule(*state, quality)
+        self.assertEqual(attempt.attempts, 3)
+        self.assertFalse(attempt.last_correct)
+        self.assertEqual((attempt.repetitions, attempt.interval), state[:2])
+        self.assertAlmostEqual(attempt.ease_factor, state[2])
+        self.assertEqual(attempt.next_review_at - attempt.last_attempted_at, timedelta(days=1))
+
+    def test_replay_groups_by_user_and_question(self):
+        self.practice(self.questions[0], True)
+        self.practice(self.questions[1], False)
+        self.practice(self.questions[0], True)
+        attempts = {attempt.question_id: attempt for attempt in
+                    _replay_attempts(PracticeHistory.objects.filter(user=self.user))}
+        self.assertEqual({question_id: attempt.attempts for question_id, attempt in attempts.items()},
+                         {self.questions[0].id: 2, self.questions[1].id: 1})
+        self.assertEqual(attempts[self.questions[0].id].repetitions, 2)
+
+
+class OCRJobCleanupTests(TestCase):
+    """进程重启后遗留的任务标记为失败，任务结束后删除图片"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'password')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def create_job(self, **fields):
+        image = SimpleUploadedFile('page.png', b'not an image', content_type='image/png')
+        return OCRJob.objects.create(user=self.user, image=image, **fields)
+
+    def test_finished_job_deletes_image(self):
+        job = self.create_job()
+        path = job.image.path
+        job = run_ocr_job(job.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(job.image)
+        self.assertFalse(os.path.exists(path))
+
+    def test_sweep_fails_stale_jobs(self):
+        stale = self.create_job(status='running')
+        OCRJob.objects.filter(id=stale.id).update(created_at=timezone.now() - timedelta(hours=1))
+        fresh = self.create_job()
+        finished = self.create_job(status='success')
+
+        self.assertEqual(sweep_jobs(timeout=600), (1, 1))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertFalse(stale.image)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'pending')
+        self.assertTrue(os.path.exists(fresh.image.path))
+        finished.refresh_from_db()
+        self.assertFalse(finished.image)
+
+
+class MetricsViewTests(TestCase):
+    """指标接口需要令牌，未设置令牌时只允许管理员访问"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('member', 'member@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+
+    def get(self, user=None, **headers):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get('/api/metrics/', **headers)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_without_token_only_admins(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(self.user).status_code, 403)
+        self.assertEqual(self.get(self.admin).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class DerivedFieldChangeTests(TestCase):
+    """布局、指标整批更新只写一条变更记录"""
+
+    def setUp(self):
+        use_temporary_index(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nodes = [KnowledgeNode.objects.create(title=f'知识点{i}', content='内容', category='代数')
+                          for i in range(30)]
+            for source, target in zip(self.nodes, self.nodes[1:]):
+                KnowledgeLink.objects.create(source=source, target=target, relation_type='前置')
+
+    def test_metrics_run_records_one_change(self):
+        since = get_map_version()
+        structure = structure_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_metrics(force=True), 30)
+        self.assertEqual(KnowledgeChange.objects.filter(action='metrics').count(), 1)
+        self.assertEqual(get_map_version(), since + 1)
+        self.assertEqual(structure_version(), structure)
+        # 派生字段整批变化，增量同步退回完整快照
+        self.assertIsNone(get_delta(since, get_map_version()))
+
+    def test_layout_run_records_one_change(self):
+        since = get_map_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(relayout(incremental=False), 30)
+        self.assertEqual(KnowledgeChange.objects.filter(action='layout').count(), 1)
+        self.assertEqual(get_map_version(), since + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            node = KnowledgeNode.objects.create(title='新知识点', content='内容', category='代数')
+            KnowledgeLink.objects.create(source=self.nodes[0], target=node, relation_type='前置')
+            moved = relayout(incremental=True)
+        self.assertLess(moved, 30)
+        self.assertEqual(KnowledgeChange.objects.filter(action='layout').count(), 2)
+
+    @override_settings(KNOWLEDGE_MAP={'MAX_DELTA_CHANGES': 3})
+    def test_prune_keeps_structure_version(self):
+        structure = structure_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            relayout(incremental=False)
+            for _ in range(5):
+                update_metrics(force=True)
+                KnowledgeNode.objects.filter(id=self.nodes[0].id).update(pagerank=0)
+        prune_changes(get_map_version())
+        self.assertEqual(structure_version(), structure)
+        self.assertLess(KnowledgeChange.objects.count(), 5)
+
+        # 布局之后的变更记录可能已被清理，自动增量布局不再进行，留给完整布局
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(relayout(incremental=True, allow_full=False), 0)
+            self.assertEqual(relayout(incremental=True), 30)
@@ -6,7 +6,8 @@ from rest_framework_simplejwt.views import (
 )
 from .views import (
     UserViewSet, KnowledgeNodeViewSet, KnowledgeLinkViewSet,
-    QuestionViewSet, PracticeHistoryViewSet, UserProgressViewSet, OCRView
+    QuestionViewSet, PracticeHistoryViewSet, UserProgressViewSet,
+    OCRView, OCRJobView, OCRCacheView, BatchOCRView, OCRStreamView, MetricsView, SearchView
 )
 
 router = DefaultRouter()
@@ -22,4 +23,10 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('ocr/', OCRView.as_view(), name='ocr'),
+    path('ocr/stream/', OCRStreamView.as_view(), name='ocr_stream'),
+    path('ocr/batch/', BatchOCRView.as_view(), name='ocr_batch'),
+    path('ocr/cache/', OCRCacheView.as_view(), name='ocr_cache'),
+    path('ocr/jobs/<uuid:job_id>/', OCRJobView.as_view(), name='ocr_job'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('search/', SearchView.as_view(), name='search'),
 ] 
\ No newline at end of file
@@ -1,144 +1,57 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status, generics
+from rest_framework import viewsets, permissions, status, generics, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from .models import KnowledgeNode, KnowledgeLink, Question, PracticeHistory, UserProgress
+from django.http import HttpResponse, StreamingHttpResponse
+from .models import KnowledgeNode, KnowledgeLink, Question, PracticeHistory, UserProgress, OCRJob
 from .serializers import (
     UserSerializer, UserCreateSerializer, KnowledgeNodeSerializer,
     KnowledgeLinkSerializer, QuestionSerializer, PracticeHistorySerializer,
-    UserProgressSerializer
+    UserProgressSerializer, OCRJobSerializer
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
-import pytesseract
 from PIL import Image
+import hmac
 import io
+import logging
 import os
+import time
 import re
-import requests
 import json
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import parse_etags
+from .ocr import run_ocr_pipeline, lookup_cached_result, recognize_upload
+from .streaming import stream_solution, sse_event
+from .cache import RESULT_CACHES
+from .batch import run_batch, BatchError
+from .jobs import fail_job, submit_ocr_job
+from .knowledge_map import (
+    get_delta, get_map_version, get_options as get_map_options, get_snapshot, map_etag, map_variant
+)
+from .encoding import accepted_encoding
+from .renderers import graph_renderers
+from .graph_index import get_index, get_options as get_index_options, neighborhood
+from .learning_path import get_graph, mastered_nodes, shortest_path, study_path
+from .metrics import CONTENT_TYPE, render_metrics, span
+from .search import KINDS as SEARCH_KINDS, search
+from .recommendations import get_options as get_recommendation_options, recommend
+from .review import due_reviews, get_options as get_review_options
+from .filters import QuestionFilter
+from .question_bank import get_facets
+from .similarity import find_duplicates, get_options as get_similarity_options, similar_to
+from django_filters.rest_framework import DjangoFilterBackend
 
-# 设置 Tesseract-OCR 可执行文件路径
-pytesseract.pytesseract.tesseract_cmd = r'D:\Tesseract-OCR\tesseract.exe'
-
-# Deepseek API 配置
-DEEPSEEK_API_KEY = 'your_api'
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
-
-def process_with_deepseek(text):
-    """使用Deepseek API处理文本"""
-    # 预处理OCR文本
-    cleaned_text = text.replace('X', '×').replace('十', '+').replace('\n\n', '\n').strip()
-    print(f"预处理后的文本:\n{cleaned_text}")
-
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    prompt = f"""作为一个数学教育专家，请先整理题目内容，然后解答以下数学题目：
-
-原始题目：
-{cleaned_text}
-
-请按以下格式返回JSON：
-{{
-    "question": {{
-        "main": "题目主要要求",
-        "sub_questions": [
-            {{
-                "id": "1",
-                "content": "59×2.5×0.4=□×(□×□)"
-            }},
-            // ... 其他小题
-        ]
-    }},
-    "analysis": {{
-        "1": "第1题的解题思路",
-        "2": "第2题的解题思路",
-        // ... 其他小题的解题思路
-    }},
-    "answer": {{
-        "1": "第1题的答案",
-        "2": "第2题的答案",
-        // ... 其他小题的答案
-    }}
-}}
-
-注意：
-1. 请确保sub_questions中的content包含完整的算式，包括等号和空格位置
-2. 对于需要填空的位置，使用□符号表示
-3. 保持原题的格式和符号
-4. 请直接返回JSON，不要添加其他说明文字"""
-
-    try:
-        print(f"发送到Deepseek的请求:\n{prompt}")
-        
-        response = requests.post(
-            DEEPSEEK_API_URL,
-            headers=headers,
-            json={
-                "model": "deepseek-chat",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 2000
-            },
-            timeout=30,
-            verify=False
-        )
-        
-        print(f"Deepseek API 状态码: {response.status_code}")
-        print(f"Deepseek API 响应:\n{response.text}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                content = result['choices'][0]['message']['content']
-                print(f"API返回的content:\n{content}")
-                
-                # 处理可能的 Markdown 格式
-                if content.startswith("```json"):
-                    content = content.replace("```json", "").replace("```", "").strip()
-                elif content.startswith("```"):
-                    content = content.replace("```", "").strip()
-                
-                parsed_result = json.loads(content)
-                
-                # 重新组织返回的数据结构
-                return {
-                    "question": parsed_result["question"]["main"],
-                    "sub_questions": parsed_result["question"]["sub_questions"],
-                    "analysis": parsed_result["analysis"],
-                    "answer": parsed_result["answer"]
-                }
-            except (KeyError, json.JSONDecodeError) as e:
-                print(f"解析API响应时出错: {str(e)}")
-                return {
-                    "question": cleaned_text,
-                    "analysis": "抱歉，解析AI响应时出错，请稍后重试。",
-                    "answer": "无法生成答案"
-                }
-        else:
-            print(f"API调用失败: {response.status_code} - {response.text}")
-            return {
-                "question": cleaned_text,
-                "analysis": f"API调用失败: {response.status_code}",
-                "answer": "请稍后重试"
-            }
-            
-    except Exception as e:
-        print(f"调用Deepseek API时出错: {str(e)}")
-        return {
-            "question": cleaned_text,
-            "analysis": f"API调用出错: {str(e)}",
-            "answer": "请稍后重试"
-        }
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -180,65 +93,324 @@ class KnowledgeNodeViewSet(viewsets.ModelViewSet):
     serializer_class = KnowledgeNodeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    @action(detail=False, methods=['get'])
+    # 令牌校验不查询用户表，未变化的请求完全不访问数据库
+    @action(detail=False, methods=['get'], authentication_classes=[JWTStatelessUserAuthentication],
+            renderer_classes=graph_renderers())
     def map(self, request):
-        """获取完整的知识图谱数据"""
-        nodes = KnowledgeNode.objects.all()
-        links = KnowledgeLink.objects.all()
-        
-        # 获取所有分类
-        categories = list(set(node.category for node in nodes))
-        
-        # 构建知识图谱数据
-        nodes_data = [{
-            'id': str(node.id),
-            'name': node.title,
-            'value': node.level,
-            'category': node.category,
-            'content': node.content,
-            'difficulty': node.difficulty
-        } for node in nodes]
-        
-        links_data = [{
-            'source': str(link.source.id),
-            'target': str(link.target.id),
-            'value': 1,
-            'relation_type': link.relation_type
-        } for link in links]
-        
+        """获取完整的知识图谱数据
+
+        返回按版本缓存的快照，If-None-Match 与当前版本一致时返回304。
+        携带 since=<版本号> 时只返回此后的变化，无法增量同步时返回完整快照（full 为 true）。
+        通过 Accept 或 ?format= 选择 json、columnar、msgpack、columnar-msgpack 编码。
+        top=N 时只返回 PageRank 最高的 N 个节点及它们之间的关联，不能与 since 同时使用。
+        """
+        version = get_map_version()
+        since = request.query_params.get('since')
+        top = request.query_params.get('top')
+        if top is not None:
+            max_top = get_map_options()['MAX_TOP']
+            try:
+                top = int(top)
+            except ValueError:
+                top = 0
+            if not 1 <= top <= max_top:
+                return Response({'error': f'top 必须是 1 到 {max_top} 之间的整数'}, status=status.HTTP_400_BAD_REQUEST)
+            if since is not None:
+                return Response({'error': 'top 不能和 since 同时使用'}, status=status.HTTP_400_BAD_REQUEST)
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({'error': 'since 必须是整数版本号'}, status=status.HTTP_400_BAD_REQUEST)
+            delta = get_delta(since, version)
+            if delta is not None:
+                return Response(delta)
+
+        renderer = request.accepted_renderer
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        etag = map_etag(version, map_variant(renderer.format, encoding, top))
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            content_encoding, body = get_snapshot(version, renderer.format, encoding, top)
+            response = HttpResponse(body, content_type=renderer.media_type)
+            if content_encoding:
+                response['Content-Encoding'] = content_encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept, Accept-Encoding, Authorization'
+        # 允许客户端保存，但每次使用前都要重新验证
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=True, methods=['get'], authentication_classes=[JWTStatelessUserAuthentication])
+    def neighborhood(self, request, pk=None):
+        """获取节点的 k 跳邻域，只查询内存映射的邻接索引，不访问数据库
+
+        参数：depth 跳数，relation_type 关联类型、difficulty 难度（均可用逗号分隔多个），
+        direction 为 out/in/both。
+        """
+        options = get_index_options()
+        try:
+            node_id = int(pk)
+            depth = int(request.query_params.get('depth', 1))
+            difficulties = [int(value) for value in request.query_params.get('difficulty', '').split(',') if value]
+        except ValueError:
+            return Response({'error': '节点ID、depth 和 difficulty 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= depth <= options['MAX_DEPTH']:
+            return Response({'error': f'depth 必须在 1 到 {options["MAX_DEPTH"]} 之间'}, status=status.HTTP_400_BAD_REQUEST)
+        direction = request.query_params.get('direction', 'both')
+        if direction not in ('out', 'in', 'both'):
+            return Response({'error': 'direction 只能是 out、in 或 both'}, status=status.HTTP_400_BAD_REQUEST)
+        relation_types = [value for value in request.query_params.get('relation_type', '').split(',') if value]
+
+        index = get_index()
+        result = neighborhood(index, node_id, depth, relation_types, difficulties, direction)
+        if result is None:
+            return Response({'error': '知识节点不存在'}, status=status.HTTP_404_NOT_FOUND)
+        nodes, links = result
+        return Response({
+            'version': index.version,
+            'nodes': [{'id': str(node), 'depth': hop} for node, hop in nodes],
+            'links': [{
+                'source': str(source),
+                'target': str(target),
+                'relation_type': relation_type
+            } for source, target, relation_type in links]
+        })
+
+    @action(detail=True, methods=['get'], url_path='learning-path')
+    def learning_path(self, request, pk=None):
+        """到达该节点的学习路径，按前置关系的拓扑顺序排列
+
+        默认跳过根据练习记录判断为已掌握的节点；skip_mastered=0 时不跳过，
+        也可以用 mastered=1,2,3 直接指定已掌握的节点。
+        """
+        try:
+            node_id = int(pk)
+            mastered = {int(value) for value in request.query_params.get('mastered', '').split(',') if value}
+        except ValueError:
+            return Response({'error': '节点ID和 mastered 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('skip_mastered', '1') not in ('0', 'false'):
+            mastered |= mastered_nodes(request.user)
+
+        graph = get_graph()
+        result = study_path(graph, node_id, mastered)
+        if result is None:
+            return Response({'error': '知识节点不存在'}, status=status.HTTP_404_NOT_FOUND)
+        path, has_cycle = result
         return Response({
-            'nodes': nodes_data,
-            'links': links_data,
-            'categories': categories
+            'version': graph.version,
+            'target': str(node_id),
+            'path': [self._path_node(graph, node) for node in path],
+            'skipped': sorted(str(node) for node in mastered if node in graph.positions),
+            'has_cycle': has_cycle
         })
 
+    @action(detail=False, methods=['get'], url_path='shortest-path',
+            authentication_classes=[JWTStatelessUserAuthentication])
+    def shortest_path(self, request):
+        """两个节点之间的最短路径，weighted=1 时按经过节点的难度加权"""
+        try:
+            source = int(request.query_params['source'])
+            target = int(request.query_params['target'])
+        except (KeyError, ValueError):
+            return Response({'error': '请提供整数的 source 和 target'}, status=status.HTTP_400_BAD_REQUEST)
+        weighted = request.query_params.get('weighted') in ('1', 'true')
+
+        graph = get_graph()
+        result = shortest_path(graph, source, target, weighted)
+        if result is None:
+            return Response({'error': '知识节点不存在'}, status=status.HTTP_404_NOT_FOUND)
+        path, cost = result
+        return Response({
+            'version': graph.version,
+            'path': [self._path_node(graph, node) for node in path],
+            'cost': cost
+        })
+
+    @staticmethod
+    def _path_node(graph, node_id):
+        position = graph.positions[node_id]
+        return {
+            'id': str(node_id),
+            'difficulty': graph.difficulty[position],
+            'level': graph.level[position]
+        }
+
 class KnowledgeLinkViewSet(viewsets.ModelViewSet):
-    queryset = KnowledgeLink.objects.all()
+    queryset = KnowledgeLink.objects.select_related('source', 'target')
     serializer_class = KnowledgeLinkSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class QuestionViewSet(viewsets.ModelViewSet):
+class SparseFieldsetViewMixin:
+    """?fields=a,b 只返回指定字段，?expand=x 在列表中保留完整的嵌套对象
+
+    list_actions 中的接口默认使用序列化器的精简表示；读请求的查询集只取输出需要的列，
+    嵌套对象一次预取，查询次数和返回的条数无关。
+    """
+    list_actions = ('list',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        serializer_class = self.get_serializer_class()
+        self.sparse_fields = self._names('fields')
+        self.expand = self._names('expand') or ()
+        unknown = set(self.sparse_fields or ()) - serializer_class.available_fields()
+        unknown |= set(self.expand) - serializer_class.expandable_fields()
+        if unknown:
+            raise ParseError(f'未知的字段: {", ".join(sorted(unknown))}')
+
+    def _names(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return tuple(name for name in value.split(',') if name)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update({
+            'fields': getattr(self, 'sparse_fields', None),
+            'expand': getattr(self, 'expand', ()),
+            'slim': self.action in self.list_actions,
+        })
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 写请求要保存完整的对象，不延迟加载字段
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = self.get_serializer().optimize_queryset(queryset)
+        return queryset
+
+class QuestionViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    list_actions = ('list', 'recommendations', 'due', 'similar', 'check_duplicate')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = QuestionFilter
+
+    def create(self, request, *args, **kwargs):
+        """内容与已有题目近似重复时返回 409 和重复的题目，确认要保存时加 ?allow_duplicate=1"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if request.query_params.get('allow_duplicate') not in ('1', 'true'):
+            duplicates = self.similar_questions(find_duplicates(serializer.validated_data.get('content', '')))
+            if duplicates:
+                return Response({'error': '题库中已有相似的题目', 'duplicates': duplicates},
+                                status=status.HTTP_409_CONFLICT)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def similar_questions(self, ranked):
+        questions = self.get_queryset().in_bulk([question_id for question_id, _ in ranked])
+        results = []
+        for question_id, similarity in ranked:
+            if question_id not in questions:
+                continue
+            data = self.get_serializer(questions[question_id]).data
+            data['similarity'] = similarity
+            results.append(data)
+        return results
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """内容相似的题目，相似度从高到低，limit 默认 10"""
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, get_similarity_options()['MAX_LIMIT']))
+
+        content = generics.get_object_or_404(Question.objects.values_list('content', flat=True), pk=pk)
+        with span('similar_questions'):
+            ranked = similar_to(content, limit, exclude=int(pk))
+        return Response(self.similar_questions(ranked))
+
+    @action(detail=False, methods=['post'])
+    def check_duplicate(self, request):
+        """保存前检查内容是否与已有题目近似重复，请求体为 {"content": ...}"""
+        content = request.data.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return Response({'error': '请提供题目内容'}, status=status.HTTP_400_BAD_REQUEST)
+        duplicates = self.similar_questions(find_duplicates(content))
+        return Response({'duplicate': bool(duplicates), 'duplicates': duplicates})
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """当前筛选条件下各难度、分类、知识节点的题目数，筛选参数和列表接口相同"""
+        filterset = QuestionFilter(request.query_params, queryset=Question.objects.all(), request=request)
+        filterset.use_exists = False
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        params = {name: request.query_params.getlist(name) for name in QuestionFilter.base_filters
+                  if name in request.query_params}
+        with span('question_facets'):
+            return Response(get_facets(filterset.qs, params))
 
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
-        # TODO: 实现智能推荐算法
-        questions = Question.objects.all()[:5]
-        serializer = self.get_serializer(questions, many=True)
-        return Response(serializer.data)
+        """根据用户在各知识节点上的掌握情况推荐题目，limit 默认 5"""
+        try:
+            limit = int(request.query_params.get('limit', 5))
+        except ValueError:
+            return Response({'error': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, get_recommendation_options()['MAX_LIMIT']))
+
+        with span('recommend'):
+            ranked = recommend(request.user, limit)
+        questions = self.get_queryset().in_bulk([question_id for question_id, _, _ in ranked])
+        results = []
+        for question_id, score, node_id in ranked:
+            if question_id not in questions:
+                continue
+            data = self.get_serializer(questions[question_id]).data
+            data['score'] = score
+            data['reason_node'] = node_id
+            results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def due(self, request):
+        """已到复习时间的题目，最早到期的在前，limit 默认 20"""
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({'error': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, get_review_options()['MAX_LIMIT']))
 
-class PracticeHistoryViewSet(viewsets.ModelViewSet):
+        attempts = list(due_reviews(request.user, timezone.now(), limit))
+        questions = self.get_queryset().in_bulk([attempt.question_id for attempt in attempts])
+        results = []
+        for attempt in attempts:
+            if attempt.question_id not in questions:
+                continue
+            data = self.get_serializer(questions[attempt.question_id]).data
+            data['review'] = {
+                'due_at': attempt.next_review_at,
+                'interval': attempt.interval,
+                'repetitions': attempt.repetitions,
+                'ease_factor': round(attempt.ease_factor, 2),
+                'last_correct': attempt.last_correct,
+            }
+            results.append(data)
+        return Response(results)
+
+class PracticeHistoryViewSet(SparseFieldsetViewMixin, mixins.CreateModelMixin, mixins.ListModelMixin,
+                             mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    # 练习记录只能新增，不能修改或删除：学习进度、知识点掌握度和作答统计都在新增时累加
     queryset = PracticeHistory.objects.all()
     serializer_class = PracticeHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # 练习记录和信号中累加的练习状态、学习进度一起提交
+        with transaction.atomic():
+            serializer.save(user=self.request.user)
 
 class UserProgressViewSet(viewsets.ModelViewSet):
     queryset = UserProgress.objects.all()
@@ -252,6 +424,29 @@ class UserProgressViewSet(viewsets.ModelViewSet):
         obj, created = UserProgress.objects.get_or_create(user=self.request.user)
         return obj
 
+class SearchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """全文搜索题目和知识节点：?q=关键词&type=question,node&limit=20&offset=0"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': '请提供搜索关键词 q'}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        if any(kind not in SEARCH_KINDS for kind in kinds):
+            return Response({'error': 'type 只能是 question 或 node'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'limit 和 offset 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({'error': 'limit 必须大于0，offset 不能为负数'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with span('search'):
+            results = search(query, kinds or None, limit, offset)
+        return Response({'query': query, 'offset': offset, 'results': results})
+
 class OCRView(APIView):
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [permissions.IsAuthenticated]
@@ -262,18 +457,18 @@ class OCRView(APIView):
                 {'error': '请选择要上传的图片'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        sync = request.query_params.get('sync') in ('1', 'true')
+        if getattr(settings, 'OCR_ASYNC', True) and not sync:
+            return self.submit(request)
         
         try:
             image_file = request.FILES['image']
-            image = Image.open(image_file)
-            
-            # OCR识别
-            text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-            text = text.strip()
-            print(f"原始OCR识别结果:\n{text}")
+            with span('upload_read'):
+                data = image_file.read()
             
-            # 使用Deepseek处理
-            result = process_with_deepseek(text)
+            # OCR识别 + 使用Deepseek处理
+            text, result, timings = run_ocr_pipeline(data)
             
             if result:
                 return Response(result, status=status.HTTP_200_OK)
@@ -285,7 +480,7 @@ class OCRView(APIView):
                 }, status=status.HTTP_200_OK)
             
         except Exception as e:
-            print(f"处理请求时出错: {str(e)}")
+            logger.exception("处理请求时出错: %s", e)
             return Response(
                 {
                     'error': str(e),
@@ -293,3 +488,152 @@ class OCRView(APIView):
                 }, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def submit(self, request):
+        """保存图片并提交异步识别任务，立即返回任务ID"""
+        image_file = request.FILES['image']
+        try:
+            Image.open(image_file).verify()
+            image_file.seek(0)
+        except Exception:
+            return Response(
+                {'error': '图片处理失败，请确保上传了正确的图片格式'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 重复上传的图片直接返回缓存结果，不再排队
+        cached = lookup_cached_result(image_file.read())
+        image_file.seek(0)
+        if cached is not None:
+            text, result = cached
+            now = timezone.now()
+            # 任务已经结束，不保存图片
+            job = OCRJob.objects.create(
+                user=request.user, status='success',
+                text=text, result=result, timings={'cache': True},
+                started_at=now, finished_at=now
+            )
+            return Response(OCRJobSerializer(job).data, status=status.HTTP_200_OK)
+
+        job = OCRJob.objects.create(user=request.user, image=image_file)
+        if not submit_ocr_job(job.id):
+            fail_job(job, '识别任务队列已满')
+            return Response(
+                {'error': '当前识别任务过多，请稍后重试'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        return Response(
+            OCRJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
+class OCRStreamView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """识别图片并以 Server-Sent Events 流式返回解题过程"""
+        if 'image' not in request.FILES:
+            return Response(
+                {'error': '请选择要上传的图片'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with span('upload_read'):
+            data = request.FILES['image'].read()
+
+        def events():
+            try:
+                text, timings = recognize_upload(data)
+            except Exception as e:
+                logger.exception("处理请求时出错: %s", e)
+                yield sse_event('error', {
+                    'error': str(e),
+                    'detail': '图片处理失败，请确保上传了正确的图片格式'
+                })
+                return
+            yield sse_event('ocr', {'text': text, 'timings': timings})
+            yield from stream_solution(text)
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # 禁止 Nginx 缓冲，保证事件及时送达
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class BatchOCRView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """批量识别多张图片或多页PDF/TIFF，按上传顺序返回每页结果"""
+        uploads = request.FILES.getlist('images')
+        if not uploads:
+            return Response(
+                {'error': '请选择要上传的图片或PDF'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        started = time.perf_counter()
+        try:
+            pages = run_batch([(upload.name, upload.read()) for upload in uploads])
+        except BatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'pages': pages,
+            'elapsed': round((time.perf_counter() - started) * 1000, 1)
+        }, status=status.HTTP_200_OK)
+
+class OCRJobView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        """查询异步识别任务的状态和结果"""
+        job = get_object_or_404(OCRJob, id=job_id, user=request.user)
+        return Response(OCRJobSerializer(job).data)
+
+class OCRCacheView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """查看OCR和解题结果缓存的命中统计（当前进程）"""
+        return Response({name: cache.stats() for name, cache in RESULT_CACHES.items()})
+
+    def delete(self, request, *args, **kwargs):
+        """失效缓存：指定 level 和 key 时删除单条，否则清空对应级别"""
+        level = request.query_params.get('level')
+        key = request.query_params.get('key')
+        if level and level not in RESULT_CACHES:
+            return Response({'error': f'未知的缓存级别: {level}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        caches = [RESULT_CACHES[level]] if level else RESULT_CACHES.values()
+        for cache in caches:
+            if key:
+                cache.invalidate(key)
+            else:
+                cache.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class MetricsView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get_authenticators(self):
+        # 设置了 METRICS_TOKEN 时 Authorization 头携带的是该令牌，不按 JWT 认证
+        if getattr(settings, 'METRICS_TOKEN', None):
+            return []
+        return super().get_authenticators()
+
+    def get(self, request, *args, **kwargs):
+        """以 Prometheus 文本格式导出各阶段耗时、错误和超时指标（当前进程）
+
+        设置了 METRICS_TOKEN 时需要携带 Authorization: Bearer <token>，否则只允许管理员访问。
+        """
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token:
+            allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        else:
+            allowed = request.user.is_authenticated and request.user.is_staff
+        if not allowed:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
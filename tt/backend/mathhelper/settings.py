@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 from datetime import timedelta
 
@@ -41,12 +42,14 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "rest_framework_simplejwt",
+    "django_filters",
     "corsheaders",
     "core",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -146,8 +149,18 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # 列表接口按 (created_at, id) 游标分页，见 CURSOR_PAGINATION
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
 }
 
+# 安装 msgpack 后客户端可以通过 Accept: application/msgpack 请求二进制编码
+if importlib.util.find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('core.renderers.MessagePackRenderer')
+
 # JWT设置
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -158,3 +171,185 @@ SIMPLE_JWT = {
 
 # 自定义用户模型
 AUTH_USER_MODEL = 'core.User'
+
+# OCR异步任务设置
+OCR_ASYNC = True  # 上传后立即返回任务ID，通过 /api/ocr/jobs/<id>/ 查询结果
+OCR_JOB_WORKERS = 2  # 每个进程内同时执行的识别任务数
+OCR_JOB_QUEUE_SIZE = 20  # 每个进程内允许排队的任务数，超出后返回503
+OCR_JOB_TIMEOUT = 600  # 创建后超过该秒数仍未结束的任务（如进程重启后遗留的）标记为失败
+
+# OCR与解题结果缓存设置
+OCR_CACHE = {
+    'DIR': os.path.join(BASE_DIR, 'ocr_cache'),  # 磁盘持久化目录
+    'MAX_ENTRIES': 1000,  # 每级内存LRU的条目上限
+    'MAX_DISK_BYTES': 200 * 1024 * 1024,  # 每级磁盘占用上限，超出后按最近使用淘汰
+    'TTL': 30 * 24 * 3600,  # 缓存有效期，单位：秒
+}
+
+# Deepseek API 客户端设置
+DEEPSEEK_CLIENT = {
+    'POOL_SIZE': 10,  # 保持长连接的连接池大小
+    'MAX_CONCURRENCY': 4,  # 每个进程同时在途的请求数上限
+    'ACQUIRE_TIMEOUT': 10,  # 等待并发名额的超时，单位：秒
+    'MAX_RETRIES': 3,  # 429/5xx/连接错误时的重试次数
+    'BACKOFF_BASE': 0.5,  # 指数退避的基数，单位：秒
+    'BACKOFF_MAX': 8,
+    'TIMEOUT': 30,
+    'BREAKER_THRESHOLD': 5,  # 连续失败多少次后熔断
+    'BREAKER_RESET': 30,  # 熔断后多久放行试探请求，单位：秒
+    'VERIFY_SSL': False,
+}
+
+# OCR图片预处理设置
+OCR_PREPROCESS = {
+    # 可选步骤：draft, downscale, grayscale, binarize, deskew, crop
+    'STEPS': ('draft', 'downscale', 'grayscale', 'binarize', 'deskew', 'crop'),
+    'TARGET_DPI': 300,
+}
+
+# OCR引擎设置
+OCR_ENGINE = {
+    'BACKEND': 'pool',  # pool: 常驻进程池（需要安装 tesserocr，未安装时自动使用 pytesseract），pytesseract: 每张图片启动一次进程
+    'LANG': 'chi_sim+eng',
+    'POOL_SIZE': 2,  # 常驻工作进程数
+    'TASK_TIMEOUT': 60,  # 单张图片识别超时，单位：秒
+    'WARMUP_TIMEOUT': 10,  # 进程池创建后等待工作进程加载语言模型的时间，超时改用 pytesseract，单位：秒
+    'MAX_TASKS_PER_WORKER': 200,  # 工作进程处理多少张图片后重启，防止内存增长
+    'TESSDATA': None,  # traineddata 所在目录，None 时使用 tesseract 默认路径
+}
+
+# 批量识别设置
+OCR_BATCH = {
+    'WORKERS': None,  # 页面识别进程数，None 时使用CPU核数
+    'SOLVE_CONCURRENCY': 4,  # 每个批次同时解题的页数
+    'MAX_PAGES': 50,  # 单次请求最多处理的页数
+    'PDF_DPI': 200,  # PDF页面渲染分辨率（需要安装 PyMuPDF）
+}
+
+# 缓存设置，知识图谱快照等需要在多个工作进程之间共享，生产环境可改用 Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+    }
+}
+
+# 知识图谱增量同步设置
+KNOWLEDGE_MAP = {
+    'MAX_DELTA_CHANGES': 1000,  # 客户端落后超过该条变更时返回完整快照，更早的变更记录会被清理
+    'MAX_TOP': 5000,  # map?top=N 允许的最大 N
+}
+
+# 知识图谱邻接索引设置
+KNOWLEDGE_INDEX = {
+    'DIR': os.path.join(BASE_DIR, 'knowledge_index'),  # 索引文件目录，各工作进程以内存映射方式共享
+    'MAX_DEPTH': 3,  # 邻域查询允许的最大跳数
+}
+
+# 学习路径设置
+LEARNING_PATH = {
+    # 关联类型 -> 前置知识所在的一端：source 表示源节点要先学，target 表示目标节点要先学；未列出的类型不构成前置关系
+    'PREREQUISITES': {'包含': 'source', '使用': 'target', '扩展': 'target'},
+    'MASTERY_THRESHOLD': 0.8,  # 相关题目正确率达到该值视为已掌握
+    'MASTERY_MIN_PRACTICES': 3,
+}
+
+# 响应压缩设置，客户端支持时优先使用 brotli（需要安装 brotli），否则使用 gzip
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,  # 小于该字节数的响应不压缩
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+# 知识图谱布局设置，坐标随 map 接口返回；完整布局使用 python manage.py compute_graph_layout
+GRAPH_LAYOUT = {
+    'EDGE_LENGTH': 100,  # 理想的关联长度
+    'ITERATIONS': 200,
+    'INCREMENTAL_ITERATIONS': 50,
+    'GRAVITY': 0.05,
+    'AUTO_RELAYOUT': False,  # 节点或关联变化后在 Web 进程中自动增量布局，关闭时定时执行 compute_graph_layout --incremental
+    'DEBOUNCE': 5,  # 单位：秒
+}
+
+# 知识节点中心性设置，定时执行 python manage.py compute_graph_metrics，图谱未变化时自动跳过
+GRAPH_METRICS = {
+    'DAMPING': 0.85,  # PageRank 阻尼系数
+    'TOLERANCE': 1e-9,
+    'MAX_ITERATIONS': 100,
+    'BETWEENNESS_SAMPLES': 64,  # 介数中心性抽样的源点数
+}
+
+# 题目推荐设置，练习状态可用 python manage.py rebuild_practice_state 从练习历史重建
+RECOMMENDATIONS = {
+    'WEAK_THRESHOLD': 0.7,  # 掌握度低于该值的节点视为薄弱
+    'NEIGHBOR_WEIGHT': 0.5,  # 相邻节点相对薄弱节点的权重
+    'RECENCY_DAYS': 14,  # 最近练习权重的衰减时间，单位：天
+    'EXCLUDE_CORRECT_DAYS': 7,  # 该天数内答对过的题目不推荐
+    'MAX_LIMIT': 50,
+}
+
+# 间隔复习设置（SM-2），/api/questions/due/ 返回到期的题目
+REVIEW = {
+    'FAST_SECONDS': 60,  # 答对且用时不超过该值视为完全掌握
+    'SLOW_SECONDS': 300,  # 答对但用时超过该值视为勉强答对
+    'MAX_INTERVAL': 365,  # 复习间隔上限，单位：天
+    'MAX_LIMIT': 100,
+}
+
+# 列表接口游标分页设置，客户端可用 ?page_size= 调整，翻页使用返回的 next 链接
+CURSOR_PAGINATION = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 500,
+}
+
+# 题库设置，/api/questions/facets/ 返回当前筛选条件下的分面统计
+QUESTION_BANK = {
+    'FACETS_TTL': 300,  # 分面统计的缓存时间，单位：秒
+    'FACET_NODE_LIMIT': 50,  # 知识节点分面只返回题目最多的前 N 个
+    'HOT_FILTER_ROWS': 5000,  # 按知识节点、分类筛选时匹配的关联超过这个数改用 EXISTS
+}
+
+# 相似题目索引设置，修改 SHINGLE_SIZE、NUM_PERM、BANDS、SEED 后执行 python manage.py rebuild_similarity_index
+SIMILARITY = {
+    'SHINGLE_SIZE': 3,  # 字符 n-gram 的长度
+    'NUM_PERM': 64,  # MinHash 签名长度
+    'BANDS': 16,  # LSH 分段数
+    'THRESHOLD': 0.5,  # 相似题目的最低相似度
+    'DUPLICATE_THRESHOLD': 0.9,  # 新建题目时超过这个相似度视为重复
+}
+
+# 全文搜索设置，索引为 SQLite FTS5 表，python manage.py rebuild_search_index 可重建
+SEARCH = {
+    'TITLE_WEIGHT': 10.0,  # bm25 中标题相对内容的权重
+    'BODY_WEIGHT': 1.0,
+    'SNIPPET_LENGTH': 80,  # 摘要的字数
+    'MAX_LIMIT': 50,
+}
+
+# 指标接口 /api/metrics/，设置后抓取时需要携带 Authorization: Bearer <token>，未设置时只允许管理员访问
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# 日志设置，DEBUG 级别会输出完整的提示词和模型响应
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
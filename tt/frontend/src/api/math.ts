@@ -1,6 +1,7 @@
 import axios from "axios";
 import { useUserStore } from "../stores/user";
 import type {
+  OCRJob,
   OCRResult,
   KnowledgeMap,
   Question,
@@ -20,9 +21,54 @@ export async function uploadImage(file: File): Promise<OCRResult> {
       Authorization: `Bearer ${userStore.token}`,
     },
   });
+  // 后端默认异步识别，返回任务后轮询任务状态直到完成
+  if (isOCRJob(response.data)) {
+    return waitForOCRJob(response.data);
+  }
   return response.data;
 }
 
+const OCR_POLL_INTERVAL = 1000;
+const OCR_POLL_TIMEOUT = 120000;
+
+function isOCRJob(data: unknown): data is OCRJob {
+  return (
+    typeof data === "object" &&
+    data !== null &&
+    "id" in data &&
+    "status" in data &&
+    "result" in data
+  );
+}
+
+async function waitForOCRJob(job: OCRJob): Promise<OCRResult> {
+  const userStore = useUserStore();
+  const deadline = Date.now() + OCR_POLL_TIMEOUT;
+  while (job.status === "pending" || job.status === "running") {
+    if (Date.now() > deadline) {
+      throw new Error("识别超时，请稍后重试");
+    }
+    await new Promise((resolve) => setTimeout(resolve, OCR_POLL_INTERVAL));
+    const response = await axios.get<OCRJob>(`${API_URL}/ocr/jobs/${job.id}/`, {
+      headers: {
+        Authorization: `Bearer ${userStore.token}`,
+      },
+    });
+    job = response.data;
+  }
+  if (job.status === "failed") {
+    throw new Error(job.error || "识别失败");
+  }
+  // 和同步接口一致：AI 处理失败时只返回识别出的文字
+  return (
+    job.result ?? {
+      text: job.text,
+      analysis: "抱歉，AI处理失败，请稍后重试。",
+      answer: "无法生成答案",
+    }
+  );
+}
+
 export async function getKnowledgeMap(): Promise<KnowledgeMap> {
   const userStore = useUserStore();
   const response = await axios.get(`${API_URL}/knowledge-nodes/map/`, {
@@ -56,5 +56,17 @@ export interface UserProgress {
 
 export interface OCRResult {
   text: string;
-  message: string;
+  message?: string;
+  question?: string;
+  sub_questions?: { id: number | string; content: string }[];
+  analysis?: string | Record<string, string>;
+  answer?: string | Record<string, string>;
+}
+
+export interface OCRJob {
+  id: string;
+  status: "pending" | "running" | "success" | "failed";
+  text: string;
+  result: OCRResult | null;
+  error: string;
 }